@@ -0,0 +1,8 @@
+"""
+Benchmarks for mysite.
+
+Each module is runnable on its own from the ``mysite`` directory and works
+against a throwaway test database, e.g.::
+
+    $ python -m benchmarks.email_lookup
+"""
@@ -0,0 +1,79 @@
+"""
+Measure the user admin changelist as the table grows: indexed prefix and
+domain search with estimated counts against icontains search with exact
+counts.
+
+    $ python -m benchmarks.admin_changelist --sizes 10000 100000
+"""
+import argparse
+import contextlib
+from unittest import mock
+
+from benchmarks.base import (
+    measure, print_table, setup, summarize, test_database)
+
+
+def run(sizes, repeat):
+    from django.contrib.admin import ModelAdmin
+    from django.core.paginator import Paginator
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+    from django.urls import reverse
+
+    from users.admin import UserAdmin
+    from users.models import User
+
+    admin = User.objects.create_superuser(
+        email='admin@example.com', name='Admin', password='adminpass123')
+    client = Client()
+    client.force_login(admin)
+    url = reverse('admin:users_user_changelist')
+
+    legacy = {
+        'paginator': Paginator,
+        'show_full_result_count': True,
+        'get_search_results': ModelAdmin.get_search_results,
+    }
+
+    rows = []
+    for size in sizes:
+        User.objects.bulk_create([
+            User(email='user%d@example%d.com' % (n, n % 100),
+                 name='User %d' % n, password='!')
+            for n in range(User.objects.count(), size)
+        ], batch_size=5000)
+        for query in ({}, {'q': 'user1'}, {'q': '@example7.com'},
+                      {'is_admin__exact': '0'}):
+            for label in ('legacy', 'indexed'):
+                sql_times = []
+
+                def get():
+                    with CaptureQueriesContext(connection) as queries:
+                        client.get(url, query)
+                    sql_times.append(sum(float(q['time']) for q in queries))
+
+                with (mock.patch.multiple(UserAdmin, **legacy)
+                      if label == 'legacy' else contextlib.nullcontext()):
+                    stats = summarize(measure(get, repeat))
+                rows.append((size, label, query or '-', stats['mean_ms'],
+                             stats['p95_ms'], summarize(sql_times)['mean_ms']))
+
+    print_table(('users', 'changelist', 'query', 'mean ms', 'p95 ms',
+                 'SQL ms'), rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[10000, 100000])
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    setup()
+    with test_database():
+        run(args.sizes, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
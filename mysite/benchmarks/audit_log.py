@@ -0,0 +1,80 @@
+"""
+Measure sign-in latency with the audit log written one row per event in the
+request vs. buffered and written in batches.
+
+    $ python -m benchmarks.audit_log --repeat 500
+"""
+import argparse
+from unittest import mock
+
+from benchmarks.base import (
+    measure, print_table, setup, summarize, test_database)
+
+
+def run(repeat):
+    from django.conf import settings
+    from django.db import connection
+    from django.test import Client, override_settings
+    from django.urls import reverse
+
+    from users.audit import AuditLog, audit_log
+    from users.models import AuditEvent, User
+
+    url = reverse('users:signin')
+    credentials = {'username': 'bench@example.com',
+                   'password': 'benchpassword123'}
+    inserts = []
+
+    def count_inserts(execute, sql, params, many, context):
+        if sql.startswith('INSERT INTO "users_auditevent"'):
+            inserts.append(sql)
+        return execute(sql, params, many, context)
+
+    def signin():
+        response = Client().post(url, credentials)
+        assert response.status_code == 302, response.status_code
+
+    def per_event(self, event):
+        event.save()
+
+    # Keep hashing from drowning out the writes, and every sign-in from
+    # the same address under the throttle.
+    throttle = {**settings.SIGNIN_THROTTLE,
+                'RATES': {'ip': (10 ** 9, 300), 'email': (10 ** 9, 300)}}
+    with override_settings(
+            PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+            SIGNIN_THROTTLE=throttle):
+        User.objects.create_user(
+            email=credentials['username'], name='Bench',
+            password=credentials['password'])
+        signin()
+        audit_log.flush()
+
+        rows = []
+        for label, patch in (
+                ('row per event', mock.patch.object(AuditLog, 'add', per_event)),
+                ('buffered', mock.patch.object(AuditLog, 'add', AuditLog.add))):
+            AuditEvent.objects.all().delete()
+            inserts.clear()
+            with patch, connection.execute_wrapper(count_inserts):
+                stats = summarize(measure(signin, repeat))
+                audit_log.flush()
+            assert AuditEvent.objects.count() == repeat
+            rows.append((label, len(inserts) / repeat, stats['mean_ms'],
+                         stats['p95_ms']))
+
+    print_table(('audit log', 'INSERTs/signin', 'mean ms', 'p95 ms'), rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--repeat', type=int, default=500)
+    args = parser.parse_args()
+
+    setup()
+    with test_database():
+        run(args.repeat)
+
+
+if __name__ == '__main__':
+    main()
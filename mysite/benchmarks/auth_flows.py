@@ -0,0 +1,576 @@
+"""
+Drive the auth flows end to end through the WSGI or ASGI application, or
+against a running server, with concurrent virtual users.
+
+Each flow (signup, signin, profile GET and POST, password change, password
+reset and signout) runs as its own phase: every virtual user repeats it
+``--requests`` times, with whatever untimed requests it needs in between
+(e.g. signing out before each signin). For the flow's own requests it
+reports requests/sec (the requests completed over the wall-clock time of
+the phase, untimed requests included), p50/p95/p99 latency, errors, and
+in-process the queries and the password hashing time per request. Requests go through the whole middleware stack, CSRF checks
+included.
+
+    $ python -m benchmarks.auth_flows --interface wsgi --output wsgi.json
+    $ python -m benchmarks.auth_flows --interface asgi --compare wsgi.json
+    $ python -m benchmarks.auth_flows --server http://127.0.0.1:8000
+
+In-process runs use a throwaway SQLite file database, so that concurrent
+requests don't share an in-memory one, and queue reset emails as
+configured in settings, without sign-in throttling. A server run creates
+its users through signup in the server's own database, and is subject to
+its SIGNIN_THROTTLE and PASSWORD_RESET_COALESCE_WINDOW: all its virtual
+users sign in from one address.
+"""
+import argparse
+import asyncio
+import contextvars
+import functools
+import http.client
+import io
+import json
+import os
+import platform
+import re
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from http.cookies import SimpleCookie
+from unittest import mock
+from urllib.parse import urlencode, urlsplit
+
+from benchmarks.base import print_table, setup, summarize, test_database
+
+
+FLOWS = ('signup', 'signin', 'profile_get', 'profile_post',
+         'password_change', 'password_reset', 'signout')
+PASSWORDS = ('Bench-password-1', 'Bench-password-2')
+
+
+class RequestStats:
+    """Queries and hashing time of one request, gathered in-process."""
+
+    def __init__(self):
+        self.queries = 0
+        self.hash_time = 0.0
+
+
+# The RequestStats of the timed request being served, if any. Context
+# variables follow the request into the threads of sync_to_async() and of
+# users.executors.run_in_executor().
+current_stats = contextvars.ContextVar('current_stats', default=None)
+_hashing = threading.local()
+
+
+def count_query(execute, sql, params, many, context):
+    stats = current_stats.get()
+    if stats is not None:
+        stats.queries += 1
+    return execute(sql, params, many, context)
+
+
+def install_query_counter(connection, **kwargs):
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+def timed_hashing(method):
+    """Add the time spent in a password hasher method to current_stats."""
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        stats = current_stats.get()
+        # verify() of some hashers calls encode(): time the outer call only.
+        if stats is None or getattr(_hashing, 'active', False):
+            return method(*args, **kwargs)
+        _hashing.active = True
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            stats.hash_time += time.perf_counter() - start
+            _hashing.active = False
+    return wrapper
+
+
+class WSGITransport:
+    """Call a WSGI application on a thread pool, as a threaded server."""
+    host = 'testserver'
+
+    def __init__(self, application, concurrency):
+        self.application = application
+        self.executor = ThreadPoolExecutor(concurrency)
+
+    def call(self, method, path, body, headers):
+        environ = {
+            'REQUEST_METHOD': method,
+            'SCRIPT_NAME': '',
+            'PATH_INFO': path,
+            'QUERY_STRING': '',
+            'SERVER_NAME': self.host,
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'REMOTE_ADDR': '127.0.0.1',
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        for name, value in headers.items():
+            key = name.upper().replace('-', '_')
+            environ[key if key == 'CONTENT_TYPE' else 'HTTP_' + key] = value
+        response = {}
+
+        def start_response(status, response_headers, exc_info=None):
+            response['status'] = int(status.split()[0])
+            response['headers'] = response_headers
+
+        result = self.application(environ, start_response)
+        try:
+            content = b''.join(result)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        return response['status'], response['headers'], content
+
+    async def send(self, method, path, body, headers):
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self.executor, functools.partial(
+            context.run, self.call, method, path, body, headers))
+
+    def close(self):
+        self.executor.shutdown()
+
+
+class ASGITransport:
+    """Call an ASGI application on the event loop, as an ASGI server."""
+    host = 'testserver'
+
+    def __init__(self, application):
+        self.application = application
+
+    async def send(self, method, path, body, headers):
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': method,
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': b'',
+            'root_path': '',
+            'headers': [
+                (name.lower().encode(), value.encode())
+                for name, value in headers.items()],
+            'client': ('127.0.0.1', 0),
+            'server': (self.host, 80),
+        }
+        request = [{'type': 'http.request', 'body': body, 'more_body': False}]
+        done = asyncio.Event()
+        response = {'content': []}
+
+        async def receive():
+            if request:
+                return request.pop()
+            await done.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+                response['headers'] = [
+                    (name.decode('latin-1'), value.decode('latin-1'))
+                    for name, value in message['headers']]
+            else:
+                response['content'].append(message.get('body', b''))
+                if not message.get('more_body'):
+                    done.set()
+
+        await self.application(scope, receive, send)
+        return (response['status'], response['headers'],
+                b''.join(response['content']))
+
+    def close(self):
+        pass
+
+
+class HTTPTransport:
+    """Send requests to a running server, one connection per request."""
+
+    def __init__(self, url, concurrency):
+        parts = urlsplit(url)
+        self.host = parts.netloc
+        self.prefix = parts.path.rstrip('/')
+        self.connection_class = (
+            http.client.HTTPSConnection if parts.scheme == 'https'
+            else http.client.HTTPConnection)
+        self.executor = ThreadPoolExecutor(concurrency)
+
+    def call(self, method, path, body, headers):
+        connection = self.connection_class(self.host, timeout=60)
+        try:
+            connection.request(
+                method, self.prefix + path, body or None, headers)
+            response = connection.getresponse()
+            return response.status, response.getheaders(), response.read()
+        finally:
+            connection.close()
+
+    async def send(self, method, path, body, headers):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(
+            self.call, method, path, body, headers))
+
+    def close(self):
+        self.executor.shutdown()
+
+
+class VirtualUser:
+    """
+    One browser: its cookies and account, and the untimed steps that put it
+    in the state a flow starts from.
+    """
+
+    def __init__(self, transport, urls, email):
+        self.transport = transport
+        self.urls = urls
+        self.email = email
+        self.password = PASSWORDS[0]
+        self.cookies = {}
+        # The email of the account signed in, if any.
+        self.account = None
+        self.profile_url = None
+        self.content = b''
+
+    async def request(self, method, path, data=None, stats=None):
+        headers = {'Host': self.transport.host}
+        body = b''
+        if self.cookies:
+            headers['Cookie'] = '; '.join(
+                '%s=%s' % item for item in self.cookies.items())
+        if method == 'POST':
+            body = urlencode(data or {}).encode()
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+            headers['X-CSRFToken'] = self.cookies.get('csrftoken', '')
+        token = current_stats.set(stats)
+        try:
+            status, response_headers, self.content = (
+                await self.transport.send(method, path, body, headers))
+        finally:
+            current_stats.reset(token)
+        for name, value in response_headers:
+            if name.lower() == 'set-cookie':
+                for key, morsel in SimpleCookie(value).items():
+                    if morsel['max-age'] == '0' or not morsel.value:
+                        self.cookies.pop(key, None)
+                    else:
+                        self.cookies[key] = morsel.value
+        return status
+
+    async def expect(self, status, method, path, data=None):
+        result = await self.request(method, path, data)
+        if result != status:
+            raise AssertionError('%s %s: %d, expected %d' % (
+                method, path, result, status))
+
+    async def start(self):
+        """Get a CSRF cookie, sign up, and find the account's profile URL."""
+        await self.expect(200, 'GET', self.urls['signin'])
+        await self.expect(302, 'POST', self.urls['signup'], {
+            'email': self.email, 'name': 'Bench',
+            'password1': self.password, 'password2': self.password})
+        self.account = self.email
+        await self.expect(200, 'GET', self.urls['home'])
+        match = self.urls['profile_re'].search(self.content.decode())
+        if match is None:
+            raise AssertionError('No profile link on %s' % self.urls['home'])
+        self.profile_url = match.group(0)
+
+    async def signed_out(self):
+        if self.account is not None:
+            await self.expect(302, 'POST', self.urls['signout'])
+            self.account = None
+
+    async def signed_in(self):
+        if self.account != self.email:
+            await self.signed_out()
+            await self.expect(302, 'POST', self.urls['signin'], {
+                'username': self.email, 'password': self.password})
+            self.account = self.email
+
+
+#
+# Flows: each prepares the virtual user, untimed, then returns the expected
+# status and the arguments of its timed request.
+#
+
+async def signup(user, n):
+    await user.signed_out()
+    user.account = 'signup%d-%s' % (n, user.email)
+    return 302, 'POST', user.urls['signup'], {
+        'email': user.account, 'name': 'Bench %d' % n,
+        'password1': user.password, 'password2': user.password}
+
+
+async def signin(user, n):
+    await user.signed_out()
+    user.account = user.email
+    return 302, 'POST', user.urls['signin'], {
+        'username': user.email, 'password': user.password}
+
+
+async def profile_get(user, n):
+    await user.signed_in()
+    return 200, 'GET', user.profile_url, None
+
+
+async def profile_post(user, n):
+    await user.signed_in()
+    return 302, 'POST', user.profile_url, {
+        'email': user.email, 'name': 'Bench %d' % n}
+
+
+async def password_change(user, n):
+    await user.signed_in()
+    old, user.password = user.password, PASSWORDS[n % 2 == 0]
+    return 302, 'POST', user.urls['change_password'], {
+        'old_password': old, 'new_password1': user.password,
+        'new_password2': user.password}
+
+
+async def password_reset(user, n):
+    return 302, 'POST', user.urls['password_reset'], {'email': user.email}
+
+
+async def signout(user, n):
+    await user.signed_in()
+    user.account = None
+    return 302, 'POST', user.urls['signout'], None
+
+
+async def run_flow(flow, users, requests):
+    """Run `flow` on every virtual user concurrently, `requests` times."""
+    samples, queries, hash_times, errors = [], [], [], []
+
+    async def drive(user):
+        for n in range(requests):
+            try:
+                status, method, path, data = await flow(user, n)
+                stats = RequestStats()
+                start = time.perf_counter()
+                result = await user.request(method, path, data, stats)
+                samples.append(time.perf_counter() - start)
+                queries.append(stats.queries)
+                hash_times.append(stats.hash_time)
+                if result != status:
+                    errors.append('%s %s: %d' % (method, path, result))
+            except Exception as e:
+                errors.append(repr(e))
+                # Start over from a known state.
+                user.account = object()
+
+    await asyncio.gather(*map(drive, users))
+    return samples, queries, hash_times, errors
+
+
+def get_urls():
+    from django.urls import reverse
+
+    urls = {
+        name: reverse('users:' + name) for name in (
+            'signin', 'signout', 'signup', 'change_password',
+            'password_reset')
+    }
+    urls['home'] = reverse('blog:home')
+    profile = reverse('users:profile', kwargs={'pk': 12345})
+    urls['profile_re'] = re.compile(
+        re.escape(profile).replace('12345', r'\d+'))
+    return urls
+
+
+async def run_flows(transport, flows, concurrency, requests, in_process):
+    run_id = uuid.uuid4().hex[:8]
+    urls = get_urls()
+    users = [
+        VirtualUser(transport, urls, 'bench-%s-%d@example.com' % (run_id, i))
+        for i in range(concurrency)
+    ]
+    await asyncio.gather(*(user.start() for user in users))
+
+    results = {}
+    for name in flows:
+        start = time.perf_counter()
+        samples, queries, hash_times, errors = await run_flow(
+            globals()[name], users, requests)
+        elapsed = time.perf_counter() - start
+        stats = summarize(samples) if samples else {}
+        results[name] = {
+            'requests': len(samples),
+            'errors': len(errors),
+            'requests_per_sec': len(samples) / elapsed,
+            **stats,
+            'queries_per_request': (
+                sum(queries) / len(queries)
+                if in_process and queries else None),
+            'hash_ms_per_request': (
+                sum(hash_times) / len(hash_times) * 1000
+                if in_process and hash_times else None),
+        }
+        for error in errors[:3]:
+            print('%s: %s' % (name, error), file=sys.stderr)
+    return results
+
+
+def run(interface='wsgi', server=None, concurrency=4, requests=10,
+        flows=FLOWS):
+    """
+    Run the flows and return the results, as saved in the JSON output.
+    Django must be set up, against a test database for in-process runs.
+    """
+    from django.conf import settings
+    from django.contrib.auth.hashers import get_hasher
+    from django.db import connections
+    from django.db.backends.signals import connection_created
+    from django.test import override_settings
+
+    with ExitStack() as stack:
+        if server:
+            transport = HTTPTransport(server, concurrency)
+        else:
+            if interface == 'asgi':
+                from mysite.asgi import application
+                transport = ASGITransport(application)
+            else:
+                from mysite.wsgi import application
+                transport = WSGITransport(application, concurrency)
+
+            import mysite.settings
+            stack.enter_context(override_settings(
+                # The test environment replaces it with locmem.
+                EMAIL_BACKEND=mysite.settings.EMAIL_BACKEND,
+                # Every reset request does the full work.
+                PASSWORD_RESET_COALESCE_WINDOW=0,
+                # Every virtual user signs in from the same address.
+                SIGNIN_THROTTLE={
+                    **settings.SIGNIN_THROTTLE,
+                    'RATES': {'ip': (10 ** 9, 300), 'email': (10 ** 9, 300)},
+                },
+            ))
+            connection_created.connect(install_query_counter)
+            stack.callback(
+                connection_created.disconnect, install_query_counter)
+            for connection in connections.all():
+                install_query_counter(connection)
+            hasher_class = type(get_hasher())
+            for method in ('encode', 'verify'):
+                stack.enter_context(mock.patch.object(
+                    hasher_class, method,
+                    timed_hashing(getattr(hasher_class, method))))
+        stack.callback(transport.close)
+
+        start = time.perf_counter()
+        results = asyncio.run(run_flows(
+            transport, flows, concurrency, requests, server is None))
+        elapsed = time.perf_counter() - start
+
+    return {
+        'interface': 'http' if server else interface,
+        'server': server,
+        'concurrency': concurrency,
+        'requests': requests,
+        'async_views': settings.USERS_ASYNC_VIEWS,
+        'elapsed_s': elapsed,
+        'python': platform.python_version(),
+        'django': __import__('django').get_version(),
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'flows': results,
+    }
+
+
+def print_results(results, baseline=None):
+    headers = ['flow', 'req/sec', 'p50 ms', 'p95 ms', 'p99 ms', 'errors',
+               'queries/req', 'hash ms/req']
+    if baseline:
+        headers += ['req/sec before', 'p95 ms before']
+    rows = []
+    for name, flow in results['flows'].items():
+        row = [name, flow['requests_per_sec'], flow.get('p50_ms', '-'),
+               flow.get('p95_ms', '-'), flow.get('p99_ms', '-'),
+               flow['errors'],
+               '-' if flow['queries_per_request'] is None
+               else flow['queries_per_request'],
+               '-' if flow['hash_ms_per_request'] is None
+               else flow['hash_ms_per_request']]
+        if baseline:
+            before = baseline['flows'].get(name, {})
+            row += [before.get('requests_per_sec', '-'),
+                    before.get('p95_ms', '-')]
+        rows.append(row)
+    print('%s, %d virtual users, %d requests per flow each' % (
+        results['interface'].upper(), results['concurrency'],
+        results['requests']))
+    print_table(headers, rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--interface', choices=('wsgi', 'asgi'),
+                        default='wsgi',
+                        help='Application entry point of in-process runs.')
+    parser.add_argument('--server',
+                        help='URL of a running server to benchmark instead, '
+                             'e.g. http://127.0.0.1:8000')
+    parser.add_argument('--concurrency', type=int, default=4,
+                        help='Virtual users (default: 4).')
+    parser.add_argument('--requests', type=int, default=10,
+                        help='Timed requests per flow and virtual user '
+                             '(default: 10).')
+    parser.add_argument('--flows', nargs='+', choices=FLOWS, default=FLOWS)
+    parser.add_argument('--output', help='Save the results as JSON.')
+    parser.add_argument('--compare',
+                        help='JSON results of an earlier run to compare to.')
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    kwargs = dict(interface=args.interface, server=args.server,
+                  concurrency=args.concurrency, requests=args.requests,
+                  flows=args.flows)
+    if args.server:
+        setup()
+        results = run(**kwargs)
+    else:
+        # Load the entry point first: mysite.asgi selects the async views.
+        os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mysite.settings')
+        __import__('mysite.%s' % args.interface)
+        from django.db import connections
+        with tempfile.TemporaryDirectory() as directory:
+            # A file, so that concurrent requests don't share an in-memory
+            # database.
+            for connection in connections.all():
+                if connection.vendor == 'sqlite':
+                    connection.settings_dict['TEST']['NAME'] = os.path.join(
+                        directory, '%s.sqlite3' % connection.alias)
+            with test_database():
+                results = run(**kwargs)
+
+    print_results(results, baseline)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+Measure deactivating users in bulk: a save() per user against chunked
+set-based UPDATEs with users.bulk.update_users().
+
+    $ python -m benchmarks.bulk_update --users 10000
+"""
+import argparse
+import time
+
+from benchmarks.base import print_table, setup, test_database
+
+
+def run(users, chunk_size):
+    from django.db import connection
+
+    from users.bulk import update_users
+    from users.models import User
+
+    User.objects.bulk_create([
+        User(email='user%d@example.com' % n, name='User %d' % n, password='!')
+        for n in range(users)
+    ], batch_size=5000)
+
+    def save_each():
+        for user in User.objects.filter(is_active=True):
+            user.is_active = False
+            user.save()
+
+    def bulk():
+        update_users(User.objects.all(), {'is_active': False}, chunk_size)
+
+    queries = 0
+
+    def count_queries(execute, sql, params, many, context):
+        nonlocal queries
+        queries += 1
+        return execute(sql, params, many, context)
+
+    rows = []
+    for label, func in (('save() per user', save_each),
+                        ('update_users()', bulk)):
+        User.objects.update(is_active=True)
+        queries = 0
+        with connection.execute_wrapper(count_queries):
+            start = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - start
+        rows.append((label, queries, elapsed, users / elapsed))
+
+    print_table(('method', 'queries', 'seconds', 'users/sec'), rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    setup()
+    with test_database():
+        run(args.users, args.chunk_size)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Compare the cost of looking a user up by email as the table grows: the
+indexed ``Lower(email)`` lookup used by ``EmailBackend`` against Django's
+``email__iexact`` filter.
+
+    $ python -m benchmarks.email_lookup --sizes 1000 10000 100000
+"""
+import argparse
+import random
+
+from benchmarks.base import (
+    measure, print_table, setup, summarize, test_database)
+
+
+def grow_table(User, size, batch_size=5000):
+    """Insert users until the table holds ``size`` rows."""
+    start = User.objects.count()
+    for offset in range(start, size, batch_size):
+        User.objects.bulk_create(
+            User(email='user%d@example.com' % i, name='User %d' % i,
+                 password='!')
+            for i in range(offset, min(offset + batch_size, size))
+        )
+
+
+def run(sizes, repeat):
+    from users.models import User
+
+    rows = []
+    for size in sizes:
+        grow_table(User, size)
+        emails = ['USER%d@Example.com' % random.randrange(size)
+                  for _ in range(repeat)]
+        lookups = iter(emails)
+        indexed = summarize(measure(
+            lambda: User.objects.get_by_email(next(lookups)), repeat))
+        lookups = iter(emails)
+        iexact = summarize(measure(
+            lambda: User.objects.get(email__iexact=next(lookups)), repeat))
+        rows.append((size, indexed['mean_ms'], indexed['p95_ms'],
+                     iexact['mean_ms'], iexact['p95_ms']))
+
+    print_table(('users', 'lower() mean ms', 'lower() p95 ms',
+                 'iexact mean ms', 'iexact p95 ms'), rows)
+    print()
+    print('lower():', User.objects.filter_by_email('user0@example.com').explain())
+    print('iexact: ', User.objects.filter(email__iexact='user0@example.com').explain())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[1000, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    setup()
+    with test_database():
+        run(args.sizes, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Measure the peak memory and throughput of exporting the users table:
+the streaming keyset exporter against serializing User.objects.all().
+
+    $ python -m benchmarks.export_users --sizes 10000 100000
+"""
+import argparse
+import csv
+import io
+import time
+import tracemalloc
+
+from benchmarks.base import print_table, setup, test_database
+
+
+def naive_export():
+    from users.export import FIELDS
+    from users.models import User
+
+    f = io.StringIO()
+    writer = csv.writer(f)
+    writer.writerow(FIELDS)
+    for user in User.objects.all():
+        writer.writerow([getattr(user, field) for field in FIELDS])
+    return f.getvalue().encode()
+
+
+def streaming_export():
+    from users.export import export_users
+
+    size = 0
+    for data in export_users():
+        size += len(data)
+    return size
+
+
+def run(sizes):
+    from users.models import User
+
+    rows = []
+    for size in sizes:
+        User.objects.bulk_create([
+            User(email='user%d@example.com' % n, name='User %d' % n,
+                 password='!')
+            for n in range(User.objects.count(), size)
+        ], batch_size=5000)
+        for label, func in (('User.objects.all()', naive_export),
+                            ('streaming', streaming_export)):
+            tracemalloc.start()
+            start = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            rows.append((size, label, peak / 2 ** 20, size / elapsed))
+
+    print_table(('users', 'export', 'peak MiB', 'rows/sec'), rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[10000, 100000])
+    args = parser.parse_args()
+
+    setup()
+    with test_database():
+        run(args.sizes)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Measure construction and rendering of the users forms: BootstrapMixin
+computing the widget attributes on every instantiation against the
+attributes precomputed once per form class.
+
+    $ python -m benchmarks.forms --repeat 500
+"""
+import argparse
+import contextlib
+from unittest import mock
+
+from benchmarks.base import (
+    measure, print_table, setup, summarize, test_database)
+
+
+def legacy_init(self, *args, **kwargs):
+    """BootstrapMixin.__init__ before the per-class precomputation."""
+    from django import forms
+
+    from utilities.forms import BootstrapMixin
+
+    super(BootstrapMixin, self).__init__(*args, **kwargs)
+
+    exempt_widgets = [
+        forms.CheckboxInput,
+        forms.FileInput,
+        forms.RadioSelect,
+        forms.Select,
+    ]
+
+    for field_name, field in self.fields.items():
+
+        if field.widget.__class__ not in exempt_widgets:
+            css = field.widget.attrs.get('class', '')
+            field.widget.attrs['class'] = ' '.join(
+                [css, 'form-control']).strip()
+
+        if field.required and not isinstance(field.widget, forms.FileInput):
+            field.widget.attrs['required'] = 'required'
+
+        if 'placeholder' not in field.widget.attrs and field.label is not None:
+            field.widget.attrs['placeholder'] = field.label
+
+        if field.widget.__class__ == forms.CheckboxInput:
+            css = field.widget.attrs.get('class', '')
+            field.widget.attrs['class'] = ' '.join(
+                (css, 'form-check-input')).strip()
+
+        if field.widget.__class__ == forms.Select:
+            css = field.widget.attrs.get('class', '')
+            field.widget.attrs['class'] = ' '.join(
+                (css, 'form-select')).strip()
+
+
+def run(repeat):
+    from users.forms import (
+        ChangePasswordForm, ProfileForm, SigninForm, SignupForm)
+    from users.models import User
+    from utilities.forms import BootstrapMixin
+
+    user = User.objects.create_user(
+        email='bench@example.com', name='Bench', password='benchpassword123')
+    forms = {
+        'signin': lambda: SigninForm(),
+        'signup': lambda: SignupForm(),
+        'profile': lambda: ProfileForm(instance=user),
+        'change password': lambda: ChangePasswordForm(user),
+    }
+    legacy = mock.patch.object(BootstrapMixin, '__init__', legacy_init)
+
+    rows = []
+    for name, make_form in forms.items():
+        with legacy:
+            legacy_html = str(make_form())
+        assert str(make_form()) == legacy_html, name
+
+        for label in ('legacy', 'precomputed'):
+            with legacy if label == 'legacy' else contextlib.nullcontext():
+                construct = summarize(measure(make_form, repeat))
+                render = summarize(measure(lambda: str(make_form()), repeat))
+            rows.append((name, label, construct['mean_ms'] * 1000,
+                         render['mean_ms'] * 1000))
+
+    print_table(('form', 'BootstrapMixin', 'construct us',
+                 'construct+render us'), rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--repeat', type=int, default=500)
+    args = parser.parse_args()
+
+    setup()
+    with test_database():
+        run(args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Measure the navbar language links: the language switch URL rebuilt from
+settings.LANGUAGES on every call against the precomputed, cached routing
+helper and the per-request alternate language URLs.
+
+    $ python -m benchmarks.i18n_switch --repeat 100000
+"""
+import argparse
+
+from benchmarks.base import measure, print_table, setup, summarize
+
+
+def legacy_switch_lang_code(path, language):
+    """switch_lang_code() before the precomputed routing helper."""
+    from django.conf import settings
+
+    lang_codes = [c for (c, name) in settings.LANGUAGES]
+
+    if path == '':
+        raise Exception('URL path for language switch is empty')
+    elif path[0] != '/':
+        raise Exception('URL path for language switch does not start with "/"')
+    elif language not in lang_codes:
+        raise Exception('%s is not a supported language code' % language)
+
+    parts = path.split('/')
+    if parts[1] in lang_codes:
+        parts[1] = language
+    else:
+        parts[0] = "/" + language
+    return '/'.join(parts)
+
+
+def run(repeat):
+    from django.test import RequestFactory
+
+    from utilities.middleware import AlternateLanguageURLsMiddleware
+    from utilities.templatetags.i18n_switcher import switch_i18n
+
+    request = RequestFactory().get('/ja/users/signin/', {'next': '/blog/'})
+    AlternateLanguageURLsMiddleware(lambda request: None)(request)
+
+    def legacy():
+        for language in ('en', 'ja'):
+            legacy_switch_lang_code(request.get_full_path(), language)
+
+    def cached():
+        for language in ('en', 'ja'):
+            switch_i18n(request, language)
+
+    rows = []
+    for label, func in (('rebuilt per call', legacy),
+                        ('precomputed', cached)):
+        stats = summarize(measure(func, repeat))
+        rows.append((label, stats['mean_ms'] * 1000, stats['p99_ms'] * 1000))
+    print_table(('navbar links', 'mean us', 'p99 us'), rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--repeat', type=int, default=100000)
+    args = parser.parse_args()
+
+    setup()
+    run(args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Measure bulk user import throughput: create_user() per row against the
+import_users command with one and with several hashing processes.
+
+    $ python -m benchmarks.import_users --users 2000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.base import print_table, setup, test_database
+
+
+def run(users, workers):
+    from django.core.management import call_command
+
+    from users.models import User
+
+    def rows(prefix):
+        return [('%s%d@example.com' % (prefix, n), 'User %d' % n,
+                 'benchpassword%d' % n) for n in range(users)]
+
+    def create_users(prefix):
+        for email, name, password in rows(prefix):
+            User.objects.create_user(email, name, password)
+
+    def import_users(prefix, processes):
+        with tempfile.NamedTemporaryFile(
+                'w', suffix='.csv', delete=False) as f:
+            f.write('email,name,password\n')
+            f.writelines('%s,%s,%s\n' % row for row in rows(prefix))
+        try:
+            call_command('import_users', f.name, workers=processes,
+                         verbosity=0)
+        finally:
+            os.unlink(f.name)
+
+    results = []
+    for n, (label, func) in enumerate((
+            ('create_user()', create_users),
+            ('import_users, 1 process',
+             lambda prefix: import_users(prefix, 1)),
+            ('import_users, %d processes' % workers,
+             lambda prefix: import_users(prefix, workers)))):
+        start = time.perf_counter()
+        func('user%d-' % n)
+        elapsed = time.perf_counter() - start
+        results.append((label, elapsed, users / elapsed))
+
+    print_table(('method', 'seconds', 'users/sec'), results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    setup()
+    with test_database():
+        run(args.users, args.workers)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""
+Measure concurrent sign-in throughput with last_login saved on every
+sign-in vs. deferred and written in bulk (settings.LAST_LOGIN_UPDATES).
+
+Runs against a SQLite database file, so that the sign-ins of the worker
+threads contend for its write lock.
+
+    $ python -m benchmarks.last_login --workers 1 4 8 --duration 5
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from benchmarks.base import percentile, print_table, setup, test_database
+
+
+def work(url, users, deadline, results):
+    from django.db import connections
+    from django.test import Client
+
+    from users.last_login import last_logins
+
+    samples = []
+    try:
+        n = 0
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            response = Client().post(url, {
+                'username': users[n % len(users)],
+                'password': 'benchpassword123'})
+            assert response.status_code == 302, response.status_code
+            samples.append(time.perf_counter() - start)
+            n += 1
+    finally:
+        if last_logins.is_due():
+            last_logins.flush()
+        connections.close_all()
+    results.append(samples)
+
+
+def run(workers, duration, users):
+    from django.conf import settings
+    from django.contrib.auth.hashers import make_password
+    from django.db import connection
+    from django.db.backends.signals import connection_created
+    from django.test import override_settings
+    from django.urls import reverse
+
+    from users.last_login import last_logins
+    from users.models import User
+
+    password = make_password('benchpassword123')
+    User.objects.bulk_create(
+        User(email='bench%d@example.com' % n, name='Bench %d' % n,
+             password=password)
+        for n in range(users))
+    emails = list(User.objects.values_list('email', flat=True))
+    url = reverse('users:signin')
+    updates = []
+
+    def count_updates(execute, sql, params, many, context):
+        if sql.startswith('UPDATE "users_user"'):
+            updates.append(sql)
+        return execute(sql, params, many, context)
+
+    def install_counter(connection, **kwargs):
+        connection.execute_wrappers.append(count_updates)
+
+    throttle = {**settings.SIGNIN_THROTTLE,
+                'RATES': {'ip': (10 ** 9, 300), 'email': (10 ** 9, 300)}}
+    rows = []
+    for mode in ('immediate', 'deferred'):
+        for count in workers:
+            results = []
+            updates.clear()
+            with override_settings(LAST_LOGIN_UPDATES=mode,
+                                   SIGNIN_THROTTLE=throttle):
+                deadline = time.monotonic() + duration
+                threads = [
+                    threading.Thread(target=work,
+                                     args=(url, emails, deadline, results))
+                    for _ in range(count)]
+                connection_created.connect(install_counter)
+                try:
+                    for thread in threads:
+                        thread.start()
+                    for thread in threads:
+                        thread.join()
+                finally:
+                    connection_created.disconnect(install_counter)
+                with connection.execute_wrapper(count_updates):
+                    last_logins.flush()
+            samples = [s for r in results for s in r]
+            rows.append((mode, count, len(samples) / duration,
+                         len(updates), percentile(samples, 95) * 1000))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 8])
+    parser.add_argument('--duration', type=float, default=5,
+                        help='Seconds per worker count.')
+    parser.add_argument('--users', type=int, default=100)
+    args = parser.parse_args()
+
+    setup()
+    from django.db import connection
+    from django.test import override_settings
+
+    with tempfile.TemporaryDirectory() as directory, \
+            override_settings(PASSWORD_HASHERS=[
+                'django.contrib.auth.hashers.MD5PasswordHasher']):
+        connection.settings_dict['TEST']['NAME'] = os.path.join(
+            directory, 'db.sqlite3')
+        with test_database():
+            rows = run(args.workers, args.duration, args.users)
+
+    print_table(('last_login', 'workers', 'signins/s', 'user UPDATEs',
+                 'p95 ms'), rows)
+
+
+if __name__ == '__main__':
+    main()
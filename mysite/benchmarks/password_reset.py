@@ -0,0 +1,95 @@
+"""
+Measure password reset latency with the email sent over SMTP inside the
+request against queued for the send_queued_mail worker, and the worker's
+throughput with one connection per message against one per run.
+
+    $ python -m benchmarks.password_reset --repeat 50 --smtp-delay 20
+"""
+import argparse
+import time
+
+from benchmarks.base import (
+    measure, print_table, setup, summarize, test_database)
+
+
+def run(repeat, smtp_delay):
+    from django.core.mail import get_connection
+    from django.test import Client, override_settings
+    from django.urls import reverse
+
+    from users.models import User
+    from utilities.mail import send_queued_mail
+    from utilities.models import QueuedEmail
+    from utilities.testing import SMTPStandIn
+
+    User.objects.create_user(
+        email='bench@example.com', name='Bench', password='benchpassword123')
+    url = reverse('users:password_reset')
+    client = Client()
+
+    def reset():
+        response = client.post(url, {'email': 'bench@example.com'})
+        assert response.status_code == 302, response.status_code
+
+    smtp_backend = 'django.core.mail.backends.smtp.EmailBackend'
+    with SMTPStandIn(delay=smtp_delay / 1000) as smtp, \
+            override_settings(EMAIL_HOST='127.0.0.1', EMAIL_PORT=smtp.port,
+                              QUEUED_EMAIL_BACKEND=smtp_backend):
+        rows = []
+        for label, backend in (('SMTP in request', smtp_backend),
+                               ('queued', 'utilities.mail.QueuedEmailBackend')):
+            with override_settings(EMAIL_BACKEND=backend):
+                stats = summarize(measure(reset, repeat))
+            rows.append((label, stats['mean_ms'], stats['p95_ms']))
+        print_table(('reset email', 'mean ms', 'p95 ms'), rows)
+        print()
+
+        class ConnectionPerMessage:
+            """A connection that opens a new SMTP session for every message."""
+
+            def __init__(self):
+                self.connection = get_connection(smtp_backend)
+
+            def open(self):
+                pass
+
+            close = open
+
+            def send_messages(self, messages):
+                with self.connection:
+                    return self.connection.send_messages(messages)
+
+        rows = []
+        for label, connection in (('per message', ConnectionPerMessage()),
+                                  ('persistent', None)):
+            QueuedEmail.objects.all().delete()
+            with override_settings(
+                    EMAIL_BACKEND='utilities.mail.QueuedEmailBackend'):
+                for _ in range(repeat):
+                    reset()
+            connections = smtp.connections
+            start = time.perf_counter()
+            sent, failed = send_queued_mail(connection=connection)
+            elapsed = time.perf_counter() - start
+            assert (sent, failed) == (repeat, 0), (sent, failed)
+            rows.append((label, smtp.connections - connections,
+                         sent / elapsed))
+        print_table(('worker connection', 'SMTP sessions', 'messages/sec'),
+                    rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--smtp-delay', type=float, default=20,
+                        help='Milliseconds the SMTP stand-in spends per '
+                             'message (default: 20).')
+    args = parser.parse_args()
+
+    setup()
+    with test_database():
+        run(args.repeat, args.smtp_delay)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Measure the overhead of ServerTimingMiddleware: latency of the signin and
+profile pages with and without it.
+
+    $ python -m benchmarks.server_timing --repeat 500
+"""
+import argparse
+
+from benchmarks.base import (
+    measure, print_table, setup, summarize, test_database)
+
+
+def run(repeat):
+    from django.conf import settings
+    from django.test import Client, override_settings
+    from django.urls import reverse
+
+    from users.models import User
+
+    user = User.objects.create_user(
+        email='bench@example.com', name='Bench', password='benchpassword123')
+    pages = {
+        'signin': (None, reverse('users:signin')),
+        'profile': (user, reverse('users:profile', kwargs={'pk': user.pk})),
+    }
+    without = [
+        name for name in settings.MIDDLEWARE
+        if name != 'utilities.middleware.ServerTimingMiddleware'
+    ]
+
+    rows = []
+    for page, (signed_in, url) in pages.items():
+        means = {}
+        for label, middleware in (('off', without),
+                                  ('on', settings.MIDDLEWARE)):
+            with override_settings(MIDDLEWARE=middleware,
+                                   SERVER_TIMING_HEADER=True):
+                client = Client()
+                if signed_in is not None:
+                    client.force_login(signed_in)
+                client.get(url)
+                stats = summarize(measure(lambda: client.get(url), repeat))
+            means[label] = stats['mean_ms']
+            rows.append((page, label, stats['mean_ms'], stats['p95_ms']))
+        rows.append((page, 'overhead', means['on'] - means['off'], ''))
+
+    print_table(('page', 'server timing', 'mean ms', 'p95 ms'), rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--repeat', type=int, default=500)
+    args = parser.parse_args()
+
+    setup()
+    with test_database():
+        run(args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""
+Measure authenticated page views with each session profile of
+settings.SESSION_PROFILES: latency and session table queries per request.
+
+    $ python -m benchmarks.sessions --repeat 200
+"""
+import argparse
+
+from benchmarks.base import (
+    measure, print_table, setup, summarize, test_database)
+
+
+def run(repeat):
+    from django.conf import settings
+    from django.core.cache import cache
+    from django.db import connection
+    from django.test import Client, override_settings
+    from django.test.utils import CaptureQueriesContext
+    from django.urls import reverse
+
+    from users.models import User
+
+    user = User.objects.create_user(
+        email='bench@example.com', name='Bench', password='benchpassword123')
+    url = reverse('users:profile', kwargs={'pk': user.pk})
+
+    rows = []
+    for profile, engine in settings.SESSION_PROFILES.items():
+        with override_settings(SESSION_ENGINE=engine):
+            cache.clear()
+            client = Client()
+            client.force_login(user)
+            client.get(url)
+
+            with CaptureQueriesContext(connection) as queries:
+                client.get(url)
+            session_queries = len([
+                q for q in queries if 'django_session' in q['sql']])
+
+            stats = summarize(measure(lambda: client.get(url), repeat))
+        rows.append((profile, session_queries, stats['mean_ms'],
+                     stats['p95_ms']))
+
+    print_table(('session profile', 'session queries', 'mean ms', 'p95 ms'),
+                rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    setup()
+    with test_database():
+        run(args.repeat)
+
+
+if __name__ == '__main__':
+    main()
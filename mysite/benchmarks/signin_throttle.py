@@ -0,0 +1,62 @@
+"""
+Measure the CPU cost of a sign-in attempt rejected by the sign-in throttle
+against one that goes on to password verification.
+
+    $ python -m benchmarks.signin_throttle --repeat 50
+"""
+import argparse
+import logging
+import time
+
+from benchmarks.base import print_table, setup, test_database
+
+
+def cpu_per_request(func, repeat):
+    start = time.process_time()
+    for _ in range(repeat):
+        func()
+    return (time.process_time() - start) / repeat
+
+
+def run(repeat):
+    from django.test import Client, override_settings
+    from django.urls import reverse
+
+    from users.models import User
+    from users.throttling import reset_signin_throttle, signin_attempts
+
+    User.objects.create_user(
+        email='bench@example.com', name='Bench', password='benchpassword123')
+    url = reverse('users:signin')
+    data = {'username': 'bench@example.com', 'password': 'wrongpassword'}
+
+    # Every throttled attempt would otherwise log a 429 warning.
+    logging.getLogger('django.request').setLevel(logging.ERROR)
+
+    rows = []
+    for label, limit in (('verified', 10 ** 9), ('throttled', 0)):
+        rates = {'ip': (10 ** 9, 300), 'email': (limit, 300)}
+        with override_settings(SIGNIN_THROTTLE={
+                'BACKEND': 'users.throttling.MemoryBackend', 'RATES': rates}):
+            reset_signin_throttle(setting='SIGNIN_THROTTLE')
+            client = Client()
+            before = signin_attempts.get(outcome=label)
+            cpu = cpu_per_request(lambda: client.post(url, data), repeat)
+            rows.append((label, signin_attempts.get(outcome=label) - before,
+                         cpu * 1000))
+
+    print_table(('attempt', 'count', 'CPU ms/request'), rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    setup()
+    with test_database():
+        run(args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Measure signup throughput through ``users:signup``: the single-hash
+pipeline against the previous save-then-authenticate implementation.
+
+    $ python -m benchmarks.signup --repeat 50
+"""
+import argparse
+import itertools
+from unittest import mock
+
+from benchmarks.base import (
+    measure, print_table, setup, summarize, test_database)
+
+
+def legacy_form_valid(self, form):
+    """SignupView.form_valid before the single-hash pipeline."""
+    from django.contrib.auth import authenticate, login
+    from django.views.generic import CreateView
+
+    response = CreateView.form_valid(self, form)
+    user = authenticate(username=form.cleaned_data.get('email'),
+                        password=form.cleaned_data.get('password1'))
+    if user:
+        login(self.request, user)
+    return response
+
+
+def run(repeat):
+    from django.contrib.auth.hashers import get_hasher
+    from django.test import Client
+    from django.urls import reverse
+
+    from users.views import SignupView
+
+    url = reverse('users:signup')
+    counter = itertools.count()
+    hasher_class = type(get_hasher())
+
+    def signup():
+        n = next(counter)
+        response = Client().post(url, {
+            'email': 'user%d@example.com' % n,
+            'name': 'User %d' % n,
+            'password1': 'benchpassword123',
+            'password2': 'benchpassword123',
+        })
+        assert response.status_code == 302, response.status_code
+
+    rows = []
+    for label, form_valid in (('legacy', legacy_form_valid),
+                              ('single hash', SignupView.form_valid)):
+        with mock.patch.object(SignupView, 'form_valid', form_valid), \
+                mock.patch.object(hasher_class, 'encode', autospec=True,
+                                  side_effect=hasher_class.encode) as encode:
+            samples = measure(signup, repeat)
+        stats = summarize(samples)
+        rows.append((label, encode.call_count / repeat,
+                     repeat / sum(samples), stats['mean_ms'], stats['p95_ms']))
+
+    print_table(('pipeline', 'hashes/signup', 'signups/sec', 'mean ms',
+                 'p95 ms'), rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    setup()
+    with test_database():
+        run(args.repeat)
+
+
+if __name__ == '__main__':
+    main()
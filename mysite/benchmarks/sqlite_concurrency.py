@@ -0,0 +1,125 @@
+"""
+Measure read and write throughput of a SQLite database file with each
+profile of settings.DATABASE_PROFILES, by number of concurrent workers.
+
+Each worker thread runs requests of one operation for the given duration,
+opening and closing its connection around each request the way Django
+does: a read loads ten users, a write is a sign-in (last_login update and
+a new session). Writes that time out on the database lock are counted as
+locked.
+
+    $ python -m benchmarks.sqlite_concurrency --workers 1 2 4 8 --duration 5
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+import uuid
+
+from benchmarks.base import percentile, print_table, setup, test_database
+
+
+def work(pks, write_ratio, deadline, results):
+    from django.contrib.sessions.models import Session
+    from django.db import OperationalError, close_old_connections, connections
+    from django.utils import timezone
+
+    from users.models import User
+
+    rng = random.Random()
+    reads = writes = locked = 0
+    samples = []
+    try:
+        while time.monotonic() < deadline:
+            close_old_connections()
+            start = time.perf_counter()
+            try:
+                if rng.random() < write_ratio:
+                    now = timezone.now()
+                    User.objects.filter(pk=rng.choice(pks)).update(
+                        last_login=now)
+                    Session.objects.create(
+                        session_key=uuid.uuid4().hex, session_data='',
+                        expire_date=now)
+                    writes += 1
+                else:
+                    list(User.objects.filter(pk__in=rng.sample(pks, 10)))
+                    reads += 1
+            except OperationalError:
+                locked += 1
+            samples.append(time.perf_counter() - start)
+            close_old_connections()
+    finally:
+        connections.close_all()
+    results.append((reads, writes, locked, samples))
+
+
+def run(workers, duration, write_ratio, users):
+    from django.contrib.auth.hashers import make_password
+
+    from users.models import User
+
+    password = make_password('benchpassword123')
+    User.objects.bulk_create(
+        User(email='bench%d@example.com' % n, name='Bench %d' % n,
+             password=password)
+        for n in range(users))
+    pks = list(User.objects.values_list('pk', flat=True))
+
+    rows = []
+    for count in workers:
+        results = []
+        deadline = time.monotonic() + duration
+        threads = [
+            threading.Thread(target=work,
+                             args=(pks, write_ratio, deadline, results))
+            for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        reads, writes, locked = (sum(r[i] for r in results) for i in range(3))
+        samples = [s for r in results for s in r[3]]
+        rows.append((count, reads / duration, writes / duration, locked,
+                     percentile(samples, 95) * 1000))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--workers', type=int, nargs='+',
+                        default=[1, 2, 4, 8])
+    parser.add_argument('--duration', type=float, default=5,
+                        help='Seconds per worker count.')
+    parser.add_argument('--write-ratio', type=float, default=0.2)
+    parser.add_argument('--users', type=int, default=1000)
+    args = parser.parse_args()
+
+    setup()
+    from django.conf import settings
+    from django.db import connection
+    from django.test import override_settings
+
+    rows = []
+    for profile, options in settings.DATABASE_PROFILES.items():
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(SQLITE_PRAGMAS=options['PRAGMAS']):
+            # Shared with the connections of the worker threads.
+            connection.settings_dict['TEST']['NAME'] = os.path.join(
+                directory, 'db.sqlite3')
+            connection.settings_dict['CONN_MAX_AGE'] = options['CONN_MAX_AGE']
+            with test_database():
+                rows.extend(
+                    (profile,) + row for row in run(
+                        args.workers, args.duration, args.write_ratio,
+                        args.users))
+
+    print_table(('profile', 'workers', 'reads/s', 'writes/s', 'locked',
+                 'p95 ms'), rows)
+
+
+if __name__ == '__main__':
+    main()
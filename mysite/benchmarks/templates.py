@@ -0,0 +1,88 @@
+"""
+Measure rendering of the users pages: templates loaded and compiled on
+every render against the cached template loader, plus whole-form
+rendering with render_form against a render_field tag per field.
+
+    $ python -m benchmarks.templates --repeat 200
+"""
+import argparse
+import copy
+import re
+
+from benchmarks.base import (
+    measure, print_table, setup, summarize, test_database)
+
+
+def run(repeat):
+    from django.conf import settings
+    from django.template import Context, Template
+    from django.test import Client, override_settings
+    from django.urls import reverse
+
+    from users.forms import SignupForm
+    from users.models import User
+
+    user = User.objects.create_user(
+        email='bench@example.com', name='Bench', password='benchpassword123')
+    anonymous, authenticated = Client(), Client()
+    authenticated.force_login(user)
+    pages = [
+        ('signin', anonymous, reverse('users:signin')),
+        ('signup', anonymous, reverse('users:signup')),
+        ('password reset', anonymous, reverse('users:password_reset')),
+        ('password change', authenticated, reverse('users:change_password')),
+        ('profile', authenticated,
+         reverse('users:profile', kwargs={'pk': user.pk})),
+    ]
+
+    # The previous configuration: APP_DIRS and the default form renderer,
+    # neither of which caches compiled templates while DEBUG is on.
+    templates = copy.deepcopy(settings.TEMPLATES)
+    del templates[0]['OPTIONS']['loaders']
+    templates[0]['APP_DIRS'] = True
+    uncached = override_settings(
+        TEMPLATES=templates,
+        FORM_RENDERER='django.forms.renderers.DjangoTemplates')
+
+    def get(client, url):
+        content = client.get(url).content.decode()
+        return re.sub(r'name="csrfmiddlewaretoken" value="\w+"', '', content)
+
+    rows = []
+    for name, client, url in pages:
+        with uncached:
+            html = get(client, url)
+        assert get(client, url) == html, name
+        for label in ('uncached', 'cached'):
+            with uncached if label == 'uncached' else override_settings():
+                stats = summarize(measure(lambda: client.get(url), repeat))
+            rows.append((name, label, stats['mean_ms'], stats['p95_ms']))
+    print_table(('page', 'templates', 'mean ms', 'p95 ms'), rows)
+    print()
+
+    form = SignupForm()
+    rows = []
+    for label, source in (
+            ('render_field per field',
+             '{% for field in form %}{% render_field field %}\n'
+             '{% endfor %}'),
+            ('render_form', '{% render_form form %}')):
+        template = Template('{% load form_helpers %}' + source)
+        stats = summarize(measure(
+            lambda: template.render(Context({'form': form})), repeat))
+        rows.append((label, stats['mean_ms'], stats['p95_ms']))
+    print_table(('signup form', 'mean ms', 'p95 ms'), rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    setup()
+    with test_database():
+        run(args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Compare authenticated page views with and without the user cache: queries
+per request, queries hitting ``users_user`` and latency. The user cache
+needs a cache shared by processes: a file based one stands in for it.
+
+    $ python -m benchmarks.user_cache --repeat 500
+"""
+import argparse
+import tempfile
+
+from benchmarks.base import (
+    measure, print_table, setup, summarize, test_database)
+
+
+def run(repeat):
+    from django.core.cache import cache
+    from django.db import connection
+    from django.test import Client, override_settings
+    from django.test.utils import CaptureQueriesContext
+    from django.urls import reverse
+
+    from users.models import User
+
+    User.objects.create_user(
+        email='bench@example.com', name='Bench', password='benchpassword123')
+    url = reverse('blog:home')
+
+    rows = []
+    with tempfile.TemporaryDirectory() as location:
+        shared_cache = {'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': location,
+        }}
+        for label, timeout in (('uncached', 0), ('cached', 300)):
+            with override_settings(
+                    CACHES=shared_cache, USER_CACHE_TIMEOUT=timeout):
+                cache.clear()
+                client = Client()
+                client.login(username='bench@example.com',
+                             password='benchpassword123')
+                client.get(url)
+                with CaptureQueriesContext(connection) as queries:
+                    client.get(url)
+                # Read the captured queries now: the query log is reset by
+                # the next request.
+                total_queries = len(queries)
+                user_queries = sum('users_user' in q['sql'] for q in queries)
+                stats = summarize(measure(lambda: client.get(url), repeat))
+                rows.append((label, total_queries, user_queries,
+                             stats['mean_ms'], stats['p95_ms']))
+
+    print_table(('user loader', 'queries/request', 'user queries/request',
+                 'mean ms', 'p95 ms'), rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--repeat', type=int, default=500)
+    args = parser.parse_args()
+
+    setup()
+    with test_database():
+        run(args.repeat)
+
+
+if __name__ == '__main__':
+    main()
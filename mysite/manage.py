@@ -6,7 +6,11 @@ import sys
 
 def main():
     """Run administrative tasks."""
-    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mysite.settings')
+    # The tests add throwaway databases, see mysite.test_settings.
+    os.environ.setdefault(
+        'DJANGO_SETTINGS_MODULE',
+        'mysite.test_settings' if sys.argv[1:2] == ['test']
+        else 'mysite.settings')
     try:
         from django.core.management import execute_from_command_line
     except ImportError as exc:
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/4.0/ref/settings/
 from django.utils.translation import gettext_lazy as _
 
 from pathlib import Path
+import json
 import os
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -39,6 +40,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.forms',
     'fontawesomefree',
     'blog',
     'users',
@@ -46,9 +48,12 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'utilities.middleware.ServerTimingMiddleware',
+    'utilities.middleware.PrimaryPinMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.locale.LocaleMiddleware',
+    'utilities.middleware.AlternateLanguageURLsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -60,9 +65,9 @@ ROOT_URLCONF = 'mysite.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Django's backend, timing renders for ServerTimingMiddleware.
+        'BACKEND': 'utilities.timing.DjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
@@ -70,22 +75,153 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            # Compile each template once, also with DEBUG on (the dev
+            # server's autoreloader clears the cache when a template
+            # changes). Replaces APP_DIRS.
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
         },
     },
 ]
 
+# Render form widgets through TEMPLATES as well, so that their templates are
+# cached too (django.forms in INSTALLED_APPS provides them).
+FORM_RENDERER = 'django.forms.renderers.TemplatesSetting'
+
 WSGI_APPLICATION = 'mysite.wsgi.application'
 
 
 # Database
 # https://docs.djangoproject.com/en/4.0/ref/settings/#databases
 
+# Database profile, chosen with the DJANGO_DATABASE_PROFILE environment
+# variable:
+#   development  SQLite's defaults, a new connection per request (default)
+#   production   write-ahead logging, so that reads don't wait for writers and
+#                commits are cheaper (synchronous=NORMAL only syncs at
+#                checkpoints: a power loss may lose the last commits, never
+#                corrupt the database), waiting up to busy_timeout ms for the
+#                write lock, a larger page cache and memory-mapped reads.
+#                Connections are reused for CONN_MAX_AGE seconds.
+# SQLITE_PRAGMAS are set on every new connection by utilities.db.
+DATABASE_PROFILES = {
+    'development': {
+        'CONN_MAX_AGE': 0,
+        'PRAGMAS': {},
+    },
+    'production': {
+        'CONN_MAX_AGE': 600,
+        'PRAGMAS': {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',
+            'busy_timeout': 10000,
+            'cache_size': -64 * 1024,  # KiB
+            'mmap_size': 256 * 1024 * 1024,
+            'temp_store': 'MEMORY',
+        },
+    },
+}
+_database_profile = DATABASE_PROFILES[
+    os.environ.get('DJANGO_DATABASE_PROFILE', 'development')]
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': _database_profile['CONN_MAX_AGE'],
     }
 }
+SQLITE_PRAGMAS = _database_profile['PRAGMAS']
+
+# Read replicas of the default (primary) database: a comma-separated list of
+# SQLite files in the DJANGO_DATABASE_REPLICAS environment variable, added as
+# the aliases replica1, replica2, ... utilities.routers.PrimaryReplicaRouter
+# sends the reads of DATABASE_REPLICA_MODELS to a random replica and the
+# writes to the primary. A client whose request wrote one of these models is
+# pinned to the primary for DATABASE_PRIMARY_PIN_SECONDS by
+# utilities.middleware.PrimaryPinMiddleware, so that it reads its own writes.
+DATABASE_REPLICAS = []
+for _number, _name in enumerate(filter(None, os.environ.get(
+        'DJANGO_DATABASE_REPLICAS', '').split(',')), 1):
+    DATABASE_REPLICAS.append('replica%d' % _number)
+    DATABASES[DATABASE_REPLICAS[-1]] = {**DATABASES['default'], 'NAME': _name}
+DATABASE_REPLICA_MODELS = ['users.user', 'sessions.session']
+DATABASE_PRIMARY_PIN_SECONDS = 10
+DATABASE_PRIMARY_PIN_COOKIE = 'primary_pin'
+
+# Sharding of users.User across the databases of USER_SHARDS: a
+# comma-separated list of SQLite files in the DJANGO_USER_SHARDS environment
+# variable, added as the aliases shard1, shard2, ... and migrated like
+# default. A user lives on the shard owning the virtual shard of its email
+# address, which is also encoded in its id, so that a user is found by email
+# or id on one database (see users.sharding). USER_SHARD_MAP records which
+# shard owns each virtual shard; after adding or removing shards, run
+# rebalance_user_shards to move users and write it. Empty: no sharding.
+USER_SHARDS = []
+for _number, _name in enumerate(filter(None, os.environ.get(
+        'DJANGO_USER_SHARDS', '').split(',')), 1):
+    USER_SHARDS.append('shard%d' % _number)
+    DATABASES[USER_SHARDS[-1]] = {**DATABASES['default'], 'NAME': _name}
+USER_SHARD_MAP = Path(os.environ.get(
+    'DJANGO_USER_SHARD_MAP', BASE_DIR / 'user_shards.json'))
+
+DATABASE_ROUTERS = [
+    'users.sharding.UserShardRouter',
+    'utilities.routers.PrimaryReplicaRouter',
+]
+
+
+# Password hashing
+# The hashers and their work factors come from the host's hasher profile,
+# written by `manage.py calibrate_hashers`. Without a profile Django's
+# default hashers and work factors are used. Existing hashes are upgraded
+# to the preferred hasher on the next successful sign-in.
+
+PASSWORD_HASHER_PROFILE = Path(os.environ.get(
+    'DJANGO_PASSWORD_HASHER_PROFILE', BASE_DIR / 'hasher_profile.json'))
+
+if PASSWORD_HASHER_PROFILE.exists():
+    with open(PASSWORD_HASHER_PROFILE) as f:
+        _hasher_profile = json.load(f)
+else:
+    _hasher_profile = {}
+
+PASSWORD_HASHERS = _hasher_profile.get('hashers', [
+    'users.hashers.CalibratedPBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'users.hashers.CalibratedArgon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'users.hashers.CalibratedScryptPasswordHasher',
+])
+
+PASSWORD_HASHER_PARAMS = _hasher_profile.get('params', {})
+
+
+# Sign-in throttling (users.throttling). Attempts over a rate are rejected
+# before any password hashing: 'ip' limits the attempts per client IP and
+# 'email' the failed attempts per email address, as (count, seconds).
+# users.throttling.MemoryBackend keeps the counters in process instead.
+SIGNIN_THROTTLE = {
+    'BACKEND': 'users.throttling.CacheBackend',
+    'OPTIONS': {'alias': 'default'},
+    'RATES': {
+        'ip': (50, 300),
+        'email': (5, 300),
+    },
+}
+
+# Password reset requests for the same email address within this many
+# seconds are coalesced into the first one: only one email is sent. The
+# markers live in PASSWORD_RESET_CACHE_ALIAS, which must be shared by all
+# workers: the system checks reject coalescing with a per-process
+# LocMemCache, like the default one, so it is disabled (0) until a shared
+# cache is configured, as for LAST_LOGIN_UPDATES below. E.g., 300.
+PASSWORD_RESET_COALESCE_WINDOW = 0
+PASSWORD_RESET_CACHE_ALIAS = 'default'
 
 
 # Password validation
@@ -133,6 +269,73 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'users.User'
 
+AUTHENTICATION_BACKENDS = [
+    'users.backends.EmailBackend',
+]
+
+# Session storage, chosen with the DJANGO_SESSION_PROFILE environment variable:
+#   db              a django_session row per session (default)
+#   cached_db       db, with reads served from SESSION_CACHE_ALIAS
+#   cache           SESSION_CACHE_ALIAS only; sessions are lost with the cache
+#   signed_cookies  stored client side in a signed cookie, no server storage
+# The cache profiles need a shared, persistent cache (e.g. memcached or Redis)
+# when running several processes. Expired db sessions are deleted by the
+# purge_sessions command.
+SESSION_PROFILES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'cache': 'django.contrib.sessions.backends.cache',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+SESSION_ENGINE = SESSION_PROFILES[os.environ.get('DJANGO_SESSION_PROFILE', 'db')]
+SESSION_CACHE_ALIAS = 'default'
+
+# Cache used by users.backends.EmailBackend to load the signed in user
+# without a query. It must be shared by the processes (e.g. memcached or
+# Redis), so that invalidations are seen by every worker: with a per-process
+# LocMemCache, like the default one, the user cache is not used.
+# A timeout of 0 disables the user cache.
+USER_CACHE_ALIAS = 'default'
+USER_CACHE_TIMEOUT = 300
+
+# Seconds a bulk user admin action may spend updating users before it stops
+# and asks to be run again, to stay well within the request timeout.
+USERS_BULK_ACTION_TIME_BUDGET = 10
+
+# Serve the async variants of the users views. Enabled by mysite/asgi.py.
+USERS_ASYNC_VIEWS = os.environ.get('DJANGO_USERS_ASYNC_VIEWS') == '1'
+
+# Size of the thread pools the async users views run blocking work on:
+# password hashing (CPU bound).
+USERS_EXECUTOR_WORKERS = {
+    'hasher': os.cpu_count() or 1,
+}
+
+# Authentication events (users.models.AuditEvent) are buffered in each
+# process and written AUDIT_LOG_BATCH_SIZE at a time, after a request once a
+# batch is pending or the oldest event has waited AUDIT_LOG_FLUSH_INTERVAL
+# seconds, and at exit. prune_audit_log deletes the events older than
+# AUDIT_LOG_RETENTION_DAYS.
+AUDIT_LOG_BATCH_SIZE = 100
+AUDIT_LOG_FLUSH_INTERVAL = 10
+AUDIT_LOG_RETENTION_DAYS = 365
+
+# last_login is saved on every sign-in ('immediate'), or, if 'deferred',
+# recorded in memory and in LAST_LOGIN_CACHE_ALIAS, and written in bulk after
+# a request once the oldest pending sign-in waited LAST_LOGIN_FLUSH_INTERVAL
+# seconds, and at exit (see users.last_login). A crash loses at most one
+# interval of sign-ins per process. The cache must be shared by all workers,
+# so that password reset tokens and sweep_stale_users see the pending
+# sign-ins: the system checks reject deferred updates with a per-process
+# LocMemCache, like the default one. E.g., with memcached:
+#   CACHES = {'default': {
+#       'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+#       'LOCATION': '127.0.0.1:11211',
+#   }}
+LAST_LOGIN_UPDATES = 'immediate'
+LAST_LOGIN_CACHE_ALIAS = 'default'
+LAST_LOGIN_FLUSH_INTERVAL = 30
+
 LOGIN_URL = 'users:signin'
 LOGIN_REDIRECT_URL = 'blog:home'
 LOGOUT_REDIRECT_URL = 'users:signin'
@@ -150,4 +353,22 @@ LOCALE_PATHS = (
     os.path.join(BASE_DIR, 'locale'),
 )
 
-EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+# Outgoing mail is queued in the database and delivered by the
+# send_queued_mail worker through QUEUED_EMAIL_BACKEND over one connection,
+# retrying failed messages after RETRY_DELAY seconds, doubled on every
+# attempt up to MAX_RETRY_DELAY. Workers lease the messages they claim for
+# LEASE seconds.
+EMAIL_BACKEND = 'utilities.mail.QueuedEmailBackend'
+QUEUED_EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+QUEUED_EMAIL_MAX_ATTEMPTS = 5
+QUEUED_EMAIL_RETRY_DELAY = 60
+QUEUED_EMAIL_MAX_RETRY_DELAY = 3600
+QUEUED_EMAIL_LEASE = 300
+
+# utilities.middleware.ServerTimingMiddleware times the database, password
+# hashing, templates and the view of every request into histograms served
+# at /metrics to METRICS_ALLOWED_IPS. If SERVER_TIMING_HEADER is on, the
+# timings are also sent to those addresses in a Server-Timing header; it is
+# off by default, as the hashing and database timings help timing attacks.
+SERVER_TIMING_HEADER = False
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
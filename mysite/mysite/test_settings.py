@@ -0,0 +1,11 @@
+"""
+Settings for the tests, which manage.py uses for the test command.
+"""
+from .settings import *  # noqa: F401,F403
+
+
+# A throwaway replica and shards, whose test databases are created in memory
+# for the tests declaring them (see utilities.tests.ReplicaTestCase and
+# users.tests.ShardedUserTestCase).
+for _alias in ('test_replica', 'test_shard1', 'test_shard2'):
+    DATABASES[_alias] = {**DATABASES['default'], 'NAME': ':memory:'}
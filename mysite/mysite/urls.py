@@ -17,9 +17,13 @@ from django.contrib import admin
 from django.urls import include, path
 from . import views
 from django.conf.urls.i18n import i18n_patterns
+from utilities.views import metrics
 
 
-urlpatterns = i18n_patterns(
+# Outside i18n_patterns, so that scrapers get one stable path.
+urlpatterns = [
+    path(r'metrics', metrics, name='metrics'),
+] + i18n_patterns(
     path(r'admin/', admin.site.urls),
     path(r'', views.TopPageView.as_view(), name='toppage'),
     path(r'blog/', include('blog.urls')),
@@ -1,14 +1,47 @@
 from django import forms
-from django.contrib import admin
+from django.conf import settings
+from django.contrib import admin, messages
 from django.contrib.auth.models import Group
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.forms import ReadOnlyPasswordHashField
 from django.contrib.auth.forms import UserCreationForm as DjangoUserCreationForm
+from django.core.exceptions import ValidationError
+from django.http import StreamingHttpResponse
+from django.utils.translation import gettext_lazy as _
 
-from .models import User
+from utilities.admin import UserDatabaseLogMixin
+from utilities.paginators import EstimatedCountPaginator
 
+from .bulk import update_users
+from .export import export_users
+from .models import AuditEvent, User
+from .sharding import is_sharded, shard_for_pk
 
-class UserCreationForm(DjangoUserCreationForm):
+
+class UniqueEmailMixin:
+    """Validate that the email address is unique, ignoring case. The
+    lookup goes through the same ``Lower(email)`` index as sign-in."""
+
+    def clean_email(self):
+        email = User.objects.normalize_email(self.cleaned_data.get('email'))
+        users = User.objects.filter_by_email(email)
+        if self.instance.pk is not None:
+            users = users.exclude(pk=self.instance.pk)
+        if users.exists():
+            raise self.instance.unique_error_message(User, ('email',))
+        return email
+
+    def validate_unique(self):
+        # clean_email() already covers the unique constraint on email, so
+        # the model's case-sensitive check would only repeat the query.
+        exclude = [*self._get_validation_exclusions(), 'email']
+        try:
+            self.instance.validate_unique(exclude=exclude)
+        except forms.ValidationError as e:
+            self._update_errors(e)
+
+
+class UserCreationForm(UniqueEmailMixin, DjangoUserCreationForm):
     """A form for creating new users. Includes all the required
     fields, plus a repeated password."""
     class Meta:
@@ -16,7 +49,7 @@ class UserCreationForm(DjangoUserCreationForm):
         fields = ('email', 'name', 'password1', 'password2')
 
 
-class UserChangeForm(forms.ModelForm):
+class UserChangeForm(UniqueEmailMixin, forms.ModelForm):
     """A form for updating users. Includes all the fields on
     the user, but replaces the password field with admin's
     disabled password hash display field.
@@ -28,7 +61,39 @@ class UserChangeForm(forms.ModelForm):
         fields = ('email', 'password', 'name', 'is_active', 'is_admin')
 
 
-class UserAdmin(BaseUserAdmin):
+class ShardListFilter(admin.SimpleListFilter):
+    """
+    List the users of one shard at a time, the first one by default, so
+    that the changelist, its search and the actions run on the database of
+    that shard.
+    """
+    title = _('shard')
+    parameter_name = 'shard'
+
+    def lookups(self, request, model_admin):
+        return [(alias, alias) for alias in settings.USER_SHARDS]
+
+    def value(self):
+        value = super().value()
+        if value not in settings.USER_SHARDS:
+            return settings.USER_SHARDS[0]
+        return value
+
+    def choices(self, changelist):
+        # No "All": the shards are separate databases.
+        for lookup, title in self.lookup_choices:
+            yield {
+                'selected': self.value() == lookup,
+                'query_string': changelist.get_query_string(
+                    {self.parameter_name: lookup}),
+                'display': title,
+            }
+
+    def queryset(self, request, queryset):
+        return queryset.using(self.value())
+
+
+class UserAdmin(UserDatabaseLogMixin, BaseUserAdmin):
     # The forms to add and change user instances
     form = UserChangeForm
     add_form = UserCreationForm
@@ -37,7 +102,7 @@ class UserAdmin(BaseUserAdmin):
     # These override the definitions on the base UserAdmin
     # that reference specific fields on auth.User.
     list_display = ('email', 'name', 'is_admin')
-    list_filter = ('is_admin',)
+    list_filter = ('is_admin', 'is_active')
     fieldsets = (
         (None, {'fields': ('email', 'password')}),
         ('Personal info', {'fields': ('name',)}),
@@ -52,12 +117,124 @@ class UserAdmin(BaseUserAdmin):
         }),
     )
     search_fields = ('email',)
+    search_help_text = (
+        'Search by email address prefix, or by domain with "@example.com".')
     ordering = ('email',)
     filter_horizontal = ()
+    # Avoid COUNT(*) over the whole table on every changelist page.
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ['activate_users', 'deactivate_users', 'grant_admin',
+               'revoke_admin', 'export_csv', 'export_jsonl']
+
+    def export(self, queryset, format, content_type):
+        response = StreamingHttpResponse(
+            export_users(format, queryset=queryset), content_type=content_type)
+        response['Content-Disposition'] = (
+            'attachment; filename="users.%s"' % format)
+        return response
+
+    def get_list_filter(self, request):
+        if is_sharded():
+            return (ShardListFilter, *self.list_filter)
+        return self.list_filter
+
+    def get_object(self, request, object_id, from_field=None):
+        """Look a sharded user up on the shard its id encodes."""
+        if not is_sharded() or from_field is not None:
+            return super().get_object(request, object_id, from_field)
+        try:
+            return self.get_queryset(request).using(
+                shard_for_pk(object_id)).get(pk=object_id)
+        except (User.DoesNotExist, ValidationError, ValueError):
+            return None
+
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Search by email prefix or, for terms starting with "@", by domain,
+        both as index range scans rather than the full scan of icontains.
+        """
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        if search_term.startswith('@'):
+            matches = User.objects.filter_by_email_domain(search_term)
+        else:
+            matches = User.objects.filter_by_email_prefix(search_term)
+        return queryset & matches, False
+
+    def update_users(self, request, queryset, values):
+        """
+        Apply `values` to the selected users in chunked UPDATEs, for at most
+        USERS_BULK_ACTION_TIME_BUDGET seconds, deleting the sessions of
+        deactivated users included. The action skips users that are already
+        updated, so running it again resumes a partial update.
+        """
+        updated, done = update_users(
+            queryset, values,
+            time_budget=settings.USERS_BULK_ACTION_TIME_BUDGET)
+        if done:
+            self.message_user(
+                request, '%d users were updated.' % updated, messages.SUCCESS)
+        else:
+            self.message_user(request, (
+                '%d users were updated before the time limit. Run the action '
+                'again, or the set_user_flags command, to update the rest '
+                'and end their sessions.'
+            ) % updated, messages.WARNING)
+
+    @admin.action(description='Activate selected users')
+    def activate_users(self, request, queryset):
+        self.update_users(request, queryset, {'is_active': True})
+
+    @admin.action(description='Deactivate selected users')
+    def deactivate_users(self, request, queryset):
+        # Don't lock the current admin out.
+        self.update_users(
+            request, queryset.exclude(pk=request.user.pk), {'is_active': False})
+
+    @admin.action(description='Grant admin privileges to selected users')
+    def grant_admin(self, request, queryset):
+        self.update_users(request, queryset, {'is_admin': True})
+
+    @admin.action(description='Revoke admin privileges from selected users')
+    def revoke_admin(self, request, queryset):
+        self.update_users(
+            request, queryset.exclude(pk=request.user.pk), {'is_admin': False})
+
+    @admin.action(description='Export selected users as CSV')
+    def export_csv(self, request, queryset):
+        return self.export(queryset, 'csv', 'text/csv')
+
+    @admin.action(description='Export selected users as JSON Lines')
+    def export_jsonl(self, request, queryset):
+        return self.export(queryset, 'jsonl', 'application/x-ndjson')
+
+
+class AuditEventAdmin(admin.ModelAdmin):
+    """Read-only view of the audit log, newest first."""
+    list_display = ('created', 'event', 'email', 'ip')
+    list_filter = ('event',)
+    # Exact matches, through the (email, created) index.
+    search_fields = ('=email',)
+    search_help_text = 'Search by email address.'
+    ordering = ('-created',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
 
 
 # Now register the new UserAdmin...
 admin.site.register(User, UserAdmin)
+admin.site.register(AuditEvent, AuditEventAdmin)
 # ... and, since we're not using Django's built-in permissions,
 # unregister the Group model from admin.
 admin.site.unregister(Group)
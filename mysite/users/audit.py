@@ -0,0 +1,105 @@
+import atexit
+import functools
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+
+from utilities.metrics import Counter
+
+from .models import AuditEvent, User
+
+
+logger = logging.getLogger(__name__)
+
+audit_events = Counter(
+    'users_audit_events_total',
+    'Audit events, by whether they were written or dropped after the buffer '
+    'overflowed while the database was failing.',
+    ('outcome',))
+
+
+class AuditLog:
+    """
+    Buffer AuditEvents in-process and write them with one bulk_create per
+    settings.AUDIT_LOG_BATCH_SIZE events, rather than one INSERT each in the
+    request.
+
+    An event is buffered once the transaction it happened in commits, so
+    e.g. a signin rolled back with a failed signup isn't recorded. The
+    buffer is flushed at the end of a request once it holds a batch or its
+    oldest event has waited settings.AUDIT_LOG_FLUSH_INTERVAL seconds, and
+    at exit. If the database fails, the events are kept for the next flush,
+    up to ten batches.
+    """
+
+    def __init__(self):
+        self.events = []
+        self.oldest = None
+        self.lock = threading.Lock()
+
+    def record(self, event, request=None, user=None, email=''):
+        entry = AuditEvent(
+            event=event,
+            user_id=getattr(user, 'pk', None),
+            # Normalized like stored addresses, for exact searches.
+            email=(User.objects.normalize_email(email)[:255] if email
+                   else getattr(user, 'email', '')),
+        )
+        if request is not None:
+            entry.ip = request.META.get('REMOTE_ADDR') or None
+            entry.user_agent = request.META.get('HTTP_USER_AGENT', '')[:255]
+        transaction.on_commit(functools.partial(self.add, entry))
+
+    def add(self, event):
+        with self.lock:
+            if not self.events:
+                self.oldest = time.monotonic()
+            self.events.append(event)
+
+    def is_due(self):
+        return bool(self.events) and (
+            len(self.events) >= settings.AUDIT_LOG_BATCH_SIZE
+            or time.monotonic() - self.oldest
+            >= settings.AUDIT_LOG_FLUSH_INTERVAL)
+
+    def flush(self):
+        """Write the buffered events. Return the number written."""
+        with self.lock:
+            events, self.events = self.events, []
+        batch_size = settings.AUDIT_LOG_BATCH_SIZE
+        written = 0
+        try:
+            while written < len(events):
+                batch = events[written:written + batch_size]
+                AuditEvent.objects.bulk_create(batch)
+                written += len(batch)
+        except DatabaseError:
+            logger.exception(
+                'Cannot write %d audit events.', len(events) - written)
+            self.requeue(events[written:])
+        if written:
+            audit_events.inc(written, outcome='written')
+        return written
+
+    def requeue(self, events):
+        limit = 10 * settings.AUDIT_LOG_BATCH_SIZE
+        with self.lock:
+            self.events[:0] = events
+            dropped = max(0, len(self.events) - limit)
+            del self.events[:dropped]
+            self.oldest = time.monotonic()
+        if dropped:
+            audit_events.inc(dropped, outcome='dropped')
+            logger.error('Dropped the %d oldest audit events.', dropped)
+
+
+audit_log = AuditLog()
+
+
+@atexit.register
+def flush_at_exit():
+    if audit_log.events:
+        audit_log.flush()
@@ -0,0 +1,138 @@
+import inspect
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model, load_backend, user_login_failed
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import PermissionDenied
+from django.views.debug import SafeExceptionReporterFilter
+
+from utilities.routers import use_primary
+from .cache import cache_user, get_cached_user
+from .executors import run_in_executor
+from .hashers import verify_password
+
+
+UserModel = get_user_model()
+
+
+class EmailBackend(ModelBackend):
+    """
+    Authenticate against the user's email address. Users are looked up
+    through the case-insensitive ``Lower(email)`` index instead of an exact
+    match on ``User.email``.
+
+    Users loaded from the session are served from the user cache, so an
+    authenticated request doesn't query the user table in steady state.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return
+        user = self.get_user_by_email(username)
+        if user is None:
+            # Run the default password hasher once to reduce the timing
+            # difference between an existing and a nonexistent user (#20760).
+            UserModel().set_password(password)
+        elif user.check_password(password) and self.user_can_authenticate(user):
+            return user
+
+    async def aauthenticate(self, request, username=None, password=None,
+                            **kwargs):
+        """
+        Asynchronous ``authenticate()``. The user is looked up through
+        ``sync_to_async``; hashing runs on the bounded hasher pool.
+        """
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return
+        user = await sync_to_async(self.get_user_by_email)(username)
+        if user is None:
+            # Run the default password hasher once to reduce the timing
+            # difference between an existing and a nonexistent user (#20760).
+            await run_in_executor('hasher', make_password, password)
+            return
+        is_correct, must_update = await run_in_executor(
+            'hasher', verify_password, password, user.password)
+        if not is_correct:
+            return
+        if must_update:
+            user.set_password_hash(password, await run_in_executor(
+                'hasher', make_password, password))
+            await sync_to_async(user.save)(update_fields=['password'])
+        if self.user_can_authenticate(user):
+            return user
+
+    def get_user_by_email(self, email):
+        try:
+            return UserModel._default_manager.get_by_email(email)
+        except UserModel.DoesNotExist:
+            return None
+
+    def get_user_by_pk(self, pk):
+        try:
+            user = UserModel._default_manager.for_pk(pk).get(pk=pk)
+        except UserModel.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
+
+    def get_user(self, user_id):
+        user = get_cached_user(user_id)
+        if user is None:
+            # Never cache a row from a lagging replica.
+            with use_primary():
+                user = self.get_user_by_pk(user_id)
+            if user is not None:
+                cache_user(user)
+        elif not self.user_can_authenticate(user):
+            return None
+        return user
+
+
+async def aauthenticate(request=None, **credentials):
+    """
+    Asynchronous ``django.contrib.auth.authenticate()``. Backends providing
+    ``aauthenticate()`` are awaited, others are run through
+    ``sync_to_async``.
+
+    Follows authenticate() of Django 4.0 (see requirements.txt): check it
+    again when upgrading. Django 5.0 has its own aauthenticate().
+    """
+    for backend_path in settings.AUTHENTICATION_BACKENDS:
+        backend = load_backend(backend_path)
+        method = getattr(backend, 'aauthenticate', backend.authenticate)
+        try:
+            inspect.signature(method).bind(request, **credentials)
+        except TypeError:
+            # This backend doesn't accept these credentials as arguments.
+            # Try the next one.
+            continue
+        try:
+            if hasattr(backend, 'aauthenticate'):
+                user = await backend.aauthenticate(request, **credentials)
+            else:
+                user = await sync_to_async(backend.authenticate)(
+                    request, **credentials)
+        except PermissionDenied:
+            # This backend says to stop in our tracks - this user should
+            # not be allowed in at all.
+            break
+        if user is None:
+            continue
+        # Annotate the user object with the path of the backend.
+        user.backend = backend_path
+        return user
+
+    # The credentials supplied are invalid to all backends, fire signal.
+    # Passwords and the like are masked as in error reports.
+    reporter_filter = SafeExceptionReporterFilter
+    await sync_to_async(user_login_failed.send)(
+        sender=__name__, credentials={
+            key: (reporter_filter.cleansed_substitute
+                  if reporter_filter.hidden_settings.search(key) else value)
+            for key, value in credentials.items()},
+        request=request)
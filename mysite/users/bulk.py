@@ -0,0 +1,65 @@
+import time
+
+from django.conf import settings
+from django.db import transaction
+
+from utilities.routers import use_primary
+
+from .cache import invalidate_users
+from .models import User
+from .sessions import delete_sessions
+from .sharding import is_sharded
+
+
+def update_users(queryset, values, chunk_size=1000, time_budget=None,
+                 end_sessions=True):
+    """
+    Set the field `values` on the users of `queryset`, as one UPDATE per
+    chunk of `chunk_size` users, each in its own transaction. Users that
+    already have the values are skipped, so an interrupted run resumes
+    where it stopped when repeated.
+
+    The per-user cache entries are invalidated. When deactivating, the
+    sessions of the users of `queryset` that are inactive are then deleted,
+    unless `end_sessions` is off, so that they are signed out in every
+    process, whatever its user cache holds. Those deactivated by an earlier,
+    interrupted run are included, so repeating it also resumes this.
+
+    Stop after `time_budget` seconds, if given, sessions included. Return
+    the number of users updated and whether all of them, and their
+    sessions, were.
+
+    When users are sharded, `queryset` must be on one of the shards (see
+    users.sharding.user_databases()).
+    """
+    if is_sharded() and queryset.db not in settings.USER_SHARDS:
+        raise ValueError('Sharded users must be updated one shard at a time.')
+    deadline = None if time_budget is None else time.monotonic() + time_budget
+    pending = queryset.exclude(**values).order_by('pk')
+    updated = 0
+    last_pk = None
+    done = True
+    # Read on the primary, which has the chunks just updated.
+    with use_primary():
+        while True:
+            chunk = (pending if last_pk is None
+                     else pending.filter(pk__gt=last_pk))
+            pks = list(chunk.values_list('pk', flat=True)[:chunk_size])
+            if not pks:
+                break
+            db = queryset.db
+            with transaction.atomic(using=db):
+                updated += User.objects.using(db).filter(
+                    pk__in=pks).update(**values)
+                invalidate_users(pks)
+            last_pk = pks[-1]
+            if len(pks) < chunk_size:
+                break
+            if deadline is not None and time.monotonic() >= deadline:
+                done = False
+                break
+        if done and end_sessions and values.get('is_active') is False:
+            _, done = delete_sessions(
+                queryset.filter(is_active=False).values_list('pk', flat=True),
+                batch_size=chunk_size, deadline=deadline)
+    return updated, done
@@ -0,0 +1,63 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from utilities.cache import is_shared
+
+
+def get_user_cache():
+    return caches[settings.USER_CACHE_ALIAS]
+
+
+def is_enabled():
+    """
+    Return whether users are cached: USER_CACHE_TIMEOUT is set and the
+    cache is shared by the processes. Invalidations only reach the process
+    that made them in a per-process cache, whose other processes would keep
+    a deactivated user signed in until the entry expires.
+    """
+    return bool(settings.USER_CACHE_TIMEOUT) and is_shared(
+        settings.USER_CACHE_ALIAS)
+
+
+def make_key(pk):
+    return 'users:user:%s' % pk
+
+
+def get_cached_user(pk):
+    """
+    Return the cached user for the given primary key, or None on a miss.
+    """
+    if not is_enabled():
+        return None
+    return get_user_cache().get(make_key(pk))
+
+
+def cache_user(user):
+    """
+    Store the user in the cache. The session auth hash is computed first so
+    that it is memoized on the cached instance and not recomputed on every
+    request.
+    """
+    if not is_enabled():
+        return
+    user.get_session_auth_hash()
+    get_user_cache().set(
+        make_key(user.pk), user, timeout=settings.USER_CACHE_TIMEOUT)
+
+
+def invalidate_users(pks):
+    """
+    Drop the cache entries of the given users. The entries are dropped again
+    once the current transaction commits, so that a concurrent request can't
+    re-cache a row that is about to change.
+    """
+    keys = [make_key(pk) for pk in pks]
+    if not keys:
+        return
+    get_user_cache().delete_many(keys)
+    transaction.on_commit(lambda: get_user_cache().delete_many(keys))
+
+
+def invalidate_user(pk):
+    invalidate_users([pk])
@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.core.checks import Error, register
+
+from utilities.cache import is_shared
+
+
+@register()
+def check_last_login_cache(app_configs, **kwargs):
+    """
+    Deferred last_login updates keep the pending sign-ins in
+    LAST_LOGIN_CACHE_ALIAS, where every process must see them: password
+    reset tokens and sweep_stale_users read them from there.
+    """
+    if (settings.LAST_LOGIN_UPDATES == 'deferred'
+            and not is_shared(settings.LAST_LOGIN_CACHE_ALIAS)):
+        return [Error(
+            "LAST_LOGIN_UPDATES = 'deferred' needs a cache shared by the "
+            "processes, but LAST_LOGIN_CACHE_ALIAS %r is a per-process one."
+            % settings.LAST_LOGIN_CACHE_ALIAS,
+            hint='Point LAST_LOGIN_CACHE_ALIAS to e.g. a memcached, Redis, '
+                 'database or file based cache.',
+            id='users.E001',
+        )]
+    return []
+
+
+@register()
+def check_password_reset_cache(app_configs, **kwargs):
+    """
+    Password reset coalescing keeps its markers in PASSWORD_RESET_CACHE_ALIAS,
+    where every process must see them, or each one sends its own email.
+    """
+    if (settings.PASSWORD_RESET_COALESCE_WINDOW
+            and not is_shared(settings.PASSWORD_RESET_CACHE_ALIAS)):
+        return [Error(
+            'PASSWORD_RESET_COALESCE_WINDOW needs a cache shared by the '
+            'processes, but PASSWORD_RESET_CACHE_ALIAS %r is a per-process '
+            'one.' % settings.PASSWORD_RESET_CACHE_ALIAS,
+            hint='Point PASSWORD_RESET_CACHE_ALIAS to e.g. a memcached, '
+                 'Redis, database or file based cache, or set '
+                 'PASSWORD_RESET_COALESCE_WINDOW = 0.',
+            id='users.E002',
+        )]
+    return []
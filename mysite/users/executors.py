@@ -0,0 +1,43 @@
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+
+_executors = {}
+_lock = threading.Lock()
+
+
+def get_executor(name):
+    """
+    Return the bounded thread pool for one kind of blocking work, as sized
+    by ``settings.USERS_EXECUTOR_WORKERS``, e.g. ``'hasher'`` for password
+    hashing.
+    """
+    executor = _executors.get(name)
+    if executor is None:
+        with _lock:
+            executor = _executors.get(name)
+            if executor is None:
+                executor = _executors[name] = ThreadPoolExecutor(
+                    max_workers=settings.USERS_EXECUTOR_WORKERS[name],
+                    thread_name_prefix='users-%s' % name)
+    return executor
+
+
+async def run_in_executor(name, func, *args, **kwargs):
+    """
+    Run ``func`` on the named pool and await its result without blocking
+    the event loop. ``func`` must not touch the database: connections are
+    per thread and only request threads have theirs cleaned up.
+
+    Context variables are carried over, as with ``asyncio.to_thread()``.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(
+        get_executor(name),
+        functools.partial(context.run, func, *args, **kwargs))
@@ -0,0 +1,80 @@
+import csv
+import json
+import zlib
+
+from .models import User
+from .sharding import user_databases
+
+
+FIELDS = ('email', 'name', 'is_active', 'is_admin', 'last_login')
+
+
+class Echo:
+    """A file-like object for csv.writer that returns what it is given."""
+
+    def write(self, value):
+        return value
+
+
+def iter_user_rows(queryset=None, chunk_size=2000):
+    """
+    Yield the FIELDS of the users in `queryset`, or of all users, on every
+    shard, as lists of rows, one list per chunk. The table is read by keyset
+    pagination on the primary key, so every chunk is an index range scan
+    and only one is held in memory.
+    """
+    if queryset is None:
+        for db in user_databases():
+            yield from iter_user_rows(User.objects.using(db), chunk_size)
+        return
+    queryset = queryset.order_by('pk').values_list('pk', *FIELDS)
+    last_pk = None
+    while True:
+        chunk = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        rows = list(chunk[:chunk_size])
+        if rows:
+            last_pk = rows[-1][0]
+            yield [row[1:] for row in rows]
+        if len(rows) < chunk_size:
+            return
+
+
+def iter_csv(chunks):
+    writer = csv.writer(Echo())
+    yield writer.writerow(FIELDS)
+    for rows in chunks:
+        yield ''.join(writer.writerow([
+            '' if value is None else
+            value.isoformat() if hasattr(value, 'isoformat') else value
+            for value in row
+        ]) for row in rows)
+
+
+def iter_jsonl(chunks):
+    for rows in chunks:
+        yield ''.join(json.dumps({
+            field: value.isoformat() if hasattr(value, 'isoformat') else value
+            for field, value in zip(FIELDS, row)
+        }) + '\n' for row in rows)
+
+
+def gzip_stream(chunks):
+    """Compress an iterable of bytes into a gzip stream, incrementally."""
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_users(format='csv', compress=False, queryset=None,
+                 chunk_size=2000):
+    """
+    Return an iterator over the bytes of a CSV or JSON Lines export of the
+    users in `queryset`, gzipped if `compress` is true.
+    """
+    lines = {'csv': iter_csv, 'jsonl': iter_jsonl}[format](
+        iter_user_rows(queryset, chunk_size))
+    stream = (text.encode() for text in lines)
+    return gzip_stream(stream) if compress else stream
@@ -1,28 +1,183 @@
+import unicodedata
+
+from asgiref.sync import sync_to_async
+from django import forms
+from django.contrib.auth import authenticate
 from django.contrib.auth.forms import (
     AuthenticationForm, PasswordChangeForm, PasswordResetForm, SetPasswordForm)
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.utils.translation import gettext_lazy as _
 
 from .admin import UserCreationForm, UserChangeForm
+from .backends import aauthenticate
+from .executors import run_in_executor
+from .hashers import verify_password
 from .models import User
+from .password_reset import coalesce_password_reset, password_reset_requests
+from .throttling import get_signin_throttle
 from utilities.forms import BootstrapMixin
 
 
+class PrehashedPasswordMixin:
+    """
+    Let the async views hash the new password on the hasher pool before
+    save(), which then stores that hash instead of computing it again.
+    """
+    password_field = 'new_password1'
+    password_hash = None
+
+    async def ais_valid(self):
+        if not await sync_to_async(self.is_valid)():
+            return False
+        self.password_hash = await run_in_executor(
+            'hasher', make_password, self.cleaned_data[self.password_field])
+        return True
+
+
 class SigninForm(BootstrapMixin, AuthenticationForm):
-    pass
+    error_messages = {
+        **AuthenticationForm.error_messages,
+        'throttled': _(
+            "Too many sign-in attempts. Please try again later."),
+    }
+    # Whether this attempt passed the sign-in throttle, once checked.
+    attempt_allowed = None
+    preauthenticated = False
 
+    async def ais_valid(self):
+        """
+        Asynchronous is_valid(). The credentials are checked beforehand with
+        aauthenticate(), so clean() doesn't hash the password on the request
+        thread.
+        """
+        if self.is_bound:
+            username = self.fields['username'].to_python(self['username'].data)
+            password = self.fields['password'].to_python(self['password'].data)
+            if (username and password
+                    and await sync_to_async(self.allow_attempt)(username)):
+                self.user_cache = await aauthenticate(
+                    self.request, username=username, password=password)
+                self.preauthenticated = True
+        return await sync_to_async(self.is_valid)()
 
-class SignupForm(BootstrapMixin, UserCreationForm):
-    pass
+    def allow_attempt(self, username):
+        """
+        Check the sign-in throttle, before any password hashing happens.
+        """
+        if self.attempt_allowed is None:
+            self.attempt_allowed = get_signin_throttle().allow(
+                self.request, username)
+        return self.attempt_allowed
 
+    def clean(self):
+        username = self.cleaned_data.get('username')
+        password = self.cleaned_data.get('password')
 
-class ChangePasswordForm(BootstrapMixin, PasswordChangeForm):
-    pass
+        if username is not None and password:
+            if not self.allow_attempt(username):
+                raise ValidationError(
+                    self.error_messages['throttled'], code='throttled')
+            if not self.preauthenticated:
+                self.user_cache = authenticate(
+                    self.request, username=username, password=password)
+            if self.user_cache is None:
+                get_signin_throttle().record_failure(self.request, username)
+                raise self.get_invalid_login_error()
+            else:
+                self.confirm_login_allowed(self.user_cache)
+
+        return self.cleaned_data
+
+
+class SignupForm(PrehashedPasswordMixin, BootstrapMixin, UserCreationForm):
+    password_field = 'password1'
+
+    def save(self, commit=True):
+        if self.password_hash is None:
+            return super().save(commit=commit)
+        user = forms.ModelForm.save(self, commit=False)
+        user.set_password_hash(
+            self.cleaned_data[self.password_field], self.password_hash)
+        if commit:
+            user.save()
+        return user
+
+
+class PrehashedSetPasswordMixin(PrehashedPasswordMixin):
+
+    def save(self, commit=True):
+        if self.password_hash is None:
+            return super().save(commit=commit)
+        self.user.set_password_hash(
+            self.cleaned_data[self.password_field], self.password_hash)
+        if commit:
+            self.user.save()
+        return self.user
+
+
+class ChangePasswordForm(PrehashedSetPasswordMixin, BootstrapMixin,
+                         PasswordChangeForm):
+    old_password_verified = None
+
+    async def ais_valid(self):
+        """
+        Asynchronous is_valid(). The old password is verified on the hasher
+        pool ahead of clean_old_password().
+        """
+        old_password = self['old_password'].data
+        if self.is_bound and old_password:
+            self.old_password_verified, _ = await run_in_executor(
+                'hasher', verify_password, old_password, self.user.password)
+        return await super().ais_valid()
+
+    def clean_old_password(self):
+        if self.old_password_verified is None:
+            return super().clean_old_password()
+        if not self.old_password_verified:
+            raise ValidationError(
+                self.error_messages['password_incorrect'],
+                code='password_incorrect',
+            )
+        return self.cleaned_data['old_password']
 
 
 class ResetPasswordForm(BootstrapMixin, PasswordResetForm):
-    pass
+    def get_users(self, email):
+        """
+        Look up the users through the ``Lower(email)`` index rather than the
+        unindexable ``email__iexact`` filter used by Django.
+        """
+        active_users = User.objects.filter_by_email(email).filter(
+            is_active=True)
+        # The database lowercases, but the mail goes to the stored address:
+        # it must be the same under Unicode case folding as the one given.
+        folded = unicodedata.normalize('NFKC', email).casefold()
+        return (
+            u
+            for u in active_users
+            if u.has_usable_password()
+            and unicodedata.normalize('NFKC', u.email).casefold() == folded
+        )
+
+    def save(self, *args, **kwargs):
+        """
+        Send the reset email, unless one was already requested for the same
+        address within the coalescing window. A suppressed request skips the
+        user lookup, token generation and rendering altogether.
+        """
+        if not coalesce_password_reset(self.cleaned_data['email']):
+            password_reset_requests.inc(outcome='suppressed')
+            return
+        super().save(*args, **kwargs)
+
+    def send_mail(self, *args, **kwargs):
+        super().send_mail(*args, **kwargs)
+        password_reset_requests.inc(outcome='sent')
 
 
-class PasswordSetForm(BootstrapMixin, SetPasswordForm):
+class PasswordSetForm(PrehashedSetPasswordMixin, BootstrapMixin,
+                      SetPasswordForm):
     pass
 
 
@@ -0,0 +1,83 @@
+from django.conf import settings
+from django.contrib.auth.hashers import (
+    Argon2PasswordHasher, PBKDF2PasswordHasher, ScryptPasswordHasher,
+    get_hasher, identify_hasher, is_password_usable)
+
+from utilities.timing import timed
+
+
+def calibrated(name, default):
+    """
+    Return a property reading the work factor ``name`` of the hasher's
+    algorithm from ``settings.PASSWORD_HASHER_PARAMS``, which is loaded from
+    the host's hasher profile (see the calibrate_hashers command).
+    """
+    def get(self):
+        params = settings.PASSWORD_HASHER_PARAMS.get(self.algorithm, {})
+        return params.get(name, default)
+    return property(get)
+
+
+class TimedHasherMixin:
+    """
+    Time hashing under 'hash' in the request timings. check_password(),
+    make_password() and verify_password() all go through these methods.
+    """
+
+    def encode(self, *args, **kwargs):
+        with timed('hash'):
+            return super().encode(*args, **kwargs)
+
+    def verify(self, *args, **kwargs):
+        with timed('hash'):
+            return super().verify(*args, **kwargs)
+
+    def harden_runtime(self, *args, **kwargs):
+        with timed('hash'):
+            return super().harden_runtime(*args, **kwargs)
+
+
+class CalibratedPBKDF2PasswordHasher(TimedHasherMixin, PBKDF2PasswordHasher):
+    iterations = calibrated('iterations', PBKDF2PasswordHasher.iterations)
+
+
+class CalibratedArgon2PasswordHasher(TimedHasherMixin, Argon2PasswordHasher):
+    time_cost = calibrated('time_cost', Argon2PasswordHasher.time_cost)
+    memory_cost = calibrated('memory_cost', Argon2PasswordHasher.memory_cost)
+    parallelism = calibrated('parallelism', Argon2PasswordHasher.parallelism)
+
+
+class CalibratedScryptPasswordHasher(TimedHasherMixin, ScryptPasswordHasher):
+    work_factor = calibrated('work_factor', ScryptPasswordHasher.work_factor)
+    block_size = calibrated('block_size', ScryptPasswordHasher.block_size)
+    parallelism = calibrated('parallelism', ScryptPasswordHasher.parallelism)
+    maxmem = calibrated('maxmem', ScryptPasswordHasher.maxmem)
+
+
+def verify_password(password, encoded, preferred='default'):
+    """
+    Return a ``(is_correct, must_update)`` tuple for the raw password.
+    Unlike ``check_password()`` nothing is written back, so it is safe to
+    run away from the request thread; the caller re-hashes the password
+    when ``must_update`` is set.
+    """
+    if password is None or not is_password_usable(encoded):
+        return False, False
+
+    preferred = get_hasher(preferred)
+    try:
+        hasher = identify_hasher(encoded)
+    except ValueError:
+        # encoded is gibberish or uses a hasher that's no longer installed.
+        return False, False
+
+    hasher_changed = hasher.algorithm != preferred.algorithm
+    must_update = hasher_changed or preferred.must_update(encoded)
+    is_correct = hasher.verify(password, encoded)
+
+    # Close the timing gap with the default work factor, as
+    # check_password() does.
+    if not is_correct and not hasher_changed and must_update:
+        hasher.harden_runtime(password, encoded)
+
+    return is_correct, is_correct and must_update
@@ -0,0 +1,165 @@
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.auth.tokens import PasswordResetTokenGenerator
+from django.core.cache import caches
+from django.db import DatabaseError, router
+from django.db.models import Case, F, Q, Value, When
+from django.utils import timezone
+
+from .models import User
+
+
+logger = logging.getLogger(__name__)
+
+# Pending sign-ins stay in the cache long after they were written, so that
+# the reset tokens of every process hash the same last_login meanwhile.
+PENDING_TIMEOUT = 24 * 60 * 60
+
+
+def get_cache():
+    return caches[settings.LAST_LOGIN_CACHE_ALIAS]
+
+
+def make_key(pk):
+    return 'users:last_login:%s' % pk
+
+
+def is_deferred():
+    return settings.LAST_LOGIN_UPDATES == 'deferred'
+
+
+def get_last_login(user):
+    """
+    Return the user's last sign-in: the stored last_login, or a later one
+    recorded by any process and not written yet.
+    """
+    if not is_deferred() or user.pk is None:
+        return user.last_login
+    pending = get_cache().get(make_key(user.pk))
+    if pending is not None and (
+            user.last_login is None or pending > user.last_login):
+        return pending
+    return user.last_login
+
+
+class LastLoginBuffer:
+    """
+    Record sign-ins in memory instead of updating last_login on the request
+    path, and write them with one UPDATE per chunk of users once
+    settings.LAST_LOGIN_FLUSH_INTERVAL seconds passed since the first
+    pending one, and at exit.
+
+    Each sign-in is also put in the LAST_LOGIN_CACHE_ALIAS cache, shared by
+    the processes, for get_last_login(). The UPDATE never moves a
+    last_login back, so processes flushing out of order are harmless. A
+    crash loses the sign-ins of one interval of that process.
+    """
+    chunk_size = 200
+
+    def __init__(self):
+        self.pending = {}
+        self.oldest = None
+        self.lock = threading.Lock()
+
+    def record(self, user):
+        now = timezone.now()
+        user.last_login = now
+        get_cache().set(make_key(user.pk), now, PENDING_TIMEOUT)
+        with self.lock:
+            if not self.pending:
+                self.oldest = time.monotonic()
+            self.pending[user.pk] = now
+
+    def is_due(self):
+        return bool(self.pending) and (
+            time.monotonic() - self.oldest
+            >= settings.LAST_LOGIN_FLUSH_INTERVAL)
+
+    def flush(self):
+        """Write the pending sign-ins. Return the number of users updated."""
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        by_db = defaultdict(list)
+        for pk, last_login in pending.items():
+            # users.sharding may put the users on different databases.
+            db = router.db_for_write(User, instance=User(pk=pk))
+            by_db[db].append((pk, last_login))
+
+        updated = 0
+        failed = {}
+        for db, logins in by_db.items():
+            for i in range(0, len(logins), self.chunk_size):
+                chunk = logins[i:i + self.chunk_size]
+                try:
+                    updated += self.update(db, chunk)
+                except DatabaseError:
+                    logger.exception(
+                        'Cannot write the last_login of %d users.',
+                        len(chunk))
+                    failed.update(chunk)
+        if failed:
+            self.requeue(failed)
+        return updated
+
+    def update(self, db, logins):
+        return User.objects.using(db).filter(
+            pk__in=[pk for pk, _ in logins]).update(last_login=Case(
+                *(When(Q(pk=pk) & (Q(last_login__isnull=True)
+                                   | Q(last_login__lt=last_login)),
+                       then=Value(last_login))
+                  for pk, last_login in logins),
+                default=F('last_login')))
+
+    def requeue(self, pending):
+        with self.lock:
+            for pk, last_login in pending.items():
+                if pk not in self.pending or self.pending[pk] < last_login:
+                    self.pending[pk] = last_login
+            self.oldest = time.monotonic()
+
+
+last_logins = LastLoginBuffer()
+
+
+@atexit.register
+def flush_at_exit():
+    if last_logins.pending:
+        last_logins.flush()
+
+
+def update_last_login(sender, user, **kwargs):
+    """
+    user_logged_in receiver replacing Django's: the sign-in is recorded in
+    last_logins if settings.LAST_LOGIN_UPDATES is 'deferred', else
+    last_login is saved right away.
+    """
+    if is_deferred():
+        last_logins.record(user)
+    else:
+        user.last_login = timezone.now()
+        user.save(update_fields=['last_login'])
+
+
+class LastLoginTokenGenerator(PasswordResetTokenGenerator):
+    """
+    Django's password reset tokens, hashing the last sign-in from
+    get_last_login(), so that a deferred one invalidates tokens right away
+    and writing it later doesn't.
+    """
+
+    def _make_hash_value(self, user, timestamp):
+        last_login = get_last_login(user)
+        login_timestamp = (
+            '' if last_login is None
+            else last_login.replace(microsecond=0, tzinfo=None))
+        email_field = user.get_email_field_name()
+        email = getattr(user, email_field, '') or ''
+        return f'{user.pk}{user.password}{login_timestamp}{timestamp}{email}'
+
+
+default_token_generator = LastLoginTokenGenerator()
@@ -0,0 +1,162 @@
+import json
+import platform
+import time
+
+from django.conf import settings
+from django.contrib.auth.hashers import (
+    Argon2PasswordHasher, PBKDF2PasswordHasher, ScryptPasswordHasher)
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+
+PASSWORD = 'calibration-password'
+SALT = 'calibrationsalt0123456789'
+
+# Calibrated hashers, strongest first, and the hashers kept after the
+# preferred one so that existing hashes still verify and get upgraded.
+HASHERS = {
+    'argon2': 'users.hashers.CalibratedArgon2PasswordHasher',
+    'scrypt': 'users.hashers.CalibratedScryptPasswordHasher',
+    'pbkdf2_sha256': 'users.hashers.CalibratedPBKDF2PasswordHasher',
+}
+FALLBACK_HASHERS = [
+    'users.hashers.CalibratedPBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'users.hashers.CalibratedArgon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'users.hashers.CalibratedScryptPasswordHasher',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the password hashers on this host and write a hasher "
+        "profile whose work factors fit the given verify latency budget. "
+        "Work factors are never set below Django's defaults, as existing "
+        "hashes would be re-encoded with them on the next sign-in."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--target-ms', type=float, default=50,
+            help='Latency budget of one password verification (default: 50).',
+        )
+        parser.add_argument(
+            '--algorithm', choices=list(HASHERS),
+            help='Preferred algorithm. Defaults to the strongest available.',
+        )
+        parser.add_argument(
+            '--samples', type=int, default=5,
+            help='Timings taken per measurement; the median is used.',
+        )
+        parser.add_argument(
+            '--output',
+            help='Where to write the profile (default: '
+                 'settings.PASSWORD_HASHER_PROFILE). Use "-" for stdout.',
+        )
+
+    def handle(self, *args, **options):
+        self.target = options['target_ms'] / 1000
+        self.samples = options['samples']
+
+        params, timings = {}, {}
+        for algorithm, calibrate in (
+                ('pbkdf2_sha256', self.calibrate_pbkdf2),
+                ('scrypt', self.calibrate_scrypt),
+                ('argon2', self.calibrate_argon2)):
+            try:
+                params[algorithm], timings[algorithm] = calibrate()
+            except (ImportError, ValueError) as e:
+                self.stderr.write('%s: not available (%s)' % (algorithm, e))
+                continue
+            self.stdout.write('%s: %s, %.1f ms per verify' % (
+                algorithm, params[algorithm], timings[algorithm] * 1000))
+            if timings[algorithm] > self.target:
+                self.stderr.write(self.style.WARNING(
+                    '%s: Django\'s default work factors take longer than '
+                    'the budget; keeping them.' % algorithm))
+
+        preferred = options['algorithm'] or next(
+            a for a in HASHERS if a in params)
+        if preferred not in params:
+            raise CommandError('%s is not available on this host.' % preferred)
+
+        profile = {
+            'host': platform.node(),
+            'created': timezone.now().isoformat(),
+            'target_ms': options['target_ms'],
+            'timings_ms': {a: round(t * 1000, 2) for a, t in timings.items()},
+            'hashers': [HASHERS[preferred]] + [
+                h for h in FALLBACK_HASHERS if h != HASHERS[preferred]],
+            'params': params,
+        }
+        content = json.dumps(profile, indent=2) + '\n'
+
+        output = options['output'] or settings.PASSWORD_HASHER_PROFILE
+        if output == '-':
+            self.stdout.write(content, ending='')
+        else:
+            with open(output, 'w') as f:
+                f.write(content)
+            self.stdout.write(self.style.SUCCESS(
+                'Wrote %s profile to %s.' % (preferred, output)))
+
+    def measure(self, hasher):
+        """Return the median time of one encode() with ``hasher``."""
+        timings = []
+        for _ in range(self.samples):
+            start = time.perf_counter()
+            hasher.encode(PASSWORD, SALT)
+            timings.append(time.perf_counter() - start)
+        return sorted(timings)[len(timings) // 2]
+
+    def calibrate_pbkdf2(self):
+        # PBKDF2 time is linear in the iteration count: extrapolate from a
+        # probe, then check the result.
+        hasher = PBKDF2PasswordHasher()
+        hasher.iterations = probe = 20000
+        per_iteration = self.measure(hasher) / probe
+        hasher.iterations = max(
+            PBKDF2PasswordHasher.iterations,
+            int(self.target / per_iteration) // 1000 * 1000)
+        return {'iterations': hasher.iterations}, self.measure(hasher)
+
+    def calibrate_scrypt(self):
+        # The work factor must be a power of two: take the largest one from
+        # Django's default up that fits the budget, with enough maxmem for
+        # OpenSSL to allow it.
+        hasher = ScryptPasswordHasher()
+        best = None
+        n = ScryptPasswordHasher.work_factor
+        while n <= 2 ** 20:
+            hasher.work_factor = n
+            hasher.maxmem = 2 * 128 * n * hasher.block_size
+            timing = self.measure(hasher)
+            if best is not None and timing > self.target:
+                break
+            best = ({
+                'work_factor': n,
+                'block_size': hasher.block_size,
+                'parallelism': hasher.parallelism,
+                'maxmem': hasher.maxmem,
+            }, timing)
+            n *= 2
+        return best
+
+    def calibrate_argon2(self):
+        # Keep Django's memory cost and raise the number of passes from
+        # Django's default while they fit.
+        hasher = Argon2PasswordHasher()
+        hasher._load_library()
+        best = (hasher.time_cost, self.measure(hasher))
+        while True:
+            hasher.time_cost += 1
+            timing = self.measure(hasher)
+            if timing > self.target:
+                break
+            best = (hasher.time_cost, timing)
+        return {
+            'time_cost': best[0],
+            'memory_cost': hasher.memory_cost,
+            'parallelism': hasher.parallelism,
+        }, best[1]
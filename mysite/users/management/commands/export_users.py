@@ -0,0 +1,49 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from users.export import export_users
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream the users table to a CSV or JSON Lines file, optionally "
+        "gzipped, in constant memory."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output', default='-',
+            help='File to write, or "-" for stdout (default).',
+        )
+        parser.add_argument(
+            '--format', choices=('csv', 'jsonl'),
+            help='Output format. Defaults to jsonl for .jsonl(.gz) files, '
+                 'csv otherwise.',
+        )
+        parser.add_argument(
+            '--gzip', action='store_true',
+            help='Compress the output. Implied by a .gz output file.',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000,
+            help='Users read from the database at a time (default: 2000).',
+        )
+
+    def handle(self, *args, output, format, gzip, chunk_size, **options):
+        compress = gzip or output.endswith('.gz')
+        if format is None:
+            format = 'jsonl' if output.removesuffix('.gz').endswith(
+                '.jsonl') else 'csv'
+        try:
+            f = sys.stdout.buffer if output == '-' else open(output, 'wb')
+        except OSError as e:
+            raise CommandError(e)
+        try:
+            for data in export_users(format, compress, chunk_size=chunk_size):
+                f.write(data)
+        finally:
+            if f is sys.stdout.buffer:
+                f.flush()
+            else:
+                f.close()
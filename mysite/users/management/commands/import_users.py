@@ -0,0 +1,192 @@
+import csv
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.core.validators import validate_email
+
+from users.models import User
+from users.sharding import emails_by_database, is_sharded, make_user_id
+from utilities.routers import use_primary
+
+
+def read_rows(f, format):
+    """Yield the rows of a CSV or JSON Lines file as dicts."""
+    if format == 'csv':
+        yield from csv.DictReader(f)
+    else:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+class Command(BaseCommand):
+    help = (
+        "Create users in bulk from a CSV or JSON Lines file with email, name "
+        "and optional password columns. Emails are normalized, and rows whose "
+        "email is already taken are skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='File to import, or "-" for stdin.',
+        )
+        parser.add_argument(
+            '--format', choices=('csv', 'jsonl'),
+            help='Input format. Defaults to jsonl for .jsonl files, csv '
+                 'otherwise.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Rows read, hashed and inserted at a time (default: 1000).',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Processes hashing passwords (default: number of CPUs).',
+        )
+        parser.add_argument(
+            '--unusable-passwords', action='store_true',
+            help='Ignore the password column and create every user with an '
+                 'unusable password, to be set through password reset.',
+        )
+
+    def handle(self, *args, path, format, batch_size, workers,
+               unusable_passwords, **options):
+        if format is None:
+            format = 'jsonl' if path.endswith('.jsonl') else 'csv'
+        self.verbosity = options['verbosity']
+        self.unusable_passwords = unusable_passwords
+        self.workers = workers
+        self.stats = dict.fromkeys(
+            ('read', 'created', 'duplicate', 'invalid'), 0)
+        self.start = time.perf_counter()
+
+        executor = None
+        if workers > 1 and not unusable_passwords:
+            executor = ProcessPoolExecutor(workers, initializer=django.setup)
+        try:
+            f = sys.stdin if path == '-' else open(
+                path, newline='', encoding='utf-8')
+        except OSError as e:
+            raise CommandError(e)
+        try:
+            rows = read_rows(f, format)
+            # Hashing of a batch runs on the pool while the previous batch
+            # is inserted, so at most two batches are held in memory. The
+            # users are looked up on the primary, which has the batches
+            # written just before.
+            pending = None
+            with use_primary():
+                while True:
+                    batch = list(itertools.islice(rows, batch_size))
+                    if not batch:
+                        break
+                    users = self.prepare(batch, pending[0] if pending else ())
+                    hashes = self.hash_passwords(users, executor)
+                    if pending:
+                        self.write(*pending)
+                    pending = users, hashes
+                if pending:
+                    self.write(*pending)
+        except (csv.Error, ValueError) as e:
+            raise CommandError('Cannot read %s: %s' % (path, e))
+        finally:
+            if f is not sys.stdin:
+                f.close()
+            if executor is not None:
+                executor.shutdown()
+
+        if self.verbosity >= 1:
+            self.stdout.write(self.style.SUCCESS(
+                '%(read)d rows read: %(created)d users created, %(duplicate)d '
+                'duplicates and %(invalid)d invalid rows skipped' % self.stats
+                + ' in %.1f s (%.0f users/sec).' % self.throughput()))
+
+    def prepare(self, batch, pending):
+        """
+        Return the new users of `batch` as a dict of email to name and
+        password, without the invalid rows and the emails already in the
+        `pending` batch, earlier in this batch, or in the database.
+        """
+        name_length = User._meta.get_field('name').max_length
+        users = {}
+        for row in batch:
+            self.stats['read'] += 1
+            if not isinstance(row, dict):
+                self.stats['invalid'] += 1
+                continue
+            email = User.objects.normalize_email(row.get('email') or '')
+            name = (row.get('name') or '').strip()
+            try:
+                validate_email(email)
+            except ValidationError:
+                self.stats['invalid'] += 1
+                continue
+            if not name or len(name) > name_length:
+                self.stats['invalid'] += 1
+                continue
+            if email in users or email in pending:
+                self.stats['duplicate'] += 1
+                continue
+            users[email] = name, row.get('password') or None
+
+        # Emails are stored normalized, i.e. lowercased.
+        for db, emails in emails_by_database(users).items():
+            for email in User.objects.using(db).filter(
+                    email__in=emails).values_list('email', flat=True):
+                del users[email]
+                self.stats['duplicate'] += 1
+        return users
+
+    def hash_passwords(self, users, executor):
+        """
+        Return an iterator over the password hashes of `users`, computed on
+        the process pool if there is one. Users without a password get an
+        unusable one.
+        """
+        passwords = [
+            None if self.unusable_passwords else password
+            for name, password in users.values()
+        ]
+        if executor is None:
+            return map(make_password, passwords)
+        chunksize = max(1, len(passwords) // (self.workers * 4))
+        return executor.map(make_password, passwords, chunksize=chunksize)
+
+    def write(self, users, hashes):
+        passwords = dict(zip(users, hashes))
+        created = 0
+        for db, emails in emails_by_database(users).items():
+            # bulk_create() doesn't call save(), which gives sharded users
+            # the id of their shard.
+            User.objects.using(db).bulk_create([
+                User(pk=make_user_id(email) if is_sharded() else None,
+                     email=email, name=users[email][0],
+                     password=passwords[email])
+                for email in emails
+            ], ignore_conflicts=True)
+            # Rows conflicting with users created since prepare() were
+            # dropped: count the users with the (salted, unique) hashes
+            # written here.
+            created += sum(
+                passwords[email] == encoded
+                for email, encoded in User.objects.using(db).filter(
+                    email__in=emails).values_list('email', 'password'))
+        self.stats['created'] += created
+        self.stats['duplicate'] += len(users) - created
+        if self.verbosity >= 1:
+            self.stdout.write(
+                '%d rows read, %d users created (%.0f users/sec)' % (
+                    self.stats['read'], self.stats['created'],
+                    self.throughput()[1]))
+
+    def throughput(self):
+        elapsed = time.perf_counter() - self.start
+        return elapsed, self.stats['created'] / elapsed if elapsed else 0
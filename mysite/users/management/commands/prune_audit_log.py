@@ -0,0 +1,50 @@
+import datetime
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from users.models import AuditEvent
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete the audit events older than the retention period, oldest "
+        "first, in bounded chunks so that the table is never locked for long."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.AUDIT_LOG_RETENTION_DAYS,
+            help='Days of events to keep (default: '
+                 'AUDIT_LOG_RETENTION_DAYS, %d).'
+                 % settings.AUDIT_LOG_RETENTION_DAYS,
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='Events deleted per DELETE statement (default: 1000).',
+        )
+        parser.add_argument(
+            '--pause', type=float, default=0,
+            help='Seconds to sleep between chunks, to let other writers in '
+                 '(default: 0).',
+        )
+
+    def handle(self, *args, days, chunk_size, pause, **options):
+        cutoff = timezone.now() - datetime.timedelta(days=days)
+        expired = AuditEvent.objects.filter(created__lt=cutoff).order_by(
+            'created').values_list('pk', flat=True)
+        deleted = 0
+        while True:
+            pks = list(expired[:chunk_size])
+            if not pks:
+                break
+            deleted += AuditEvent.objects.filter(pk__in=pks).delete()[0]
+            if len(pks) < chunk_size:
+                break
+            if pause:
+                time.sleep(pause)
+
+        self.stdout.write(self.style.SUCCESS(
+            '%d audit events older than %d days deleted.' % (deleted, days)))
@@ -0,0 +1,222 @@
+import os
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F
+
+from users.models import User
+from users.sharding import (
+    VIRTUAL_SHARDS, default_shard_map, get_shard_map, plan_shard_map,
+    save_shard_map)
+
+
+def batches(items, size=500):
+    """Split `items` to stay under SQLite's limit of query parameters."""
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def users_in(alias, virtual_shards):
+    return User.objects.using(alias).alias(
+        virtual_shard=F('pk') % VIRTUAL_SHARDS).filter(
+        virtual_shard__in=virtual_shards).order_by('pk')
+
+
+class Command(BaseCommand):
+    help = (
+        "Give every database of USER_SHARDS an equal share of the virtual "
+        "shards, moving as few as possible: copy the users of the virtual "
+        "shards changing owner to their new shard, and write USER_SHARD_MAP. "
+        "Once all workers were restarted with the new map, run it again "
+        "with --cleanup to delete the users left on their old shards. "
+        "Cleanup refuses while users were created or changed on their old "
+        "shard after the copy, unless --catch-up copies them over."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only report the virtual shards that would move.',
+        )
+        parser.add_argument(
+            '--cleanup', action='store_true',
+            help='Delete the users of virtual shards a database no longer '
+                 'owns.',
+        )
+        parser.add_argument(
+            '--catch-up', action='store_true',
+            help='With --cleanup, first copy the users created or changed on '
+                 'their old shard since the copy over to their new shard, '
+                 'overwriting changes made there since.',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='Users copied or deleted per statement (default: 1000).',
+        )
+
+    def handle(self, *args, dry_run, cleanup, catch_up, chunk_size,
+               **options):
+        if not settings.USER_SHARDS:
+            raise CommandError('Users are not sharded: USER_SHARDS is empty.')
+        if not os.path.exists(settings.USER_SHARD_MAP):
+            self.check_default_map()
+        if cleanup:
+            return self.cleanup(chunk_size, dry_run, catch_up)
+
+        shard_map = get_shard_map()
+        target = plan_shard_map(shard_map, settings.USER_SHARDS)
+        moves = defaultdict(list)
+        for v, (source, destination) in enumerate(zip(shard_map, target)):
+            if source != destination:
+                moves[source, destination].append(v)
+
+        for (source, destination), virtual_shards in sorted(moves.items()):
+            if dry_run:
+                self.stdout.write('%d virtual shards would move from %s to %s.'
+                                  % (len(virtual_shards), source, destination))
+            else:
+                copied = self.copy(
+                    source, destination, virtual_shards, chunk_size)
+                self.stdout.write(
+                    '%d users in %d virtual shards copied from %s to %s.'
+                    % (copied, len(virtual_shards), source, destination))
+        if dry_run:
+            return
+        # Also written when nothing moved, so that the current assignment
+        # survives a change of USER_SHARDS.
+        save_shard_map(target)
+        self.stdout.write(self.style.SUCCESS(
+            'Shard map written to %s. Restart the workers, then run with '
+            '--cleanup.' % settings.USER_SHARD_MAP))
+
+    def copy(self, source, destination, virtual_shards, chunk_size):
+        copied = 0
+        for batch in batches(virtual_shards):
+            with transaction.atomic(using=destination):
+                # Copies from an earlier, interrupted run.
+                users_in(destination, batch).delete()
+                pending = users_in(source, batch)
+                last_pk = None
+                while True:
+                    chunk = (pending if last_pk is None
+                             else pending.filter(pk__gt=last_pk))
+                    users = list(chunk[:chunk_size])
+                    if not users:
+                        break
+                    User.objects.using(destination).bulk_create(users)
+                    copied += len(users)
+                    last_pk = users[-1].pk
+        return copied
+
+    def check_default_map(self):
+        """
+        Without a recorded map, users are dealt round-robin over
+        USER_SHARDS, which only says where they are if it hasn't changed
+        since they were created.
+        """
+        shard_map = default_shard_map(settings.USER_SHARDS)
+        for alias in settings.USER_SHARDS:
+            others = [v for v in range(VIRTUAL_SHARDS)
+                      if shard_map[v] != alias]
+            if any(users_in(alias, batch).exists()
+                   for batch in batches(others)):
+                raise CommandError(
+                    'No shard map at %s, and users on %s are not where '
+                    'USER_SHARDS puts them: it changed since they were '
+                    'created. Restore the previous USER_SHARDS and run '
+                    'again to record the map first.'
+                    % (settings.USER_SHARD_MAP, alias))
+
+    def changed_since_copy(self, alias, virtual_shards, chunk_size):
+        """
+        Yield the users of `virtual_shards` on `alias`, their old shard,
+        which are missing or different on the shard owning them now: those
+        created or changed by workers still using the old map after the
+        copy.
+        """
+        shard_map = get_shard_map()
+        # A later sign-in on the new shard is no change to copy back.
+        fields = [f.attname for f in User._meta.concrete_fields
+                  if f.attname != 'last_login']
+        for batch in batches(virtual_shards):
+            pending = users_in(alias, batch)
+            last_pk = None
+            while True:
+                chunk = (pending if last_pk is None
+                         else pending.filter(pk__gt=last_pk))
+                users = list(chunk[:chunk_size])
+                if not users:
+                    break
+                last_pk = users[-1].pk
+                by_shard = defaultdict(list)
+                for user in users:
+                    by_shard[shard_map[user.pk % VIRTUAL_SHARDS]].append(user)
+                for destination, moved in by_shard.items():
+                    copies = User.objects.using(destination).in_bulk(
+                        [user.pk for user in moved])
+                    for user in moved:
+                        copy = copies.get(user.pk)
+                        if copy is None or any(
+                                getattr(user, f) != getattr(copy, f)
+                                for f in fields) or (
+                                user.last_login is not None and (
+                                    copy.last_login is None
+                                    or user.last_login > copy.last_login)):
+                            yield user, destination, copy
+
+    def catch_up(self, changed):
+        fields = [f.name for f in User._meta.concrete_fields
+                  if not f.primary_key]
+        for user, destination, copy in changed:
+            with transaction.atomic(using=destination):
+                if copy is None:
+                    User.objects.using(destination).bulk_create([user])
+                else:
+                    User.objects.using(destination).bulk_update(
+                        [user], fields)
+
+    def cleanup(self, chunk_size, dry_run, catch_up):
+        shard_map = get_shard_map()
+        moved = {
+            alias: [v for v in range(VIRTUAL_SHARDS) if shard_map[v] != alias]
+            for alias in settings.USER_SHARDS}
+        # Nothing is deleted before every shard was checked.
+        for alias in settings.USER_SHARDS:
+            changed = list(
+                self.changed_since_copy(alias, moved[alias], chunk_size))
+            if not changed:
+                continue
+            if not catch_up:
+                raise CommandError(
+                    '%d users on %s were created or changed after they were '
+                    'copied to their new shard (ids %s). Run with --cleanup '
+                    '--catch-up to copy them over, overwriting changes made '
+                    'to them on their new shard since.' % (
+                        len(changed), alias,
+                        ', '.join(str(user.pk) for user, *_ in changed[:10])
+                        + (', ...' if len(changed) > 10 else '')))
+            if dry_run:
+                self.stdout.write('%d changed users would be copied from %s.'
+                                  % (len(changed), alias))
+                continue
+            self.catch_up(changed)
+            self.stdout.write('%d changed users copied from %s.'
+                              % (len(changed), alias))
+
+        for alias in settings.USER_SHARDS:
+            deleted = 0
+            for batch in batches(moved[alias]):
+                if dry_run:
+                    deleted += users_in(alias, batch).count()
+                    continue
+                while True:
+                    pks = list(users_in(alias, batch).values_list(
+                        'pk', flat=True)[:chunk_size])
+                    if not pks:
+                        break
+                    deleted += User.objects.using(alias).filter(
+                        pk__in=pks).delete()[0]
+            self.stdout.write('%d moved users %s from %s.' % (
+                deleted, 'would be deleted' if dry_run else 'deleted', alias))
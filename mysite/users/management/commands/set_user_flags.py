@@ -0,0 +1,113 @@
+import contextlib
+import itertools
+
+from django.core.management.base import BaseCommand, CommandError
+
+from users.bulk import update_users
+from users.models import User
+from users.sessions import delete_sessions
+from users.sharding import emails_by_database, user_databases
+from utilities.routers import use_primary
+
+
+class Command(BaseCommand):
+    help = (
+        "Activate, deactivate, grant or revoke admin privileges for users "
+        "selected by email or domain, in chunked set-based UPDATEs."
+    )
+
+    def add_arguments(self, parser):
+        active = parser.add_mutually_exclusive_group()
+        active.add_argument(
+            '--activate', dest='is_active', action='store_true', default=None)
+        active.add_argument(
+            '--deactivate', dest='is_active', action='store_false')
+        admin = parser.add_mutually_exclusive_group()
+        admin.add_argument(
+            '--grant-admin', dest='is_admin', action='store_true',
+            default=None)
+        admin.add_argument(
+            '--revoke-admin', dest='is_admin', action='store_false')
+        parser.add_argument(
+            '--email', action='append', default=[],
+            help='Email address of a user to update. Can be repeated.',
+        )
+        parser.add_argument(
+            '--emails-from', metavar='PATH',
+            help='File with the email addresses to update, one per line.',
+        )
+        parser.add_argument(
+            '--domain', help='Update every user at this email domain.',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='Users updated per UPDATE statement (default: 1000).',
+        )
+
+    def handle(self, *args, is_active, is_admin, email, emails_from, domain,
+               chunk_size, **options):
+        values = {
+            field: value
+            for field, value in (('is_active', is_active),
+                                 ('is_admin', is_admin))
+            if value is not None
+        }
+        if not values:
+            raise CommandError(
+                'Nothing to do: pass --activate, --deactivate, --grant-admin '
+                'or --revoke-admin.')
+
+        if not email and not emails_from and not domain:
+            raise CommandError(
+                'Select users with --email, --emails-from or --domain.')
+
+        updated = 0
+        # The selected users who are inactive, whose sessions are deleted.
+        inactive = set()
+        if domain:
+            for db in user_databases():
+                users = User.objects.db_manager(db).filter_by_email_domain(
+                    domain)
+                updated += self.update(users, values, chunk_size, inactive)
+        with contextlib.ExitStack() as stack:
+            lines = email
+            if emails_from:
+                try:
+                    f = stack.enter_context(open(emails_from, encoding='utf-8'))
+                except OSError as e:
+                    raise CommandError(e)
+                lines = itertools.chain(email, f)
+            # Normalized emails match the email index. They are read and
+            # looked up a chunk at a time, to bound memory and the size of
+            # the IN clause.
+            emails = (User.objects.normalize_email(line)
+                      for line in lines if line.strip())
+            while chunk := list(itertools.islice(emails, chunk_size)):
+                for db, addresses in emails_by_database(chunk).items():
+                    users = User.objects.using(db).filter(
+                        email__in=addresses)
+                    updated += self.update(
+                        users, values, chunk_size, inactive)
+
+        if inactive:
+            # Once for all the chunks, rather than a pass over the
+            # sessions per chunk. Those deactivated by an earlier,
+            # interrupted run are included.
+            deleted, _ = delete_sessions(inactive, batch_size=chunk_size)
+            if deleted is not None:
+                self.stdout.write(
+                    '%d sessions of inactive users deleted.' % deleted)
+        self.stdout.write(self.style.SUCCESS('%d users updated.' % updated))
+
+    def update(self, users, values, chunk_size, inactive):
+        """
+        Update `users`, adding the pks of those inactive to `inactive` when
+        deactivating. Return the number of users updated.
+        """
+        updated, _ = update_users(
+            users, values, chunk_size, end_sessions=False)
+        if values.get('is_active') is False:
+            with use_primary():
+                inactive.update(users.filter(is_active=False).values_list(
+                    'pk', flat=True))
+        return updated
@@ -0,0 +1,172 @@
+import calendar
+import json
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from users.cache import invalidate_users
+from users.last_login import get_cache, is_deferred, make_key
+from users.models import User
+from users.sessions import delete_sessions
+from users.sharding import is_sharded
+
+
+def months_before(moment, months):
+    year, month = divmod(moment.month - 1 - months, 12)
+    year += moment.year
+    month += 1
+    day = min(moment.day, calendar.monthrange(year, month)[1])
+    return moment.replace(year=year, month=month, day=day)
+
+
+def user_databases():
+    return settings.USER_SHARDS if is_sharded() else [DEFAULT_DB_ALIAS]
+
+
+def signed_in_since(pks, cutoff):
+    """
+    Return those of `pks` with a deferred sign-in after `cutoff`, which
+    last_login doesn't show yet (see users.last_login).
+    """
+    if not is_deferred():
+        return set()
+    pending = get_cache().get_many([make_key(pk) for pk in pks])
+    return {pk for pk in pks
+            if pending.get(make_key(pk), cutoff) > cutoff}
+
+
+class Command(BaseCommand):
+    help = (
+        "Deactivate, or delete, the users who haven't signed in for a number "
+        "of months, walking the users by primary key in bounded batches with "
+        "a pause between them, then delete the sessions of inactive and "
+        "deleted users. An interrupted sweep resumes from its checkpoint "
+        "file; without one it starts over, skipping the users already swept."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months', type=int, default=12,
+            help='Sweep the users who last signed in longer ago than this '
+                 '(default: 12).',
+        )
+        parser.add_argument(
+            '--delete', action='store_true',
+            help='Delete the users instead of deactivating them.',
+        )
+        parser.add_argument(
+            '--include-never-signed-in', action='store_true',
+            help='Also sweep the users who never signed in.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Users swept per transaction (default: 500).',
+        )
+        parser.add_argument(
+            '--pause', type=float, default=0.1,
+            help='Seconds to sleep between batches, to let other writers in '
+                 '(default: 0.1).',
+        )
+        parser.add_argument(
+            '--checkpoint', metavar='PATH',
+            help='File recording the progress after every batch, to resume '
+                 'from. Removed once the sweep is complete.',
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only report what would be swept.',
+        )
+
+    def handle(self, *args, months, delete, include_never_signed_in,
+               batch_size, pause, checkpoint, dry_run, **options):
+        self.batch_size = batch_size
+        self.pause = 0 if dry_run else pause
+        self.dry_run = dry_run
+        action = 'delete' if delete else 'deactivate'
+        self.progress = self.load_checkpoint(checkpoint, action)
+        self.checkpoint = None if dry_run else checkpoint
+
+        cutoff = months_before(timezone.now(), months)
+        stale = Q(last_login__lt=cutoff)
+        if include_never_signed_in:
+            stale |= Q(last_login__isnull=True)
+        if not delete:
+            stale &= Q(is_active=True)
+
+        verb = ('would be %sd' if dry_run else '%sd') % action
+        for db in user_databases():
+            swept = self.sweep(db, stale, cutoff, delete)
+            self.stdout.write('%d users %s on %s.' % (swept, verb, db))
+
+        deleted, _ = delete_sessions(
+            batch_size=batch_size, pause=self.pause, dry_run=dry_run)
+        if deleted is None:
+            self.stdout.write(
+                '%s has no session table: the sessions of swept users stop '
+                'authenticating on their own.' % settings.SESSION_ENGINE)
+        else:
+            self.stdout.write('%d sessions of inactive or deleted users %s.'
+                              % (deleted, 'would be deleted' if dry_run
+                                 else 'deleted'))
+
+        if self.checkpoint and os.path.exists(self.checkpoint):
+            os.remove(self.checkpoint)
+        self.stdout.write(self.style.SUCCESS(
+            'Sweep of users inactive since %s %s.'
+            % (cutoff.date(), 'simulated' if dry_run else 'complete')))
+
+    def load_checkpoint(self, path, action):
+        progress = {'action': action, 'last_pk': {}}
+        if path is None or not os.path.exists(path):
+            return progress
+        with open(path) as f:
+            saved = json.load(f)
+        if saved.get('action') != action:
+            self.stderr.write('Ignoring the checkpoint of a %s sweep.'
+                              % saved.get('action'))
+            return progress
+        self.stdout.write('Resuming from %s.' % path)
+        return saved
+
+    def save_checkpoint(self, db, last_pk):
+        self.progress['last_pk'][db] = last_pk
+        if self.checkpoint:
+            with open(self.checkpoint, 'w') as f:
+                json.dump(self.progress, f)
+
+    def sweep(self, db, stale, cutoff, delete):
+        users = User.objects.using(db).filter(stale)
+        pending = users.order_by('pk').values_list('pk', flat=True)
+        last_pk = self.progress['last_pk'].get(db)
+        swept = 0
+        while True:
+            chunk = (pending if last_pk is None
+                     else pending.filter(pk__gt=last_pk))
+            read = list(chunk[:self.batch_size])
+            if not read:
+                break
+            last_pk = read[-1]
+            recent = signed_in_since(read, cutoff)
+            pks = [pk for pk in read if pk not in recent]
+            if self.dry_run:
+                swept += len(pks)
+            elif pks:
+                with transaction.atomic(using=db):
+                    # Users who signed in since they were read are skipped.
+                    batch = users.filter(pk__in=pks)
+                    if delete:
+                        swept += batch.delete()[1].get(User._meta.label, 0)
+                    else:
+                        swept += batch.update(is_active=False)
+                        invalidate_users(pks)
+            self.save_checkpoint(db, last_pk)
+            if len(read) < self.batch_size:
+                break
+            if self.pause:
+                time.sleep(self.pause)
+        return swept
@@ -0,0 +1,25 @@
+# Generated by Django 4.0.6 on 2026-10-18 14:13
+
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+def canonicalize_emails(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    User.objects.using(schema_editor.connection.alias).update(
+        email=django.db.models.functions.text.Lower('email'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(canonicalize_emails, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='user',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('email'), name='users_user_email_ci_unique'),
+        ),
+    ]
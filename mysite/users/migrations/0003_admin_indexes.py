@@ -0,0 +1,26 @@
+# Generated by Django 4.0.6 on 2026-10-18 14:34
+
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_email_ci_unique'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(django.db.models.functions.text.Reverse('email'), name='users_user_email_rev_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['is_admin', 'email'], name='users_user_admin_email_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['is_active', 'email'], name='users_user_active_email_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.0.6 on 2026-10-18 15:07
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_admin_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(default=django.utils.timezone.now)),
+                ('event', models.CharField(choices=[('signin', 'Sign-in'), ('signin_failed', 'Failed sign-in'), ('signin_throttled', 'Throttled sign-in'), ('signout', 'Sign-out'), ('password_change', 'Password change'), ('password_reset_request', 'Password reset request'), ('password_reset', 'Password reset')], max_length=32)),
+                ('email', models.CharField(blank=True, max_length=255)),
+                ('ip', models.GenericIPAddressField(blank=True, null=True)),
+                ('user_agent', models.CharField(blank=True, max_length=255)),
+                ('user', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Audit event',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='auditevent',
+            index=models.Index(fields=['created'], name='users_audit_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditevent',
+            index=models.Index(fields=['user', 'created'], name='users_audit_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditevent',
+            index=models.Index(fields=['email', 'created'], name='users_audit_email_idx'),
+        ),
+    ]
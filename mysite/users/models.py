@@ -1,12 +1,85 @@
 from django.urls import reverse
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Lower, Reverse
 from django.contrib.auth.models import (
     BaseUserManager, AbstractBaseUser
 )
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+from .sharding import (
+    is_sharded, make_user_id, shard_for_email, shard_for_pk,
+    virtual_shard_for_email, virtual_shard_for_pk)
+
+
+def prefix_upper_bound(prefix):
+    """
+    Return the smallest string greater than all strings starting with
+    `prefix`, for prefix searches as index range scans.
+    """
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1) if prefix else '\U0010ffff'
+
 
 class UserManager(BaseUserManager):
+    @classmethod
+    def normalize_email(cls, email):
+        """
+        Normalize the email address by lowercasing it entirely, so every
+        address is stored in the canonical form the ``Lower(email)`` unique
+        index is built on.
+        """
+        return super().normalize_email(email).strip().lower()
+
+    def for_email(self, email):
+        """
+        Return this manager on the shard of the given email address when
+        users are sharded (see users.sharding) and no database was chosen.
+        """
+        if self._db is None and is_sharded():
+            return self.db_manager(shard_for_email(email))
+        return self
+
+    def for_pk(self, pk):
+        """Return this manager on the shard of the user with the given id."""
+        if self._db is None and is_sharded():
+            return self.db_manager(shard_for_pk(pk))
+        return self
+
+    def filter_by_email(self, email):
+        """
+        Return the users matching the given email address case-insensitively.
+        The comparison is made against ``Lower(email)`` so that the functional
+        unique index can be used instead of a full table scan.
+        """
+        return self.for_email(email).alias(email_lower=Lower('email')).filter(
+            email_lower=self.normalize_email(email))
+
+    def filter_by_email_prefix(self, prefix):
+        """
+        Return the users whose email address starts with `prefix`, as a
+        range scan of the email index. Emails are stored normalized, so the
+        comparison is case-insensitive.
+        """
+        prefix = self.normalize_email(prefix)
+        return self.filter(
+            email__gte=prefix, email__lt=prefix_upper_bound(prefix))
+
+    def filter_by_email_domain(self, domain):
+        """
+        Return the users whose email address is at `domain`, as a prefix
+        range scan of the index on the reversed email address.
+        """
+        suffix = ('@' + self.normalize_email(domain).lstrip('@'))[::-1]
+        return self.alias(email_reversed=Reverse('email')).filter(
+            email_reversed__gte=suffix,
+            email_reversed__lt=prefix_upper_bound(suffix))
+
+    def get_by_email(self, email):
+        return self.filter_by_email(email).get()
+
+    def get_by_natural_key(self, username):
+        return self.get_by_email(username)
+
     def create_user(self, email, name, password=None):
         """
         Creates and saves a User with the given email, date of
@@ -43,6 +116,19 @@ class User(AbstractBaseUser):
 
     class Meta:
         verbose_name = _("User")
+        constraints = [
+            models.UniqueConstraint(
+                Lower('email'), name='users_user_email_ci_unique'),
+        ]
+        indexes = [
+            # Domain search, see UserManager.filter_by_email_domain().
+            models.Index(Reverse('email'), name='users_user_email_rev_idx'),
+            # The admin changelist filters, ordered by email.
+            models.Index(fields=['is_admin', 'email'],
+                         name='users_user_admin_email_idx'),
+            models.Index(fields=['is_active', 'email'],
+                         name='users_user_active_email_idx'),
+        ]
 
     email = models.EmailField(
         verbose_name=_('email address'),
@@ -67,6 +153,45 @@ class User(AbstractBaseUser):
     def __str__(self):
         return self.email
 
+    def save(self, *args, **kwargs):
+        # A sharded user's id encodes the virtual shard of its email.
+        if self.pk is None and is_sharded():
+            self.pk = make_user_id(self.email)
+            kwargs['force_insert'] = True
+        elif is_sharded() and (virtual_shard_for_email(self.email)
+                               != virtual_shard_for_pk(self.pk)):
+            self.move_to_new_id()
+            return
+        super().save(*args, **kwargs)
+
+    def move_to_new_id(self):
+        """
+        Save the user under a new id on the virtual shard of its email
+        address, after the email changed to another one, and delete the
+        row under the old id. Its audit events and admin log entries are
+        moved along; its sessions no longer authenticate, see ProfileView
+        for the one making the change.
+        """
+        from django.contrib.admin.models import LogEntry
+
+        old_pk, old_db = self.pk, shard_for_pk(self.pk)
+        self.pk = make_user_id(self.email)
+        new_db = shard_for_pk(self.pk)
+        with transaction.atomic(using=new_db), \
+                transaction.atomic(using=old_db):
+            entries = list(LogEntry.objects.using(old_db).filter(
+                user_id=old_pk))
+            LogEntry.objects.using(old_db).filter(user_id=old_pk).delete()
+            # Deleted first: both databases may be the same one, where the
+            # email address is unique.
+            User.objects.using(old_db).filter(pk=old_pk).delete()
+            super().save(using=new_db, force_insert=True)
+            for entry in entries:
+                entry.pk = None
+                entry.user_id = self.pk
+            LogEntry.objects.using(new_db).bulk_create(entries)
+            AuditEvent.objects.filter(user_id=old_pk).update(user_id=self.pk)
+
     def has_perm(self, perm, obj=None):
         "Does the user have a specific permission?"
         # Simplest possible answer: Yes, always
@@ -77,6 +202,26 @@ class User(AbstractBaseUser):
         # Simplest possible answer: Yes, always
         return True
 
+    def set_password_hash(self, raw_password, encoded):
+        """
+        Like set_password(), for a hash already computed with
+        make_password(), e.g. on the hasher pool of the async views.
+        """
+        self.password = encoded
+        self._password = raw_password
+
+    def get_session_auth_hash(self):
+        """
+        Return an HMAC of the password field. The result is memoized per
+        password hash, so cached user instances don't recompute it on every
+        request.
+        """
+        memo = self.__dict__.get('_session_auth_hash')
+        if memo is None or memo[0] != self.password:
+            memo = (self.password, super().get_session_auth_hash())
+            self._session_auth_hash = memo
+        return memo[1]
+
     @property
     def is_staff(self):
         "Is the user a member of staff?"
@@ -85,3 +230,47 @@ class User(AbstractBaseUser):
 
     def get_absolute_url(self):
         return reverse('users:profile', kwargs={'pk': self.pk})
+
+
+class AuditEvent(models.Model):
+    """
+    An authentication event kept for security review. Rows are appended in
+    batches by users.audit and deleted by age with prune_audit_log, never
+    updated, so the table can be range-partitioned on `created`.
+    """
+
+    class Event(models.TextChoices):
+        SIGNIN = 'signin', _('Sign-in')
+        SIGNIN_FAILED = 'signin_failed', _('Failed sign-in')
+        SIGNIN_THROTTLED = 'signin_throttled', _('Throttled sign-in')
+        SIGNOUT = 'signout', _('Sign-out')
+        PASSWORD_CHANGE = 'password_change', _('Password change')
+        PASSWORD_RESET_REQUEST = (
+            'password_reset_request', _('Password reset request'))
+        PASSWORD_RESET = 'password_reset', _('Password reset')
+
+    class Meta:
+        verbose_name = _("Audit event")
+        indexes = [
+            models.Index(fields=['created'], name='users_audit_created_idx'),
+            models.Index(fields=['user', 'created'],
+                         name='users_audit_user_idx'),
+            models.Index(fields=['email', 'created'],
+                         name='users_audit_email_idx'),
+        ]
+
+    created = models.DateTimeField(default=timezone.now)
+    event = models.CharField(max_length=32, choices=Event.choices)
+    # No database constraint: a batch written after one of its users was
+    # deleted must not fail as a whole.
+    user = models.ForeignKey(
+        User, null=True, blank=True, on_delete=models.SET_NULL,
+        db_constraint=False, related_name='+')
+    # The email address at the time, or the one a failed sign-in or reset
+    # request was made for.
+    email = models.CharField(max_length=255, blank=True)
+    ip = models.GenericIPAddressField(null=True, blank=True)
+    user_agent = models.CharField(max_length=255, blank=True)
+
+    def __str__(self):
+        return '%s %s %s' % (self.created, self.event, self.email)
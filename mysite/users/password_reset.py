@@ -0,0 +1,32 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+
+from utilities.metrics import Counter
+
+
+password_reset_requests = Counter(
+    'users_password_reset_requests_total',
+    'Password reset requests, by whether they were sent or suppressed as a '
+    'repeat of a recent request for the same email address.',
+    labelnames=('outcome',),
+)
+
+
+def coalesce_password_reset(email):
+    """
+    Return True if a password reset for `email` may go ahead, or False if
+    one was already requested within PASSWORD_RESET_COALESCE_WINDOW
+    seconds. The marker is a single cache.add(), so concurrent requests on
+    any worker sharing the cache let exactly one through.
+    """
+    window = settings.PASSWORD_RESET_COALESCE_WINDOW
+    if not window:
+        return True
+    from .models import User
+    digest = hashlib.blake2b(
+        User.objects.normalize_email(email).encode(),
+        digest_size=8).hexdigest()
+    return caches[settings.PASSWORD_RESET_CACHE_ALIAS].add(
+        'password_reset:%s' % digest, 1, timeout=window)
@@ -0,0 +1,97 @@
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+
+from utilities.routers import use_primary
+
+from .models import User
+from .sharding import is_sharded, shard_for_pk
+
+
+def active_user_ids(user_ids):
+    """Return those of `user_ids` (strings) whose user is active."""
+    by_db = {}
+    for user_id in user_ids:
+        try:
+            pk = int(user_id)
+        except ValueError:
+            continue
+        db = shard_for_pk(pk) if is_sharded() else DEFAULT_DB_ALIAS
+        by_db.setdefault(db, []).append(pk)
+    return {
+        str(pk)
+        for db, pks in by_db.items()
+        for pk in User.objects.using(db).filter(
+            pk__in=pks, is_active=True).values_list('pk', flat=True)
+    }
+
+
+def delete_sessions(user_ids=None, batch_size=1000, pause=0, dry_run=False,
+                    deadline=None):
+    """
+    Delete the unexpired sessions of the users of `user_ids`, or if None,
+    of the users who are inactive or gone, so that they are signed out in
+    every process, whatever the user cache holds. Sessions don't index
+    their user: they are read and decoded by session key in batches of
+    `batch_size`, sleeping `pause` seconds after a batch that deleted any.
+    Stop after the batch that reaches `deadline`, a time.monotonic() value,
+    if given.
+
+    Return the number of sessions deleted (or, with `dry_run`, that would
+    be), or None if the session engine has no table, and whether all
+    sessions were read.
+    """
+    engine = import_module(settings.SESSION_ENGINE)
+    get_model_class = getattr(engine.SessionStore, 'get_model_class', None)
+    if get_model_class is None:
+        return None, True
+    model = get_model_class()
+    store = engine.SessionStore()
+    prefix = getattr(engine.SessionStore, 'cache_key_prefix', None)
+    if user_ids is not None:
+        user_ids = {str(user_id) for user_id in user_ids}
+    # Expired sessions are left to purge_sessions.
+    sessions = model.objects.filter(
+        expire_date__gte=timezone.now()).order_by('session_key')
+    last_key = None
+    deleted = 0
+    with use_primary():
+        while True:
+            chunk = (sessions if last_key is None
+                     else sessions.filter(session_key__gt=last_key))
+            rows = list(chunk.values_list(
+                'session_key', 'session_data')[:batch_size])
+            if not rows:
+                break
+            last_key = rows[-1][0]
+            owners = {}
+            for key, data in rows:
+                user_id = store.decode(data).get(SESSION_KEY)
+                if user_id is not None:
+                    owners[key] = str(user_id)
+            if user_ids is None:
+                active = active_user_ids(set(owners.values()))
+                keys = [key for key, user_id in owners.items()
+                        if user_id not in active]
+            else:
+                keys = [key for key, user_id in owners.items()
+                        if user_id in user_ids]
+            deleted += len(keys)
+            if keys and not dry_run:
+                model.objects.filter(session_key__in=keys).delete()
+                if prefix is not None:
+                    # cached_db keeps a copy in the cache.
+                    caches[settings.SESSION_CACHE_ALIAS].delete_many(
+                        [prefix + key for key in keys])
+            if len(rows) < batch_size:
+                break
+            if deadline is not None and time.monotonic() >= deadline:
+                return deleted, False
+            if keys and pause:
+                time.sleep(pause)
+    return deleted, True
@@ -0,0 +1,158 @@
+import functools
+import itertools
+import json
+import random
+import time
+import zlib
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+
+# Every email address hashes to one of the virtual shards, which is encoded
+# in the low bits of the ids of its users. Changing it invalidates all ids.
+VIRTUAL_SHARDS = 1024
+
+# Ids are (milliseconds since ID_EPOCH_MS << 22 | sequence << 10 | virtual
+# shard): time ordered, and unique across shards up to 4096 new users per
+# millisecond and virtual shard in a process.
+ID_EPOCH_MS = 1672531200000  # 2023-01-01 UTC
+_sequence = itertools.count(random.randrange(4096))
+
+
+def is_sharded():
+    return bool(settings.USER_SHARDS)
+
+
+def virtual_shard_for_email(email):
+    """Return the virtual shard of a (normalized) email address."""
+    return zlib.crc32(email.strip().lower().encode()) % VIRTUAL_SHARDS
+
+
+def virtual_shard_for_pk(pk):
+    return int(pk) % VIRTUAL_SHARDS
+
+
+def make_user_id(email):
+    """Return a new user id, on the virtual shard of `email`."""
+    elapsed = int(time.time() * 1000) - ID_EPOCH_MS
+    return ((elapsed << 22) | (next(_sequence) % 4096) << 10
+            | virtual_shard_for_email(email))
+
+
+def default_shard_map(shards):
+    return [shards[v % len(shards)] for v in range(VIRTUAL_SHARDS)]
+
+
+@functools.lru_cache(maxsize=None)
+def get_shard_map():
+    """
+    Return the database alias owning each virtual shard: from the
+    settings.USER_SHARD_MAP file written by rebalance_user_shards, else the
+    virtual shards dealt round-robin over settings.USER_SHARDS.
+    """
+    try:
+        with open(settings.USER_SHARD_MAP) as f:
+            return tuple(json.load(f)['shards'])
+    except FileNotFoundError:
+        return tuple(default_shard_map(settings.USER_SHARDS))
+
+
+def save_shard_map(shard_map):
+    with open(settings.USER_SHARD_MAP, 'w') as f:
+        json.dump({'shards': list(shard_map)}, f)
+    get_shard_map.cache_clear()
+
+
+def shard_for_email(email):
+    return get_shard_map()[virtual_shard_for_email(email)]
+
+
+def shard_for_pk(pk):
+    return get_shard_map()[virtual_shard_for_pk(pk)]
+
+
+def user_databases():
+    """
+    Return the databases to run a query over all users on, with .using():
+    every shard, or None to leave the choice to the routers.
+    """
+    return list(settings.USER_SHARDS) if is_sharded() else [None]
+
+
+def emails_by_database(emails):
+    """
+    Return a dict of the databases of the users of `emails`, as in
+    user_databases(), to lists of those emails.
+    """
+    groups = {}
+    for email in emails:
+        db = shard_for_email(email) if is_sharded() else None
+        groups.setdefault(db, []).append(email)
+    return groups
+
+
+def plan_shard_map(shard_map, shards):
+    """
+    Return a copy of `shard_map` in which each database of `shards` owns an
+    equal share of the virtual shards, moving as few virtual shards as
+    possible. Those of databases no longer in `shards` are moved too.
+    """
+    target = list(shard_map)
+    owned = {alias: [] for alias in shards}
+    pool = []
+    for v, alias in enumerate(target):
+        if alias in owned:
+            owned[alias].append(v)
+        else:
+            pool.append(v)
+
+    # The remainder goes to the databases already owning the most.
+    by_size = sorted(shards, key=lambda alias: -len(owned[alias]))
+    quota = {alias: VIRTUAL_SHARDS // len(shards)
+             + (i < VIRTUAL_SHARDS % len(shards))
+             for i, alias in enumerate(by_size)}
+    for alias in shards:
+        while len(owned[alias]) > quota[alias]:
+            pool.append(owned[alias].pop())
+    for alias in shards:
+        while len(owned[alias]) < quota[alias]:
+            v = pool.pop()
+            target[v] = alias
+            owned[alias].append(v)
+    return target
+
+
+@receiver(setting_changed)
+def clear_shard_map(*, setting, **kwargs):
+    if setting in ('USER_SHARDS', 'USER_SHARD_MAP'):
+        get_shard_map.cache_clear()
+
+
+class UserShardRouter:
+    """
+    Route users.User to the database of settings.USER_SHARDS owning the
+    virtual shard of the instance's id or, for a new user, email address.
+    Other lookups must pick the shard themselves, see
+    UserManager.for_email() and for_pk(); without a shard they fall
+    through to the next router.
+    """
+
+    def db_for_user(self, model, instance=None, **hints):
+        if (not is_sharded() or model._meta.label_lower != 'users.user'
+                or not isinstance(instance, model)):
+            return None
+        if instance.pk is not None:
+            return shard_for_pk(instance.pk)
+        return shard_for_email(instance.email)
+
+    db_for_read = db_for_user
+    db_for_write = db_for_user
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Other tables refer to users on any shard by id.
+        if is_sharded() and 'users.user' in (
+                obj1._meta.label_lower, obj2._meta.label_lower):
+            return True
+        return None
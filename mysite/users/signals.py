@@ -0,0 +1,56 @@
+from django.contrib.auth.signals import (
+    user_logged_in, user_logged_out, user_login_failed)
+from django.core.signals import request_finished
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .audit import audit_log
+from .cache import invalidate_user
+from .last_login import last_logins, update_last_login
+from .models import AuditEvent, User
+
+
+# Sign-ins may be written later, see users.last_login.
+user_logged_in.disconnect(dispatch_uid='update_last_login')
+user_logged_in.connect(update_last_login, dispatch_uid='users.last_login')
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    """
+    Invalidate the cached user whenever the row changes, which covers
+    profile edits, password changes and deactivation.
+    """
+    invalidate_user(instance.pk)
+
+
+@receiver(user_logged_in)
+def audit_signin(sender, request, user, **kwargs):
+    audit_log.record(AuditEvent.Event.SIGNIN, request, user)
+
+
+@receiver(user_login_failed)
+def audit_signin_failure(sender, credentials, request=None, **kwargs):
+    audit_log.record(AuditEvent.Event.SIGNIN_FAILED, request,
+                     email=credentials.get('username', ''))
+
+
+@receiver(user_logged_out)
+def audit_signout(sender, request, user, **kwargs):
+    if user is not None:
+        audit_log.record(AuditEvent.Event.SIGNOUT, request, user)
+
+
+@receiver(request_finished)
+def flush_audit_log(sender, **kwargs):
+    """Write the buffered audit events once due, after the response."""
+    if audit_log.is_due():
+        audit_log.flush()
+
+
+@receiver(request_finished)
+def flush_last_logins(sender, **kwargs):
+    """Write the deferred sign-ins once due, after the response."""
+    if last_logins.is_due():
+        last_logins.flush()
@@ -1,14 +1,66 @@
 # tests.py
-from django.test import TestCase, Client
+import asyncio
+import copy
+import datetime
+import csv
+import gzip
+import json
+import os
+import re
+import tempfile
+import threading
+from io import StringIO
+from unittest import mock
+
+from django.test import (
+    Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase,
+    override_settings)
 from django.urls import reverse
-from django.contrib.auth import get_user_model
+from django.contrib.auth import (
+    SESSION_KEY, authenticate, get_user_model, user_login_failed)
+from django.contrib.auth.hashers import (
+    PBKDF2PasswordHasher, ScryptPasswordHasher, get_hasher, make_password)
+from django.contrib.admin.models import CHANGE, DELETION, LogEntry
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.sessions.models import Session
 from django.core import mail
+from django.core.management import CommandError, call_command
+from django.core.cache import cache
+from django.conf import settings
+from django.db import (
+    DatabaseError, IntegrityError, connection, router, transaction)
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.tokens import default_token_generator
 from django.utils.http import urlsafe_base64_encode
+from django.utils import timezone
 from django.utils.encoding import force_bytes
 from django.contrib.messages import get_messages
 
-from .models import User, UserManager
+from utilities.paginators import EstimatedCountPaginator
+from utilities.testing import (
+    QueryBudget, QueryBudgetMixin, SharedCacheMixin)
+
+from .audit import audit_log
+from .backends import EmailBackend, aauthenticate
+from .bulk import update_users
+from .cache import get_cached_user
+from .checks import check_last_login_cache, check_password_reset_cache
+from .management.commands import import_users
+from .last_login import (
+    LastLoginTokenGenerator, get_last_login, last_logins)
+from .models import AuditEvent, User, UserManager
+from .password_reset import password_reset_requests
+from .sessions import delete_sessions
+from .sharding import (
+    VIRTUAL_SHARDS, default_shard_map, make_user_id, plan_shard_map,
+    save_shard_map, shard_for_email, shard_for_pk, virtual_shard_for_email,
+    virtual_shard_for_pk)
+from .throttling import (
+    CacheBackend, MemoryBackend, SigninThrottle, reset_signin_throttle,
+    signin_attempts)
+from .urls import ASYNC_VIEWS
+from .views import AsyncResetPasswordView, AsyncSigninView
 from .forms import SigninForm, SignupForm, ChangePasswordForm, ResetPasswordForm, PasswordSetForm, ProfileForm
 
 User = get_user_model()
@@ -73,7 +125,7 @@ class UserModelTestCase(TestCase):
             password='testpassword123'
         )
         
-        self.assertEqual(user.email, 'Test@example.com')
+        self.assertEqual(user.email, 'test@example.com')
         
     def test_user_permissions(self):
         """ユーザー権限のテスト"""
@@ -332,6 +384,8 @@ class PasswordResetViewTestCase(TestCase):
             name='Test User',
             password='testpassword123'
         )
+        # Forget the password reset requests coalesced by other tests.
+        cache.clear()
         
     def test_password_reset_view_get(self):
         """パスワードリセットページの表示テスト"""
@@ -495,6 +549,16 @@ class FormTestCase(TestCase):
         
         self.assertTrue(form.is_valid())
 
+    def test_reset_form_get_users(self):
+        """パスワードリセットの対象が大文字小文字を区別せずに見つかるかのテスト"""
+        user = User.objects.create_user(
+            email='test@example.com', name='Test User',
+            password='testpassword123')
+        User.objects.create_user(email='unusable@example.com', name='User')
+        form = ResetPasswordForm()
+        self.assertEqual(list(form.get_users('Test@Example.COM')), [user])
+        self.assertEqual(list(form.get_users('unusable@example.com')), [])
+
 
 class URLTestCase(TestCase):
     """URL設定のテスト"""
@@ -521,6 +585,1725 @@ class URLTestCase(TestCase):
         )
 
 
+class EmailBackendTestCase(TestCase):
+    """メールアドレス認証バックエンドのテスト"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='Test@Example.com',
+            name='Test User',
+            password='testpassword123'
+        )
+
+    def test_email_stored_in_canonical_form(self):
+        """メールアドレスが正規化されて保存されるかのテスト"""
+        self.assertEqual(self.user.email, 'test@example.com')
+
+    def test_authenticate_case_insensitive(self):
+        """大文字小文字を区別しない認証テスト"""
+        user = authenticate(username='TEST@example.COM', password='testpassword123')
+
+        self.assertEqual(user, self.user)
+
+    def test_authenticate_wrong_password(self):
+        """誤ったパスワードでの認証テスト"""
+        self.assertIsNone(authenticate(username='test@example.com', password='wrong'))
+        self.assertIsNone(authenticate(username='nobody@example.com', password='wrong'))
+
+    def test_authenticate_inactive_user(self):
+        """無効化されたユーザーの認証テスト"""
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertIsNone(authenticate(username='test@example.com', password='testpassword123'))
+
+    def test_lookup_uses_functional_index(self):
+        """メールアドレス検索が関数インデックスを使用するかのテスト"""
+        plan = User.objects.filter_by_email('TEST@example.com').explain()
+
+        self.assertIn('users_user_email_ci_unique', plan)
+
+    def test_case_variant_signup_rejected(self):
+        """大文字小文字違いのメールアドレスでのサインアップテスト"""
+        form = SignupForm(data={
+            'email': 'TEST@EXAMPLE.COM',
+            'name': 'Other User',
+            'password1': 'newpassword123',
+            'password2': 'newpassword123'
+        })
+
+        self.assertFalse(form.is_valid())
+        self.assertIn('email', form.errors)
+
+    def test_case_variant_password_reset(self):
+        """大文字小文字違いのメールアドレスでのリセット要求テスト"""
+        form = ResetPasswordForm(data={'email': 'TEST@example.com'})
+
+        self.assertTrue(form.is_valid())
+        self.assertEqual(list(form.get_users(form.cleaned_data['email'])), [self.user])
+
+
+class UserCacheTestCase(SharedCacheMixin, TestCase):
+    """ユーザーキャッシュのテスト"""
+
+    def setUp(self):
+        cache.clear()
+        self.backend = EmailBackend()
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            name='Test User',
+            password='testpassword123'
+        )
+
+    def test_get_user_cached(self):
+        """2回目以降のユーザー取得でクエリが発行されないかのテスト"""
+        with self.assertNumQueries(1):
+            self.backend.get_user(self.user.pk)
+        with self.assertNumQueries(0):
+            user = self.backend.get_user(self.user.pk)
+
+        self.assertEqual(user, self.user)
+        self.assertEqual(user.get_session_auth_hash(), self.user.get_session_auth_hash())
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_process_local_cache_unused(self):
+        """プロセスごとのキャッシュではユーザーがキャッシュされないかのテスト"""
+        self.backend.get_user(self.user.pk)
+        with self.assertNumQueries(1):
+            self.backend.get_user(self.user.pk)
+
+    def test_invalidated_on_save(self):
+        """保存時にキャッシュが無効化されるかのテスト"""
+        self.backend.get_user(self.user.pk)
+        self.user.name = 'Updated User'
+        self.user.save()
+
+        self.assertEqual(self.backend.get_user(self.user.pk).name, 'Updated User')
+
+    def test_invalidated_on_deactivation(self):
+        """無効化されたユーザーがキャッシュから返されないかのテスト"""
+        self.backend.get_user(self.user.pk)
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertIsNone(self.backend.get_user(self.user.pk))
+
+    def test_invalidated_on_password_change(self):
+        """パスワード変更で既存セッションが無効になるかのテスト"""
+        client = Client()
+        client.login(username='test@example.com', password='testpassword123')
+        client.get(reverse('blog:home'))
+        self.user.set_password('newpassword123')
+        self.user.save()
+
+        response = client.get(reverse('blog:home'))
+
+        self.assertEqual(response.status_code, 302)
+
+    def test_authenticated_request_without_user_query(self):
+        """認証済みリクエストでユーザーテーブルへのクエリがないかのテスト"""
+        self.client.login(username='test@example.com', password='testpassword123')
+        self.client.get(reverse('blog:home'))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('blog:home'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([q for q in queries if 'users_user' in q['sql']])
+
+
+class SignupPipelineTestCase(TestCase):
+    """サインアップ処理のテスト"""
+
+    def setUp(self):
+        self.valid_data = {
+            'email': 'newuser@example.com',
+            'name': 'New User',
+            'password1': 'newpassword123',
+            'password2': 'newpassword123'
+        }
+
+    def test_password_hashed_once(self):
+        """サインアップ時のパスワードハッシュ計算が1回のみかのテスト"""
+        hasher = get_hasher()
+        with mock.patch.object(type(hasher), 'encode', autospec=True,
+                               side_effect=type(hasher).encode) as encode:
+            response = self.client.post(reverse('users:signup'), self.valid_data)
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(encode.call_count, 1)
+        user = User.objects.get(email=self.valid_data['email'])
+        self.assertEqual(int(self.client.session['_auth_user_id']), user.id)
+
+    def test_concurrent_duplicate_email(self):
+        """同時サインアップによる重複メールアドレスのテスト"""
+        # フォームの検証後に別のリクエストが同じアドレスを登録した状況を再現する
+        def register_concurrently(form):
+            email = form.cleaned_data['email']
+            User.objects.create_user(email=email, name='Other User')
+            return email
+
+        with mock.patch.object(SignupForm, 'clean_email', autospec=True,
+                               side_effect=register_concurrently):
+            response = self.client.post(reverse('users:signup'), self.valid_data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('email', response.context['form'].errors)
+        self.assertNotIn('_auth_user_id', self.client.session)
+
+
+class AsyncViewTestCase(TestCase):
+    """非同期ビューのテスト"""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            name='Test User',
+            password='testpassword123'
+        )
+        cache.clear()
+
+    def make_request(self, url, data):
+        request = self.factory.post(url, data)
+        request._dont_enforce_csrf_checks = True
+        request.session = SessionStore()
+        request.user = AnonymousUser()
+        return request
+
+    def test_views_are_coroutines(self):
+        """非同期ビューがコルーチン関数として扱われるかのテスト"""
+        for view_class in ASYNC_VIEWS.values():
+            self.assertTrue(asyncio.iscoroutinefunction(view_class.as_view()))
+
+    async def test_async_signin(self):
+        """非同期サインインでハッシュ計算が専用スレッドで行われるかのテスト"""
+        threads = []
+        hasher = type(get_hasher())
+        hasher_verify = hasher.verify
+
+        def verify(self, password, encoded):
+            threads.append(threading.current_thread().name)
+            return hasher_verify(self, password, encoded)
+
+        request = self.make_request(reverse('users:signin'), {
+            'username': 'test@example.com',
+            'password': 'testpassword123'
+        })
+        with mock.patch.object(hasher, 'verify', verify):
+            response = await AsyncSigninView.as_view()(request)
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(request.session['_auth_user_id'], str(self.user.pk))
+        self.assertTrue(threads[0].startswith('users-hasher'))
+        self.assertIn('no-cache', response['Cache-Control'])
+
+    async def test_async_signin_invalid(self):
+        """非同期サインインの失敗テスト"""
+        request = self.make_request(reverse('users:signin'), {
+            'username': 'test@example.com',
+            'password': 'wrongpassword'
+        })
+        response = await AsyncSigninView.as_view()(request)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context_data['form'].non_field_errors())
+        self.assertNotIn('_auth_user_id', request.session)
+
+    async def test_async_signin_failure_signal(self):
+        """非同期認証の失敗でパスワードを伏せたuser_login_failedが送られるかのテスト"""
+        handler = mock.Mock()
+        user_login_failed.connect(handler)
+        self.addCleanup(user_login_failed.disconnect, handler)
+
+        self.assertIsNone(await aauthenticate(
+            username='test@example.com', password='wrongpassword'))
+        self.assertEqual(handler.call_args.kwargs['credentials'], {
+            'username': 'test@example.com', 'password': '********************'})
+
+    async def test_async_password_reset(self):
+        """非同期パスワードリセットでメールが送信されるかのテスト"""
+        request = self.make_request(reverse('users:password_reset'), {
+            'email': 'test@example.com'
+        })
+        response = await AsyncResetPasswordView.as_view()(request)
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['test@example.com'])
+
+
+class CalibratedHasherTestCase(TestCase):
+    """ホスト別に調整されたパスワードハッシュのテスト"""
+
+    @override_settings(PASSWORD_HASHER_PARAMS={'pbkdf2_sha256': {'iterations': 1000}})
+    def test_params_from_profile(self):
+        """プロファイルの作業係数が使用されるかのテスト"""
+        self.assertTrue(make_password('testpassword123').startswith('pbkdf2_sha256$1000$'))
+
+    def test_upgrade_on_signin(self):
+        """サインイン時にハッシュが更新されるかのテスト"""
+        with self.settings(PASSWORD_HASHER_PARAMS={'pbkdf2_sha256': {'iterations': 1000}}):
+            user = User.objects.create_user(
+                email='test@example.com',
+                name='Test User',
+                password='testpassword123'
+            )
+        with self.settings(PASSWORD_HASHER_PARAMS={'pbkdf2_sha256': {'iterations': 2000}}):
+            authenticate(username='test@example.com', password='testpassword123')
+
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$2000$'))
+
+    def test_upgrade_algorithm_on_signin(self):
+        """優先アルゴリズム変更後のサインインでハッシュが移行されるかのテスト"""
+        user = User.objects.create_user(
+            email='test@example.com',
+            name='Test User',
+            password='testpassword123'
+        )
+        hashers = ['users.hashers.CalibratedScryptPasswordHasher',
+                   'users.hashers.CalibratedPBKDF2PasswordHasher']
+        with self.settings(PASSWORD_HASHERS=hashers):
+            authenticate(username='test@example.com', password='testpassword123')
+            user.refresh_from_db()
+
+            self.assertTrue(user.password.startswith('scrypt$'))
+            self.assertTrue(user.check_password('testpassword123'))
+
+    def test_calibrate_hashers_command(self):
+        """calibrate_hashersコマンドのテスト"""
+        stderr = StringIO()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            output = os.path.join(tmpdir, 'hasher_profile.json')
+            call_command('calibrate_hashers', target_ms=1, samples=1,
+                         algorithm='pbkdf2_sha256', output=output,
+                         stdout=StringIO(), stderr=stderr)
+            with open(output) as f:
+                profile = json.load(f)
+
+        self.assertEqual(profile['hashers'][0], 'users.hashers.CalibratedPBKDF2PasswordHasher')
+        self.assertIn('users.hashers.CalibratedScryptPasswordHasher', profile['hashers'])
+        # A budget too small for Django's defaults keeps them.
+        self.assertEqual(profile['params']['pbkdf2_sha256']['iterations'],
+                         PBKDF2PasswordHasher.iterations)
+        self.assertEqual(profile['params']['scrypt']['work_factor'],
+                         ScryptPasswordHasher.work_factor)
+        self.assertIn('pbkdf2_sha256: Django\'s default work factors take '
+                      'longer than the budget', stderr.getvalue())
+
+
+@override_settings(SIGNIN_THROTTLE={
+    'BACKEND': 'users.throttling.MemoryBackend',
+    'RATES': {'ip': (5, 300), 'email': (2, 300)},
+})
+class SigninThrottleTestCase(TestCase):
+    """サインイン試行回数制限のテスト"""
+
+    def setUp(self):
+        reset_signin_throttle(setting='SIGNIN_THROTTLE')
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            name='Test User',
+            password='testpassword123'
+        )
+
+    def signin(self, username, password):
+        return self.client.post(reverse('users:signin'), {
+            'username': username,
+            'password': password
+        })
+
+    def test_email_failures_throttled_before_hashing(self):
+        """失敗回数の上限を超えたメールアドレスがハッシュ計算前に拒否されるかのテスト"""
+        self.signin('test@example.com', 'wrongpassword')
+        self.signin('TEST@example.com', 'wrongpassword')
+        throttled = signin_attempts.get(outcome='throttled')
+
+        hasher = type(get_hasher())
+        with mock.patch.object(hasher, 'verify') as verify:
+            response = self.signin('test@example.com', 'testpassword123')
+
+        self.assertEqual(response.status_code, 429)
+        verify.assert_not_called()
+        self.assertNotIn('_auth_user_id', self.client.session)
+        self.assertEqual(signin_attempts.get(outcome='throttled'), throttled + 1)
+
+    def test_ip_attempts_throttled(self):
+        """IPアドレスごとの試行回数制限のテスト"""
+        for i in range(5):
+            self.signin('user%d@example.com' % i, 'wrongpassword')
+
+        response = self.signin('test@example.com', 'testpassword123')
+
+        self.assertEqual(response.status_code, 429)
+
+    def test_successful_signin_not_counted_as_failure(self):
+        """成功したサインインが失敗として数えられないかのテスト"""
+        verified = signin_attempts.get(outcome='verified')
+        for i in range(3):
+            response = self.signin('test@example.com', 'testpassword123')
+            self.assertEqual(response.status_code, 302)
+            self.client.logout()
+
+        self.assertEqual(signin_attempts.get(outcome='verified'), verified + 3)
+
+    def test_sliding_window(self):
+        """スライディングウィンドウのカウントと期限切れのテスト"""
+        for backend in (MemoryBackend(), CacheBackend()):
+            cache.clear()
+            for _ in range(4):
+                backend.incr('key', 100, 1050)
+
+            self.assertEqual(backend.get_counts('key', 100, 1050), (4, 0))
+            self.assertEqual(backend.get_counts('key', 100, 1150), (0, 4))
+            self.assertEqual(backend.get_counts('key', 100, 1250), (0, 0))
+
+        throttle = SigninThrottle(MemoryBackend(), {})
+        for _ in range(4):
+            throttle.backend.incr('key', 100, 1050)
+        self.assertEqual(throttle.estimate('key', 100, 1125), 3)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ImportUsersTestCase(TestCase):
+    """ユーザー一括インポートコマンドのテスト"""
+
+    def setUp(self):
+        User.objects.create_user(
+            email='existing@example.com', name='Existing', password='pass')
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def import_users(self, filename, content, *args):
+        path = os.path.join(self.tmpdir.name, filename)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        out = StringIO()
+        call_command('import_users', path, *args, stdout=out)
+        return out.getvalue()
+
+    def test_import_csv(self):
+        """CSVから正規化・重複排除してユーザーを作成できるかのテスト"""
+        out = self.import_users('users.csv', (
+            'email,name,password\n'
+            'Alice@Example.com,Alice,alicepass123\n'
+            'alice@example.COM,Alice Again,otherpass123\n'
+            'EXISTING@example.com,Existing,pass\n'
+            'bob@example.com,Bob,\n'
+            'not-an-email,Invalid,pass\n'
+            'carol@example.com,Carol,carolpass123\n'
+        ), '--batch-size', '2', '--workers', '2')
+
+        self.assertIn('6 rows read: 3 users created, 2 duplicates and '
+                      '1 invalid rows skipped', out)
+        self.assertEqual(User.objects.count(), 4)
+        alice = User.objects.get(email='alice@example.com')
+        self.assertEqual(alice.name, 'Alice')
+        self.assertTrue(alice.check_password('alicepass123'))
+        self.assertFalse(
+            User.objects.get(email='bob@example.com').has_usable_password())
+        self.assertTrue(
+            User.objects.get(email='carol@example.com').check_password(
+                'carolpass123'))
+
+    def test_import_jsonl_with_unusable_passwords(self):
+        """JSONLから使用不可パスワードでユーザーを作成できるかのテスト"""
+        self.import_users('users.jsonl', '\n'.join(json.dumps(row) for row in [
+            {'email': 'dave@example.com', 'name': 'Dave', 'password': 'x'},
+            {'email': 'erin@example.com', 'name': 'Erin'},
+        ]), '--unusable-passwords')
+
+        for email in ('dave@example.com', 'erin@example.com'):
+            self.assertFalse(
+                User.objects.get(email=email).has_usable_password())
+
+    def test_import_is_idempotent(self):
+        """同じファイルを再インポートしても重複が作成されないかのテスト"""
+        content = 'email,name\nfrank@example.com,Frank\n'
+        self.import_users('users.csv', content, '--workers', '1')
+        out = self.import_users('users.csv', content, '--workers', '1')
+
+        self.assertIn('0 users created, 1 duplicates', out)
+        self.assertEqual(
+            User.objects.filter(email='frank@example.com').count(), 1)
+
+    def test_conflicting_rows_not_counted(self):
+        """挿入時に競合して破棄された行が作成数に数えられないかのテスト"""
+        command = import_users.Command
+        hash_passwords = command.hash_passwords
+
+        def create_concurrently(self, users, executor):
+            User.objects.create_user(email='grace@example.com', name='Grace')
+            return hash_passwords(self, users, executor)
+
+        with mock.patch.object(
+                command, 'hash_passwords', create_concurrently):
+            out = self.import_users('users.csv', (
+                'email,name\n'
+                'grace@example.com,Grace\n'
+                'heidi@example.com,Heidi\n'
+            ), '--workers', '1')
+
+        self.assertIn('2 rows read: 1 users created, 1 duplicates', out)
+
+    def test_import_jsonl_non_object(self):
+        """オブジェクトでないJSONLの行が無効として数えられるかのテスト"""
+        out = self.import_users('users.jsonl', '\n'.join([
+            '["ivan@example.com", "Ivan"]',
+            '"judy@example.com"',
+            json.dumps({'email': 'judy@example.com', 'name': 'Judy'}),
+        ]), '--workers', '1')
+
+        self.assertIn('3 rows read: 1 users created, 0 duplicates and '
+                      '2 invalid rows skipped', out)
+
+
+class ExportUsersTestCase(TestCase):
+    """ユーザーエクスポートのテスト"""
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(
+            email='admin@example.com', name='Admin', password='adminpass123')
+        for n in range(4):
+            User.objects.create_user(
+                email='user%d@example.com' % n, name='User %d' % n,
+                password='testpass123')
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def test_export_csv_in_chunks(self):
+        """CSVがキーセットのチャンク単位で読み出されるかのテスト"""
+        path = os.path.join(self.tmpdir.name, 'users.csv')
+        # Chunks of 2, 2 and 1 users.
+        with self.assertNumQueries(3):
+            call_command('export_users', output=path, chunk_size=2)
+
+        with open(path, newline='') as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual([row['email'] for row in rows], [
+            'admin@example.com', 'user0@example.com', 'user1@example.com',
+            'user2@example.com', 'user3@example.com'])
+        self.assertEqual(rows[0]['is_admin'], 'True')
+        self.assertEqual(rows[1]['last_login'], '')
+
+    def test_export_gzipped_jsonl(self):
+        """gzip圧縮したJSONLでエクスポートできるかのテスト"""
+        path = os.path.join(self.tmpdir.name, 'users.jsonl.gz')
+        call_command('export_users', output=path)
+
+        with gzip.open(path, 'rt') as f:
+            rows = [json.loads(line) for line in f]
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(set(rows[0]), {
+            'email', 'name', 'is_active', 'is_admin', 'last_login'})
+        self.assertIs(rows[1]['is_active'], True)
+
+    def test_admin_export_action(self):
+        """管理画面のアクションで選択したユーザーをストリーミングでエクスポートできるかのテスト"""
+        self.client.force_login(self.admin)
+        selected = User.objects.filter(email__startswith='user').order_by('pk')
+        response = self.client.post(reverse('admin:users_user_changelist'), {
+            'action': 'export_csv',
+            '_selected_action': [user.pk for user in selected[:2]],
+        })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        content = b''.join(response.streaming_content).decode()
+        self.assertEqual(content.splitlines(), [
+            'email,name,is_active,is_admin,last_login',
+            'user0@example.com,User 0,True,False,',
+            'user1@example.com,User 1,True,False,',
+        ])
+
+
+class UserAdminChangelistTestCase(TestCase):
+    """管理画面のユーザー一覧のテスト"""
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(
+            email='admin@example.com', name='Admin', password='adminpass123')
+        for email in ('alice@example.org', 'albert@example.com',
+                      'bob@example.org'):
+            User.objects.create_user(email=email, name=email, password='pass')
+        self.client.force_login(self.admin)
+
+    def search(self, term):
+        response = self.client.get(
+            reverse('admin:users_user_changelist'), {'q': term})
+        self.assertEqual(response.status_code, 200)
+        return sorted(
+            user.email for user in response.context['cl'].result_list)
+
+    def test_prefix_search(self):
+        """メールアドレスの前方一致で大文字小文字を区別せず検索できるかのテスト"""
+        self.assertEqual(self.search('AL'),
+                         ['albert@example.com', 'alice@example.org'])
+        self.assertEqual(self.search('lice'), [])
+
+    def test_domain_search(self):
+        """@から始まる検索語でドメイン検索できるかのテスト"""
+        self.assertEqual(self.search('@Example.org'),
+                         ['alice@example.org', 'bob@example.org'])
+        self.assertEqual(self.search('@example.co'), [])
+
+    def test_estimated_count(self):
+        """上限を超える件数が全件COUNTせずに上限の次で打ち切られるかのテスト"""
+        # Gaps in the primary keys don't inflate the count.
+        User.objects.filter(email='bob@example.org').delete()
+        User.objects.create_user(
+            email='bob@example.org', name='Bob', password='testpassword123')
+        with mock.patch.object(EstimatedCountPaginator, 'exact_count_limit', 2):
+            for queryset in (User.objects.all(),
+                             User.objects.filter(is_admin=False)):
+                paginator = EstimatedCountPaginator(
+                    queryset.order_by('email'), 1)
+                with CaptureQueriesContext(connection) as queries:
+                    self.assertEqual(paginator.count, 3)
+                self.assertEqual(len(queries), 1)
+                self.assertIn('LIMIT 3', queries[0]['sql'])
+
+        paginator = EstimatedCountPaginator(User.objects.order_by('email'), 1)
+        self.assertEqual(paginator.count, 4)
+
+
+class BulkUserUpdateTestCase(SharedCacheMixin, TestCase):
+    """ユーザーの一括更新のテスト"""
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(
+            email='admin@example.com', name='Admin', password='adminpass123')
+        self.users = [
+            User.objects.create_user(
+                email='user%d@example.org' % n, name='User %d' % n,
+                password='testpass123')
+            for n in range(5)
+        ]
+        cache.clear()
+
+    def test_update_in_chunks(self):
+        """チャンクごとに1回のUPDATEで更新されるかのテスト"""
+        with CaptureQueriesContext(connection) as queries:
+            updated, done = update_users(
+                User.objects.filter(email__endswith='@example.org'),
+                {'is_active': False}, chunk_size=2)
+
+        self.assertEqual((updated, done), (5, True))
+        self.assertEqual(
+            len([q for q in queries if q['sql'].startswith('UPDATE')]), 3)
+        self.assertEqual(User.objects.filter(is_active=False).count(), 5)
+
+    def test_time_budget_resumes(self):
+        """時間制限で中断した更新を再実行で再開できるかのテスト"""
+        queryset = User.objects.filter(email__endswith='@example.org')
+        self.assertEqual(
+            update_users(queryset, {'is_admin': True}, chunk_size=2,
+                         time_budget=0),
+            (2, False))
+        self.assertEqual(
+            update_users(queryset, {'is_admin': True}, chunk_size=2),
+            (3, True))
+        self.assertEqual(User.objects.filter(is_admin=True).count(), 6)
+
+    def test_deactivation_ends_sessions(self):
+        """一括無効化で、キャッシュ済みのセッションも無効になるかのテスト"""
+        client = Client()
+        client.force_login(self.users[0])
+        url = reverse('users:profile', kwargs={'pk': self.users[0].pk})
+        response = client.get(url)
+        self.assertTrue(response.wsgi_request.user.is_authenticated)
+        self.assertIsNotNone(get_cached_user(self.users[0].pk))
+
+        update_users(User.objects.filter(pk=self.users[0].pk),
+                     {'is_active': False})
+
+        self.assertIsNone(get_cached_user(self.users[0].pk))
+        response = client.get(url)
+        self.assertFalse(response.wsgi_request.user.is_authenticated)
+
+    def test_deactivation_deletes_sessions(self):
+        """一括無効化で、無効化したユーザーのセッションが削除されるかのテスト"""
+        clients = [Client(), Client()]
+        for client, user in zip(clients, self.users):
+            client.force_login(user)
+
+        update_users(User.objects.filter(pk=self.users[0].pk),
+                     {'is_active': False})
+
+        self.assertEqual(
+            list(Session.objects.values_list('session_key', flat=True)),
+            [clients[1].session.session_key])
+
+    def test_deactivation_resumes_session_deletion(self):
+        """中断された無効化の再実行で、残ったセッションが削除されるかのテスト"""
+        for user in self.users[:2]:
+            Client().force_login(user)
+        queryset = User.objects.filter(pk__in=[u.pk for u in self.users[:2]])
+        update_users(queryset, {'is_active': False}, end_sessions=False)
+
+        self.assertEqual(update_users(queryset, {'is_active': False}),
+                         (0, True))
+        self.assertFalse(Session.objects.exists())
+
+    def test_session_deletion_deadline(self):
+        """期限を過ぎるとセッションの削除が途中で止まるかのテスト"""
+        for user in self.users[:3]:
+            Client().force_login(user)
+        pks = [user.pk for user in self.users[:3]]
+
+        self.assertEqual(delete_sessions(pks, batch_size=1, deadline=0),
+                         (1, False))
+        self.assertEqual(Session.objects.count(), 2)
+        self.assertEqual(delete_sessions(pks, batch_size=1), (2, True))
+
+    def test_set_user_flags_deactivate_deletes_sessions(self):
+        """コマンドでの無効化でも、対象ユーザーのセッションが一度にまとめて削除されるかのテスト"""
+        clients = [Client() for user in self.users[:3]]
+        for client, user in zip(clients, self.users):
+            client.force_login(user)
+        # Inactive, but not selected: its session is left alone.
+        User.objects.filter(pk=self.users[2].pk).update(is_active=False)
+        out = StringIO()
+        call_command('set_user_flags', '--deactivate', '--chunk-size', '1',
+                     '--email', 'user0@example.org',
+                     '--email', 'user1@example.org', stdout=out)
+
+        self.assertIn('2 sessions of inactive users deleted.', out.getvalue())
+        self.assertEqual(
+            list(Session.objects.values_list('session_key', flat=True)),
+            [clients[2].session.session_key])
+
+    def test_admin_action(self):
+        """管理画面のアクションで自分以外のユーザーを無効化できるかのテスト"""
+        self.client.force_login(self.admin)
+        response = self.client.post(reverse('admin:users_user_changelist'), {
+            'action': 'deactivate_users',
+            '_selected_action': [
+                user.pk for user in User.objects.all()],
+        }, follow=True)
+
+        self.assertContains(response, '5 users were updated.')
+        self.assertTrue(User.objects.get(pk=self.admin.pk).is_active)
+        # The admin's own session is kept.
+        self.assertEqual(Session.objects.count(), 1)
+        self.assertFalse(User.objects.filter(
+            email__endswith='@example.org', is_active=True).exists())
+
+    def test_set_user_flags_command(self):
+        """コマンドでメールアドレスやドメインを指定して更新できるかのテスト"""
+        out = StringIO()
+        call_command('set_user_flags', '--grant-admin',
+                     '--email', 'USER0@example.org', '--email', 'user1@example.org',
+                     stdout=out)
+        self.assertIn('2 users updated.', out.getvalue())
+
+        with tempfile.NamedTemporaryFile('w', suffix='.txt') as f:
+            f.write('user2@example.org\n\nuser3@example.org\n')
+            f.flush()
+            call_command('set_user_flags', '--deactivate',
+                         '--emails-from', f.name, stdout=out)
+        self.assertEqual(
+            sorted(User.objects.filter(is_active=False).values_list(
+                'email', flat=True)),
+            ['user2@example.org', 'user3@example.org'])
+
+        call_command('set_user_flags', '--activate', '--domain',
+                     'example.org', stdout=out)
+        self.assertFalse(User.objects.filter(is_active=False).exists())
+
+
+@override_settings(PASSWORD_RESET_COALESCE_WINDOW=300)
+class PasswordResetCoalescingTestCase(SharedCacheMixin, TestCase):
+    """パスワードリセット要求の集約のテスト"""
+
+    def setUp(self):
+        User.objects.create_user(
+            email='test@example.com', name='Test User',
+            password='testpassword123')
+        cache.clear()
+
+    def request_reset(self, email):
+        form = ResetPasswordForm({'email': email})
+        self.assertTrue(form.is_valid())
+        form.save(domain_override='testserver',
+                  email_template_name='password_reset_email.html')
+
+    def test_repeated_requests_send_one_email(self):
+        """同じメールアドレスへの繰り返しの要求で1通だけ送信されるかのテスト"""
+        sent = password_reset_requests.get(outcome='sent')
+        suppressed = password_reset_requests.get(outcome='suppressed')
+
+        self.request_reset('test@example.com')
+        # Suppressed before the user lookup.
+        with self.assertNumQueries(0):
+            self.request_reset('TEST@Example.com')
+        response = self.client.post(reverse('users:password_reset'), {
+            'email': 'test@example.com'})
+
+        self.assertRedirects(response, reverse('users:password_reset_done'))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(password_reset_requests.get(outcome='sent'), sent + 1)
+        self.assertEqual(
+            password_reset_requests.get(outcome='suppressed'), suppressed + 2)
+
+    @override_settings(PASSWORD_RESET_COALESCE_WINDOW=0)
+    def test_coalescing_disabled(self):
+        """集約の時間窓が0の場合は毎回送信されるかのテスト"""
+        self.request_reset('test@example.com')
+        self.request_reset('test@example.com')
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_check_process_local_cache(self):
+        """集約でプロセスごとのキャッシュがシステムチェックで拒否されるかのテスト"""
+        self.assertEqual(check_password_reset_cache(None), [])
+        with override_settings(CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            self.assertEqual(
+                [error.id for error in check_password_reset_cache(None)],
+                ['users.E002'])
+            with override_settings(PASSWORD_RESET_COALESCE_WINDOW=0):
+                self.assertEqual(check_password_reset_cache(None), [])
+
+
+class QueryBudgetTestCase(QueryBudgetMixin, TestCase):
+    """ルートごとのクエリ数の上限のテスト"""
+    namespaces = ('users', 'blog')
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='test@example.com', name='Test User',
+            password='testpassword123')
+
+    def get_query_budgets(self):
+        user = self.user
+        reset_kwargs = {
+            'uidb64': urlsafe_base64_encode(force_bytes(user.pk)),
+            'token': default_token_generator.make_token(user),
+        }
+        new_password = {
+            'new_password1': 'newtestpassword123',
+            'new_password2': 'newtestpassword123',
+        }
+        return [
+            QueryBudget('users:signin', 0),
+            QueryBudget('users:signin', 7, 'post', data={
+                'username': 'test@example.com',
+                'password': 'testpassword123'}),
+            QueryBudget('users:signup', 0),
+            QueryBudget('users:signup', 10, 'post', data={
+                'email': 'new@example.com', 'name': 'New User',
+                'password1': 'newtestpassword123',
+                'password2': 'newtestpassword123'}),
+            QueryBudget('users:welcome', 2, user=user),
+            QueryBudget('users:change_password', 2, user=user),
+            QueryBudget('users:change_password_done', 2, user=user),
+            QueryBudget('users:password_reset', 0),
+            QueryBudget('users:password_reset', 1, 'post', data={
+                'email': 'test@example.com'}),
+            QueryBudget('users:password_reset_done', 0),
+            QueryBudget('users:password_reset_confirm', 1,
+                        kwargs=reset_kwargs),
+            QueryBudget('users:password_reset_complete', 0),
+            # The session, the signed in user and the profile.
+            QueryBudget('users:profile', 3, kwargs={'pk': user.pk},
+                        user=user),
+            QueryBudget('users:profile', 5, 'post', kwargs={'pk': user.pk},
+                        data={'email': 'test@example.com', 'name': 'New'},
+                        user=user),
+            QueryBudget('blog:home', 2, user=user),
+            QueryBudget('users:signout', 4, 'post', user=user),
+            # Last, as the new password signs out the other sessions.
+            QueryBudget('users:change_password', 8, 'post', user=user,
+                        data={'old_password': 'testpassword123',
+                              **new_password}),
+        ]
+
+    def test_profile_fetched_once(self):
+        """プロフィールの取得が1回だけかのテスト"""
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse('users:profile', kwargs={'pk': self.user.pk}))
+
+        self.assertEqual(response.status_code, 200)
+        profile_queries = [
+            query for query in queries
+            if query['sql'].startswith('SELECT "users_user"')
+            and '"users_user"."id" = %d' % self.user.pk in query['sql']
+        ]
+        # Once as the signed in user, and once as the profile.
+        self.assertEqual(len(profile_queries), 2)
+
+    def test_unique_email_checked_once(self):
+        """メールアドレスの重複チェックが1回だけかのテスト"""
+        form = ProfileForm(
+            {'email': 'Test@Example.com', 'name': 'New'}, instance=self.user)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(form.is_valid())
+        self.assertEqual(len(queries), 1)
+
+        User.objects.create_user(
+            email='other@example.com', name='Other User',
+            password='otherpassword123')
+        form = SignupForm({
+            'email': 'OTHER@example.com', 'name': 'Other',
+            'password1': 'newtestpassword123',
+            'password2': 'newtestpassword123'})
+        self.assertFalse(form.is_valid())
+        self.assertIn('email', form.errors)
+
+
+class AuditLogTestCase(TestCase):
+    """認証の監査ログのテスト"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='test@example.com', name='Test User',
+            password='testpassword123')
+        cache.clear()
+        self.addCleanup(audit_log.events.clear)
+
+    def recorded(self):
+        audit_log.flush()
+        return list(AuditEvent.objects.order_by('pk').values_list(
+            'event', 'email'))
+
+    def test_signin_events(self):
+        """サインイン・失敗・サインアウトが記録されるかのテスト"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('users:signin'), {
+                'username': 'test@example.com', 'password': 'wrong'})
+            self.client.post(reverse('users:signin'), {
+                'username': 'test@example.com',
+                'password': 'testpassword123'},
+                HTTP_USER_AGENT='Browser')
+            self.client.post(reverse('users:signout'))
+
+        self.assertEqual(self.recorded(), [
+            ('signin_failed', 'test@example.com'),
+            ('signin', 'test@example.com'),
+            ('signout', 'test@example.com'),
+        ])
+        signin = AuditEvent.objects.get(event='signin')
+        self.assertEqual(signin.user, self.user)
+        self.assertEqual(signin.ip, '127.0.0.1')
+        self.assertEqual(signin.user_agent, 'Browser')
+
+    def test_password_events(self):
+        """パスワード変更とリセット要求が記録されるかのテスト"""
+        self.client.force_login(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('users:change_password'), {
+                'old_password': 'testpassword123',
+                'new_password1': 'newtestpassword123',
+                'new_password2': 'newtestpassword123'})
+            self.client.post(reverse('users:password_reset'), {
+                'email': 'Nobody@example.com'})
+
+        self.assertEqual(self.recorded(), [
+            ('password_change', 'test@example.com'),
+            ('password_reset_request', 'nobody@example.com'),
+        ])
+
+    def test_rolled_back_events_not_recorded(self):
+        """ロールバックされたトランザクション内のイベントは記録されないかのテスト"""
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(IntegrityError), transaction.atomic():
+                audit_log.record(AuditEvent.Event.SIGNIN, user=self.user)
+                raise IntegrityError
+
+        self.assertEqual(audit_log.events, [])
+
+    @override_settings(AUDIT_LOG_BATCH_SIZE=2)
+    def test_batched_writes(self):
+        """バッファがまとめて書き込まれるかのテスト"""
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(5):
+                audit_log.record(AuditEvent.Event.SIGNIN, user=self.user)
+        # Nothing is written per event.
+        self.assertEqual(AuditEvent.objects.count(), 0)
+
+        with self.assertNumQueries(3):
+            self.assertEqual(audit_log.flush(), 5)
+        self.assertEqual(AuditEvent.objects.count(), 5)
+
+    @override_settings(AUDIT_LOG_BATCH_SIZE=2, AUDIT_LOG_FLUSH_INTERVAL=60)
+    def test_flushed_after_request_when_due(self):
+        """リクエスト後にバッチサイズに達したら書き込まれるかのテスト"""
+        with self.captureOnCommitCallbacks(execute=True):
+            audit_log.record(AuditEvent.Event.SIGNIN, user=self.user)
+        self.client.get(reverse('users:signin'))
+        self.assertEqual(AuditEvent.objects.count(), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            audit_log.record(AuditEvent.Event.SIGNOUT, user=self.user)
+        self.client.get(reverse('users:signin'))
+        self.assertEqual(AuditEvent.objects.count(), 2)
+
+    @override_settings(AUDIT_LOG_BATCH_SIZE=1)
+    def test_failed_write_requeued(self):
+        """書き込みに失敗したイベントが次回に書き込まれるかのテスト"""
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(12):
+                audit_log.record(AuditEvent.Event.SIGNIN, user=self.user)
+
+        with mock.patch.object(
+                AuditEvent.objects, 'bulk_create',
+                side_effect=DatabaseError), \
+                self.assertLogs('users.audit', 'ERROR'):
+            self.assertEqual(audit_log.flush(), 0)
+        # Kept, up to ten batches.
+        self.assertEqual(len(audit_log.events), 10)
+        self.assertEqual(audit_log.flush(), 10)
+
+    def test_prune_audit_log(self):
+        """保持期間を過ぎたイベントが削除されるかのテスト"""
+        now = timezone.now()
+        AuditEvent.objects.bulk_create([
+            AuditEvent(event='signin', created=now - datetime.timedelta(
+                days=days)) for days in (400, 380, 370, 10)
+        ])
+
+        out = StringIO()
+        call_command('prune_audit_log', days=365, chunk_size=2, stdout=out)
+
+        self.assertIn('3 audit events older than 365 days deleted.',
+                      out.getvalue())
+        self.assertEqual(AuditEvent.objects.count(), 1)
+
+
+class UserShardingTestCase(SimpleTestCase):
+    """ユーザーのシャーディングのテスト"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.shard_map = os.path.join(directory.name, 'user_shards.json')
+
+    def sharded(self, *shards):
+        return override_settings(
+            USER_SHARDS=list(shards), USER_SHARD_MAP=self.shard_map)
+
+    def test_virtual_shard(self):
+        """仮想シャードがメールアドレスから決まりIDに埋め込まれるかのテスト"""
+        shard = virtual_shard_for_email('test@example.com')
+        self.assertEqual(virtual_shard_for_email('Test@Example.com '), shard)
+        self.assertIn(shard, range(VIRTUAL_SHARDS))
+        ids = [make_user_id('test@example.com') for _ in range(100)]
+        self.assertEqual(len(set(ids)), 100)
+        for pk in ids:
+            self.assertEqual(virtual_shard_for_pk(pk), shard)
+
+    def test_plan_shard_map(self):
+        """シャードの追加・削除で最小限の仮想シャードだけが移動するかのテスト"""
+        def owners(shard_map):
+            return {alias: shard_map.count(alias) for alias in set(shard_map)}
+
+        one = default_shard_map(['shard1'])
+        two = plan_shard_map(one, ['shard1', 'shard2'])
+        self.assertEqual(owners(two), {'shard1': 512, 'shard2': 512})
+
+        three = plan_shard_map(two, ['shard1', 'shard2', 'shard3'])
+        self.assertEqual(sorted(owners(three).values()), [341, 341, 342])
+        self.assertEqual(sum(a != b for a, b in zip(two, three)), 341)
+        for before, after in zip(two, three):
+            self.assertIn(after, (before, 'shard3'))
+
+        removed = plan_shard_map(three, ['shard1', 'shard3'])
+        self.assertEqual(owners(removed), {'shard1': 512, 'shard3': 512})
+        for before, after in zip(three, removed):
+            if before != 'shard2':
+                self.assertEqual(after, before)
+
+    def test_routing(self):
+        """メールアドレスとIDで同じシャードが選ばれるかのテスト"""
+        with self.sharded('shard1', 'shard2'):
+            shard = shard_for_email('test@example.com')
+            user = User(email='test@example.com')
+            self.assertEqual(router.db_for_write(User, instance=user), shard)
+            self.assertEqual(
+                User.objects.filter_by_email('TEST@example.com').db, shard)
+            pk = make_user_id('test@example.com')
+            self.assertEqual(User.objects.for_pk(pk).db, shard)
+            user.pk = pk
+            self.assertEqual(router.db_for_read(User, instance=user), shard)
+            self.assertEqual(User.objects.db_manager('default').for_pk(pk).db,
+                             'default')
+
+        with self.sharded():
+            self.assertEqual(User.objects.filter_by_email(
+                'test@example.com').db, 'default')
+
+    def test_shard_map_file(self):
+        """シャードマップがファイルから読まれるかのテスト"""
+        with self.sharded('shard1', 'shard2'):
+            save_shard_map(['shard2'] * VIRTUAL_SHARDS)
+            self.assertEqual(shard_for_email('test@example.com'), 'shard2')
+
+
+@override_settings(USER_SHARDS=['test_shard1', 'test_shard2'])
+class ShardedUserTestCase(TransactionTestCase):
+    """複数のSQLiteデータベースにシャーディングしたユーザーのテスト"""
+
+    databases = {'default', 'test_shard1', 'test_shard2'}
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(
+            USER_SHARD_MAP=os.path.join(directory.name, 'user_shards.json'))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        # Write the buffered audit events before the tables are flushed.
+        self.addCleanup(audit_log.flush)
+
+    def shards_of(self, email):
+        return [alias for alias in settings.USER_SHARDS
+                if User.objects.using(alias).filter(email=email).exists()]
+
+    def test_auth_flows(self):
+        """サインアップ、サインイン、プロフィール、パスワードリセットのテスト"""
+        client = Client()
+        response = client.post(reverse('users:signup'), {
+            'email': 'test@example.com', 'name': 'Test User',
+            'password1': 'complexpass123', 'password2': 'complexpass123'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.shards_of('test@example.com'),
+                         [shard_for_email('test@example.com')])
+        user = User.objects.get_by_email('test@example.com')
+
+        client.post(reverse('users:signout'))
+        client.post(reverse('users:signin'), {
+            'username': 'test@example.com', 'password': 'complexpass123'})
+        profile_url = reverse('users:profile', kwargs={'pk': user.pk})
+        response = client.get(profile_url)
+        self.assertContains(response, 'Test User')
+        client.post(profile_url, {
+            'email': 'test@example.com', 'name': 'New Name'})
+        self.assertEqual(
+            User.objects.for_pk(user.pk).get(pk=user.pk).name, 'New Name')
+
+        client.post(reverse('users:password_reset'),
+                    {'email': 'test@example.com'})
+        self.assertEqual(len(mail.outbox), 1)
+        # The token hashes the last_login of the sign-in above.
+        user = User.objects.get_by_email('test@example.com')
+        response = client.get(reverse('users:password_reset_confirm', kwargs={
+            'uidb64': urlsafe_base64_encode(force_bytes(user.pk)),
+            'token': default_token_generator.make_token(user)}))
+        self.assertEqual(response.status_code, 302)
+
+    def test_email_change_across_shards(self):
+        """別の仮想シャードのメールアドレスへの変更でユーザーが新しいIDに移動されるかのテスト"""
+        user = User.objects.create_user(
+            email='test@example.com', name='Test User', password='testpass123')
+        shard = virtual_shard_for_email('test@example.com')
+        other = next(
+            email for email in ('other%d@example.com' % n for n in range(10))
+            if virtual_shard_for_email(email) != shard)
+        audit_log.record(AuditEvent.Event.SIGNIN, user=user)
+        audit_log.flush()
+        self.client.force_login(user)
+
+        response = self.client.post(
+            reverse('users:profile', kwargs={'pk': user.pk}),
+            {'email': other, 'name': 'Test User'})
+        moved = User.objects.get_by_email(other)
+        self.assertNotEqual(moved.pk, user.pk)
+        self.assertEqual(virtual_shard_for_pk(moved.pk),
+                         virtual_shard_for_email(other))
+        self.assertRedirects(
+            response, reverse('users:profile', kwargs={'pk': moved.pk}))
+        self.assertEqual(self.shards_of('test@example.com'), [])
+        self.assertEqual(self.shards_of(other), [shard_for_email(other)])
+        self.assertTrue(moved.check_password('testpass123'))
+        self.assertEqual(
+            list(AuditEvent.objects.values_list('user_id', flat=True)),
+            [moved.pk])
+        # Still signed in, under the new id.
+        response = self.client.get(
+            reverse('users:profile', kwargs={'pk': moved.pk}))
+        self.assertContains(response, other)
+
+    def test_admin_change(self):
+        """シャーディングされた管理者が管理画面でユーザーを変更・削除できるかのテスト"""
+        admin_user = User.objects.create_superuser(
+            email='admin@example.com', name='Admin', password='adminpass123')
+        user = User.objects.create_user(
+            email='test@example.com', name='Test User', password='testpass123')
+        self.client.force_login(admin_user)
+
+        response = self.client.post(
+            reverse('admin:users_user_change', args=[user.pk]),
+            {'email': 'test@example.com', 'name': 'New Name'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            User.objects.for_pk(user.pk).get(pk=user.pk).name, 'New Name')
+
+        response = self.client.post(
+            reverse('admin:users_user_delete', args=[user.pk]),
+            {'post': 'yes'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.shards_of('test@example.com'), [])
+        self.assertEqual(
+            list(LogEntry.objects.using(shard_for_pk(admin_user.pk))
+                 .order_by('pk').values_list('action_flag', flat=True)),
+            [CHANGE, DELETION])
+
+        # The log entries follow an admin moved to another shard.
+        admin_user.email = next(
+            email for email in ('admin%d@example.com' % n for n in range(10))
+            if shard_for_pk(admin_user.pk) != shard_for_email(email))
+        admin_user.save()
+        self.assertEqual(
+            list(LogEntry.objects.using(shard_for_pk(admin_user.pk))
+                 .values_list('user_id', flat=True)),
+            [admin_user.pk, admin_user.pk])
+        self.assertEqual(self.shards_of('admin@example.com'), [])
+
+    def test_bulk_commands(self):
+        """インポート、一括更新、エクスポートのコマンドが全シャードで動くかのテスト"""
+        emails = ['user%d@example.org' % n for n in range(20)]
+        self.assertEqual(
+            len({shard_for_email(email) for email in emails}), 2)
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl') as f:
+            f.write(''.join(json.dumps({'email': email, 'name': 'User'}) + '\n'
+                            for email in emails))
+            f.flush()
+            for created in (20, 0):
+                out = StringIO()
+                call_command('import_users', f.name, workers=1,
+                             unusable_passwords=True, stdout=out)
+                self.assertIn('%d users created, %d duplicates'
+                              % (created, 20 - created), out.getvalue())
+        for email in emails:
+            self.assertEqual(self.shards_of(email), [shard_for_email(email)])
+            user = User.objects.get_by_email(email)
+            self.assertEqual(virtual_shard_for_pk(user.pk),
+                             virtual_shard_for_email(email))
+
+        out = StringIO()
+        call_command('set_user_flags', '--grant-admin', '--domain',
+                     'example.org', stdout=out)
+        self.assertIn('20 users updated.', out.getvalue())
+        out = StringIO()
+        call_command('set_user_flags', '--deactivate', '--email', emails[0],
+                     '--email', emails[1], stdout=out)
+        self.assertIn('2 users updated.', out.getvalue())
+        self.assertEqual(sum(
+            User.objects.using(alias).filter(is_admin=True).count()
+            for alias in settings.USER_SHARDS), 20)
+        self.assertFalse(User.objects.get_by_email(emails[0]).is_active)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'users.jsonl')
+            call_command('export_users', output=path)
+            with open(path) as f:
+                exported = [json.loads(line)['email'] for line in f]
+        self.assertEqual(sorted(exported), sorted(emails))
+
+        with self.assertRaises(ValueError):
+            update_users(User.objects.all(), {'is_admin': False})
+
+    def test_admin_changelist(self):
+        """管理画面の一覧、検索、アクションがシャードごとに動くかのテスト"""
+        admin_user = User.objects.create_superuser(
+            email='admin@example.com', name='Admin', password='adminpass123')
+        emails = ['user%d@example.org' % n for n in range(10)]
+        for email in emails:
+            User.objects.create_user(email=email, name='User')
+        self.client.force_login(admin_user)
+        url = reverse('admin:users_user_changelist')
+
+        for alias in settings.USER_SHARDS:
+            on_shard = sorted(
+                email for email in emails if shard_for_email(email) == alias)
+            response = self.client.get(url, {'shard': alias, 'q': 'user'})
+            self.assertEqual(
+                [user.email for user in response.context['cl'].result_list],
+                on_shard)
+            response = self.client.post(
+                '%s?shard=%s' % (url, alias), {
+                    'action': 'deactivate_users',
+                    '_selected_action': [
+                        User.objects.get_by_email(email).pk
+                        for email in on_shard]}, follow=True)
+            self.assertContains(
+                response, '%d users were updated.' % len(on_shard))
+        self.assertFalse(any(
+            User.objects.get_by_email(email).is_active for email in emails))
+        # The first shard is listed by default.
+        self.assertEqual(
+            self.client.get(url).context['cl'].queryset.db,
+            settings.USER_SHARDS[0])
+
+    def test_rebalance(self):
+        """シャードを追加した後にユーザーが移動され元のシャードから削除されるかのテスト"""
+        first, *others = settings.USER_SHARDS
+        emails = ['user%d@example.com' % n for n in range(50)]
+        with override_settings(USER_SHARDS=[first]):
+            call_command('rebalance_user_shards', stdout=StringIO())
+            for email in emails:
+                User.objects.create_user(email=email, name='User')
+        self.assertEqual(User.objects.using(first).count(), 50)
+
+        out = StringIO()
+        call_command('rebalance_user_shards', stdout=out)
+        self.assertIn('Shard map written', out.getvalue())
+        for email in emails:
+            user = User.objects.get_by_email(email)
+            self.assertEqual(User.objects.for_pk(user.pk).get(pk=user.pk),
+                             user)
+        self.assertEqual(User.objects.using(first).count(), 50)
+
+        call_command('rebalance_user_shards', cleanup=True, stdout=out)
+        for email in emails:
+            self.assertEqual(self.shards_of(email), [shard_for_email(email)])
+        self.assertEqual(sum(
+            User.objects.using(alias).count()
+            for alias in settings.USER_SHARDS), 50)
+
+    def test_rebalance_catch_up(self):
+        """コピーの後に元のシャードで作成・変更されたユーザーが削除前に追いつくかのテスト"""
+        first, *others = settings.USER_SHARDS
+        emails = ['user%d@example.com' % n for n in range(20)]
+        with override_settings(USER_SHARDS=[first]):
+            call_command('rebalance_user_shards', stdout=StringIO())
+            for email in emails:
+                User.objects.create_user(email=email, name='User')
+        call_command('rebalance_user_shards', stdout=StringIO())
+
+        # Writes of workers still using the old map.
+        changed = next(
+            email for email in emails if shard_for_email(email) != first)
+        new = next(
+            email for email in ('new%d@example.com' % n for n in range(20))
+            if shard_for_email(email) != first)
+        User.objects.using(first).filter(email=changed).update(name='Changed')
+        User(email=new, name='New', pk=make_user_id(new)).save(
+            using=first, force_insert=True)
+
+        with self.assertRaisesMessage(CommandError, '2 users on %s' % first):
+            call_command('rebalance_user_shards', cleanup=True,
+                         stdout=StringIO())
+        self.assertEqual(User.objects.using(first).count(), 21)
+
+        call_command('rebalance_user_shards', cleanup=True, catch_up=True,
+                     stdout=StringIO())
+        self.assertEqual(User.objects.get_by_email(changed).name, 'Changed')
+        self.assertEqual(User.objects.get_by_email(new).name, 'New')
+        for email in emails + [new]:
+            self.assertEqual(self.shards_of(email), [shard_for_email(email)])
+
+    def test_rebalance_without_map(self):
+        """シャードマップなしでUSER_SHARDSが変わった場合に実行が拒否されるかのテスト"""
+        first = settings.USER_SHARDS[0]
+        with override_settings(USER_SHARDS=[first]):
+            for n in range(10):
+                User.objects.create_user(
+                    email='user%d@example.com' % n, name='User')
+        for cleanup in (False, True):
+            with self.assertRaisesMessage(CommandError, 'No shard map'):
+                call_command('rebalance_user_shards', cleanup=cleanup,
+                             stdout=StringIO())
+        self.assertFalse(os.path.exists(settings.USER_SHARD_MAP))
+        self.assertEqual(User.objects.using(first).count(), 10)
+
+
+@override_settings(LAST_LOGIN_UPDATES='deferred')
+class DeferredLastLoginTestCase(SharedCacheMixin, TestCase):
+    """last_loginの遅延書き込みのテスト"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email='test@example.com', name='Test User',
+            password='testpassword123')
+        self.addCleanup(last_logins.pending.clear)
+
+    def signin(self, client=None):
+        (client or self.client).post(reverse('users:signin'), {
+            'username': 'test@example.com', 'password': 'testpassword123'})
+
+    def last_login(self):
+        return User.objects.get(pk=self.user.pk).last_login
+
+    @override_settings(LAST_LOGIN_UPDATES='immediate')
+    def test_immediate(self):
+        """即時モードではサインイン時にlast_loginが保存されるかのテスト"""
+        self.signin()
+        self.assertIsNotNone(self.last_login())
+        self.assertEqual(last_logins.pending, {})
+
+    def test_deferred(self):
+        """サインインがまとめて1回のUPDATEで書き込まれるかのテスト"""
+        other = User.objects.create_user(
+            email='other@example.com', name='Other User',
+            password='testpassword123')
+        self.signin()
+        Client().post(reverse('users:signin'), {
+            'username': 'other@example.com', 'password': 'testpassword123'})
+        self.assertIsNone(self.last_login())
+        self.assertEqual(set(last_logins.pending), {self.user.pk, other.pk})
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(last_logins.flush(), 2)
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(self.last_login(), get_last_login(self.user))
+        self.assertIsNotNone(User.objects.get(pk=other.pk).last_login)
+        self.assertEqual(last_logins.pending, {})
+
+    def test_flush_keeps_later_last_login(self):
+        """他のプロセスが書いた新しいlast_loginを古い値で上書きしないかのテスト"""
+        self.signin()
+        later = timezone.now() + datetime.timedelta(minutes=1)
+        User.objects.filter(pk=self.user.pk).update(last_login=later)
+        last_logins.flush()
+        self.assertEqual(self.last_login(), later)
+
+    def test_flush_when_due(self):
+        """間隔が過ぎるとリクエストの後に書き込まれるかのテスト"""
+        self.signin()
+        self.client.get(reverse('users:signin'))
+        self.assertIsNone(self.last_login())
+        with override_settings(LAST_LOGIN_FLUSH_INTERVAL=0):
+            self.client.get(reverse('users:signin'))
+        self.assertIsNotNone(self.last_login())
+
+    def test_failed_flush_is_requeued(self):
+        """書き込みに失敗したサインインが次回に持ち越されるかのテスト"""
+        self.signin()
+        with mock.patch.object(
+                type(last_logins), 'update', side_effect=DatabaseError), \
+                self.assertLogs('users.last_login', 'ERROR'):
+            self.assertEqual(last_logins.flush(), 0)
+        self.assertEqual(set(last_logins.pending), {self.user.pk})
+        self.assertEqual(last_logins.flush(), 1)
+
+    def test_reset_token(self):
+        """保留中のサインインでリセットトークンが無効になり書き込み後も有効かのテスト"""
+        tokens = LastLoginTokenGenerator()
+        token_before = tokens.make_token(self.user)
+        self.signin()
+        user = User.objects.get(pk=self.user.pk)
+        self.assertFalse(tokens.check_token(
+            user, token_before))
+
+        token = tokens.make_token(user)
+        last_logins.flush()
+        user = User.objects.get(pk=self.user.pk)
+        self.assertTrue(tokens.check_token(user, token))
+
+        url = reverse('users:password_reset_confirm', kwargs={
+            'uidb64': urlsafe_base64_encode(force_bytes(user.pk)),
+            'token': token})
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+    def test_check_process_local_cache(self):
+        """遅延モードでプロセスごとのキャッシュがシステムチェックで拒否されるかのテスト"""
+        self.assertEqual(check_last_login_cache(None), [])
+        with override_settings(CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            self.assertEqual(
+                [error.id for error in check_last_login_cache(None)],
+                ['users.E001'])
+            with override_settings(LAST_LOGIN_UPDATES='immediate'):
+                self.assertEqual(check_last_login_cache(None), [])
+
+
+class SweepStaleUsersTestCase(SharedCacheMixin, TestCase):
+    """長期間サインインしていないユーザーの一括処理のテスト"""
+
+    def setUp(self):
+        cache.clear()
+        now = timezone.now()
+        self.stale = [
+            self.create_user('stale%d@example.com' % n,
+                             now - datetime.timedelta(days=400))
+            for n in range(3)]
+        self.recent = self.create_user(
+            'recent@example.com', now - datetime.timedelta(days=7))
+        self.never = self.create_user('never@example.com', None)
+        self.sessions = {user.pk: self.create_session(user)
+                         for user in (self.stale[0], self.recent)}
+
+    def create_user(self, email, last_login):
+        user = User.objects.create_user(
+            email=email, name='Test User', password='testpass123')
+        User.objects.filter(pk=user.pk).update(last_login=last_login)
+        return user
+
+    def create_session(self, user):
+        session = SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session.create()
+        return session.session_key
+
+    def sweep(self, **options):
+        out = StringIO()
+        call_command('sweep_stale_users', pause=0, stdout=out, **options)
+        return out.getvalue()
+
+    def active(self):
+        return set(User.objects.filter(is_active=True).values_list(
+            'email', flat=True))
+
+    def test_dry_run(self):
+        """ドライランでは報告だけで何も変更しないかのテスト"""
+        out = self.sweep(dry_run=True)
+        self.assertIn('3 users would be deactivated on default.', out)
+        self.assertIn('0 sessions of inactive or deleted users would be '
+                      'deleted.', out)
+        self.assertEqual(len(self.active()), 5)
+
+    def test_deactivate(self):
+        """古いユーザーがバッチ単位で無効化されセッションが削除されるかのテスト"""
+        with CaptureQueriesContext(connection) as queries:
+            out = self.sweep(batch_size=2)
+        self.assertIn('3 users deactivated on default.', out)
+        self.assertIn('1 sessions of inactive or deleted users deleted.', out)
+        self.assertEqual(self.active(),
+                         {'recent@example.com', 'never@example.com'})
+        self.assertEqual(len([
+            q for q in queries if q['sql'].startswith('UPDATE')]), 2)
+        self.assertEqual(
+            list(Session.objects.values_list('session_key', flat=True)),
+            [self.sessions[self.recent.pk]])
+
+    def test_delete_never_signed_in(self):
+        """サインインしたことのないユーザーも含めて削除されるかのテスト"""
+        out = self.sweep(delete=True, include_never_signed_in=True)
+        self.assertIn('4 users deleted on default.', out)
+        self.assertEqual(
+            list(User.objects.values_list('email', flat=True)),
+            ['recent@example.com'])
+        self.assertEqual(Session.objects.count(), 1)
+
+    def test_resume_from_checkpoint(self):
+        """チェックポイントの続きから再開し完了後に削除されるかのテスト"""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        checkpoint = os.path.join(directory.name, 'sweep.json')
+        with open(checkpoint, 'w') as f:
+            json.dump({'action': 'deactivate',
+                       'last_pk': {'default': self.stale[0].pk}}, f)
+
+        out = self.sweep(checkpoint=checkpoint)
+        self.assertIn('Resuming from', out)
+        self.assertIn('2 users deactivated on default.', out)
+        self.assertIn('stale0@example.com', self.active())
+        self.assertFalse(os.path.exists(checkpoint))
+
+    @override_settings(LAST_LOGIN_UPDATES='deferred')
+    def test_deferred_sign_in(self):
+        """書き込み前のサインインがあるユーザーは無効化されないかのテスト"""
+        self.addCleanup(last_logins.pending.clear)
+        last_logins.record(self.stale[1])
+        out = self.sweep()
+        self.assertIn('2 users deactivated on default.', out)
+        self.assertIn('stale1@example.com', self.active())
+
+# The users pages as they were before render_form, for PageHTMLTestCase.
+BASELINE_TEMPLATES = {
+    'signin.html': """\
+{% extends 'user_base.html' %}
+{% load form_helpers %}
+{% load i18n %}
+
+{% block index %}{% trans "Sign in" %}{% endblock %}
+
+{% block detail %}
+{% render_errors form %}
+
+<form action="{% url 'users:signin' %}" method="post">
+    {% csrf_token %}
+    {% render_field form.username %}
+    {% render_field form.password %}
+    <div class="text-right" style="margin-bottom: 15px;">
+        <a href="{% url 'users:password_reset' %}" style="font-size: 12px;">{% trans 'forget password?' %}</a>
+    </div>
+    {% trans 'Sign in' as signin %}
+    {% render_submit_button signin %}
+    <div class="text-center" style="margin-top: 15px;">
+        <a href="{% url 'users:signup' %}" style="font-size: 15pt;">{% trans 'Create an account' %}</a>
+    </div>
+</form>
+{% endblock %}
+""",
+    'signup.html': """\
+{% extends 'user_base.html' %}
+{% load form_helpers %}
+{% load i18n %}
+
+{% block index %}{% trans 'Sign up' %}{% endblock %}
+
+{% block detail %}
+{% render_errors form %}
+
+<form action="{% url 'users:signup' %}" method="post">
+    {% csrf_token %}
+    {% render_field form.email %}
+    {% render_field form.name %}
+    {% render_field form.password1 %}
+    {% render_field form.password2 %}
+    {% trans 'Sign up' as signup %}
+    {% render_submit_button signup %}
+</form>
+{% endblock %}
+""",
+    'profile.html': """\
+{% extends 'user_base.html' %}
+{% load form_helpers %}
+{% load i18n %}
+
+{% block index %}{% trans "Profile" %}{% endblock %}
+
+{% block detail %}
+{% render_messages %}
+{% render_errors form %}
+
+<form action="{% url 'users:profile' user.id %}" method="post">
+    {% csrf_token %}
+    {% render_field form.email %}
+    {% render_field form.name %}
+    {% trans 'Save changes' as save_changes %}
+    {% render_submit_button save_changes %}
+</form>
+{% endblock %}
+""",
+    'password_change.html': """\
+{% extends 'user_base.html' %}
+{% load form_helpers %}
+{% load i18n %}
+
+{% block index %}{% trans "Password Change" %}{% endblock %}
+
+{% block detail %}
+{% render_errors form %}
+
+<form action="{% url 'users:change_password' %}" method="post">
+    {% csrf_token %}
+    {% render_field form.old_password %}
+    {% render_field form.new_password1 %}
+    {% render_field form.new_password2 %}
+    {% trans 'Change' as change %}
+    {% render_submit_button change %}
+</form>
+{% endblock %}
+""",
+    'password_reset_form.html': """\
+{% extends 'user_base.html' %}
+{% load form_helpers %}
+{% load i18n %}
+
+{% block index %}{% trans 'Password reset' %}{% endblock %}
+
+{% block detail %}
+<p>{% trans 'Forgotten your password?' %}<br>{% trans "Enter your email address below, and we'll email instructions for setting a new one." %}</p>
+
+{% render_errors form %}
+
+<form action="{% url 'users:password_reset' %}" method="post">
+    {% csrf_token %}
+    {% render_field form.email %}
+    {% trans 'Send mail' as sendmail %}
+    {% render_submit_button sendmail %}
+</form>
+{% endblock %}
+""",
+    'password_reset_confirm.html': """\
+{% extends 'user_base.html' %}
+{% load form_helpers %}
+{% load i18n %}
+
+{% block index %}{% trans "Password reset" %}{% endblock %}
+
+{% block detail %}
+    {% render_errors form %}
+
+    {% if validlink %}
+    <form novalidate method="post">
+        {% csrf_token %}
+        {% render_field form.new_password1 %}
+        {% render_field form.new_password2 %}
+        {% trans 'Reset' as reset %}
+        {% render_submit_button reset %}
+    </form>
+    {% else %}
+    <div class="alert alert-danger" role="alert">
+        {% trans "It appears you clicked on an invalid password reset link. Please try again." %}
+    </div>
+    <div class="d-grid gap-2 col-8 mx-auto">
+        <a class="btn btn-info btn-lg btn-block" href="{% url 'users:signin' %}">{% trans "Sign in" %}</a>
+    </div>
+    {% endif %}
+{% endblock %}
+""",
+}
+
+class PageHTMLTestCase(TestCase):
+    """render_formで描画したページのHTMLが以前と1バイトも変わらないかのテスト"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='test@example.com', name='Test User',
+            password='testpass123')
+
+    def fetch(self, client, method, url, data=None):
+        content = getattr(client, method)(url, data).content.decode()
+        # The masked CSRF token changes on every response.
+        return re.sub(r'name="csrfmiddlewaretoken" value="\w+"', '', content)
+
+    def assertSameHTML(self, client, method, url, data=None):
+        templates = copy.deepcopy(settings.TEMPLATES)
+        templates[0]['OPTIONS']['loaders'].insert(
+            0, ('django.template.loaders.locmem.Loader', BASELINE_TEMPLATES))
+        with override_settings(TEMPLATES=templates):
+            baseline = self.fetch(client, method, url, data)
+        self.assertEqual(self.fetch(client, method, url, data), baseline)
+
+    def test_anonymous_pages(self):
+        """サインイン、サインアップ、パスワードリセットのページのテスト"""
+        for url, data in (
+                (reverse('users:signin'),
+                 {'username': 'test@example.com', 'password': 'wrong'}),
+                (reverse('users:signup'),
+                 {'email': 'test@example.com', 'password1': 'a'}),
+                (reverse('users:password_reset'), {'email': 'invalid'})):
+            with self.subTest(url=url):
+                self.assertSameHTML(Client(), 'get', url)
+                self.assertSameHTML(Client(), 'post', url, data)
+
+    def test_password_reset_confirm(self):
+        """パスワード再設定ページのテスト"""
+        response = self.client.get(
+            reverse('users:password_reset_confirm', kwargs={
+                'uidb64': urlsafe_base64_encode(force_bytes(self.user.pk)),
+                'token': default_token_generator.make_token(self.user)}))
+        self.assertSameHTML(self.client, 'get', response.url)
+        self.assertSameHTML(self.client, 'post', response.url, {
+            'new_password1': 'a', 'new_password2': 'b'})
+        self.assertSameHTML(self.client, 'get', reverse(
+            'users:password_reset_confirm',
+            kwargs={'uidb64': 'invalid', 'token': 'invalid'}))
+
+    def test_signed_in_pages(self):
+        """プロフィール、パスワード変更のページのテスト"""
+        self.client.force_login(self.user)
+        for url, data in (
+                (reverse('users:profile', kwargs={'pk': self.user.pk}),
+                 {'email': 'invalid', 'name': ''}),
+                (reverse('users:change_password'),
+                 {'old_password': 'wrong'})):
+            with self.subTest(url=url):
+                self.assertSameHTML(self.client, 'get', url)
+                self.assertSameHTML(self.client, 'post', url, data)
+
+
 # テストの実行方法：
 # python manage.py test users
 # または特定のテストクラスのみ：
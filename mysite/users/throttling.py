@@ -0,0 +1,164 @@
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from utilities.metrics import Counter
+
+
+signin_attempts = Counter(
+    'users_signin_attempts_total',
+    'Sign-in attempts, by whether they were throttled before hashing or '
+    'went on to password verification.',
+    labelnames=('outcome',),
+)
+
+
+class MemoryBackend:
+    """
+    Sliding-window counters held in process memory. Each key keeps three
+    integers: the index of the current fixed window and the counts of the
+    current and previous windows. Keys idle for two windows are dropped.
+    """
+    prune_every = 1000
+
+    def __init__(self):
+        self._counters = {}
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def _roll(self, counter, index):
+        if counter[0] == index:
+            return counter
+        if counter[0] == index - 1:
+            return [index, 0, counter[1]]
+        return [index, 0, 0]
+
+    def get_counts(self, key, window, now):
+        index = int(now // window)
+        counter = self._counters.get(key)
+        if counter is None:
+            return 0, 0
+        _, current, previous = self._roll(counter, index)
+        return current, previous
+
+    def incr(self, key, window, now):
+        index = int(now // window)
+        with self._lock:
+            counter = self._roll(self._counters.get(key, [index, 0, 0]), index)
+            counter[1] += 1
+            self._counters[key] = counter
+            self._writes += 1
+            if self._writes % self.prune_every == 0:
+                self._prune(window, index)
+
+    def _prune(self, window, index):
+        self._counters = {
+            key: counter for key, counter in self._counters.items()
+            if counter[0] >= index - 1
+        }
+
+
+class CacheBackend:
+    """
+    Sliding-window counters in a Django cache, shared by every worker using
+    it. Each fixed window is one integer key, expiring after two windows.
+    """
+
+    def __init__(self, alias='default'):
+        self.cache = caches[alias]
+
+    def get_counts(self, key, window, now):
+        index = int(now // window)
+        current_key = '%s:%d' % (key, index)
+        previous_key = '%s:%d' % (key, index - 1)
+        counts = self.cache.get_many([current_key, previous_key])
+        return counts.get(current_key, 0), counts.get(previous_key, 0)
+
+    def incr(self, key, window, now):
+        current_key = '%s:%d' % (key, int(now // window))
+        self.cache.add(current_key, 0, timeout=2 * window)
+        try:
+            self.cache.incr(current_key)
+        except ValueError:
+            # The key expired between add() and incr().
+            self.cache.add(current_key, 1, timeout=2 * window)
+
+
+class SigninThrottle:
+    """
+    Reject sign-in attempts before any password hashing once a client IP
+    has made too many attempts, or an email address has had too many
+    failures, within the sliding windows of ``settings.SIGNIN_THROTTLE``.
+    The count of the previous fixed window is weighted by how much of it
+    still overlaps the sliding window.
+    """
+
+    def __init__(self, backend, rates):
+        self.backend = backend
+        self.rates = rates
+
+    def make_key(self, scope, value):
+        digest = hashlib.blake2b(value.encode(), digest_size=8).hexdigest()
+        return 'signin:%s:%s' % (scope, digest)
+
+    def get_keys(self, request, username):
+        from .models import User
+
+        keys = {'email': self.make_key(
+            'email', User.objects.normalize_email(username))}
+        ip = request.META.get('REMOTE_ADDR') if request is not None else None
+        if ip:
+            keys['ip'] = self.make_key('ip', ip)
+        return keys
+
+    def estimate(self, key, window, now):
+        current, previous = self.backend.get_counts(key, window, now)
+        overlap = 1 - (now % window) / window
+        return current + previous * overlap
+
+    def allow(self, request, username):
+        """
+        Return whether the attempt may go on to password verification, and
+        count it against the client IP if so.
+        """
+        now = time.time()
+        keys = self.get_keys(request, username)
+        for scope, key in keys.items():
+            limit, window = self.rates[scope]
+            if self.estimate(key, window, now) >= limit:
+                signin_attempts.inc(outcome='throttled')
+                return False
+        if 'ip' in keys:
+            self.backend.incr(keys['ip'], self.rates['ip'][1], now)
+        signin_attempts.inc(outcome='verified')
+        return True
+
+    def record_failure(self, request, username):
+        limit, window = self.rates['email']
+        self.backend.incr(
+            self.get_keys(request, username)['email'], window, time.time())
+
+
+_throttle = None
+
+
+def get_signin_throttle():
+    global _throttle
+    if _throttle is None:
+        config = settings.SIGNIN_THROTTLE
+        backend = import_string(config['BACKEND'])(**config.get('OPTIONS', {}))
+        _throttle = SigninThrottle(backend, config['RATES'])
+    return _throttle
+
+
+@receiver(setting_changed)
+def reset_signin_throttle(**kwargs):
+    global _throttle
+    if kwargs['setting'] == 'SIGNIN_THROTTLE':
+        _throttle = None
@@ -1,29 +1,47 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
 
+ASYNC_VIEWS = {
+    views.SigninView: views.AsyncSigninView,
+    views.SignupView: views.AsyncSignupView,
+    views.ChangePasswordView: views.AsyncChangePasswordView,
+    views.ResetPasswordView: views.AsyncResetPasswordView,
+    views.ResetPasswordConfirmView: views.AsyncResetPasswordConfirmView,
+    views.ProfileView: views.AsyncProfileView,
+}
+
+
+def as_view(view_class):
+    """Return the view, using its async variant when enabled."""
+    if settings.USERS_ASYNC_VIEWS:
+        view_class = ASYNC_VIEWS.get(view_class, view_class)
+    return view_class.as_view()
+
+
 app_name = 'users'
 urlpatterns = [
-    path(r'signin/', views.SigninView.as_view(), name="signin"),
+    path(r'signin/', as_view(views.SigninView), name="signin"),
     path(r'signout/', views.SignoutView.as_view(), name="signout"),
-    path(r'signup/', views.SignupView.as_view(), name="signup"),
+    path(r'signup/', as_view(views.SignupView), name="signup"),
     path(r'welcome/', views.WelcomeView.as_view(), name="welcome"),
-    path(r'change_password/', views.ChangePasswordView.as_view(),
+    path(r'change_password/', as_view(views.ChangePasswordView),
          name="change_password"),
     path(r'change_password_done/', views.ChangePasswordDoneView.as_view(),
          name="change_password_done"),
-    path(r'password_reset/', views.ResetPasswordView.as_view(),
+    path(r'password_reset/', as_view(views.ResetPasswordView),
          name="password_reset"),
     path(r'password_reset_done/', views.ResetPasswordDoneView.as_view(),
          name="password_reset_done"),
     path(r'password_reset_confirm/<uidb64>/<token>/',
-         views.ResetPasswordConfirmView.as_view(),
+         as_view(views.ResetPasswordConfirmView),
          name="password_reset_confirm"),
-    path(r'password_reset_confirm/', views.ResetPasswordConfirmView.as_view(),
+    path(r'password_reset_confirm/', as_view(views.ResetPasswordConfirmView),
          name="password_reset_confirm"),
     path(r'password_reset_complete/',
          views.ResetPasswordCompleteView.as_view(),
          name="password_reset_complete"),
-    path(r'profile/<int:pk>', views.ProfileView.as_view(),
+    path(r'profile/<int:pk>', as_view(views.ProfileView),
          name="profile"),
 ]
@@ -4,13 +4,21 @@ from django.contrib.auth.views import (
     PasswordResetView, PasswordResetDoneView, PasswordResetConfirmView,
     PasswordResetCompleteView)
 from django.views.generic import CreateView, TemplateView, UpdateView
+from asgiref.sync import sync_to_async
+from django.core.exceptions import NON_FIELD_ERRORS, ValidationError
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.contrib.auth import login, authenticate
+from django.contrib.auth import SESSION_KEY, login
 from django.contrib import messages
+from django.db import IntegrityError, router, transaction
+from django.http import HttpResponseRedirect
+from django.utils.http import urlsafe_base64_decode
 from django.utils.translation import gettext as _
 
-from utilities.mixins import LogoutRequiredMixin, VerifyUserIdentityMixin
-from .models import User
+from utilities.mixins import (
+    AsyncViewMixin, LogoutRequiredMixin, VerifyUserIdentityMixin)
+from .audit import audit_log
+from .last_login import default_token_generator
+from .models import AuditEvent, User
 from .forms import (SigninForm, SignupForm, ChangePasswordForm,
                     ResetPasswordForm, PasswordSetForm, ProfileForm)
 
@@ -20,6 +28,15 @@ class SigninView(LoginView):
     form_class = SigninForm
     redirect_authenticated_user = True
 
+    def form_invalid(self, form):
+        response = super().form_invalid(form)
+        if form.has_error(NON_FIELD_ERRORS, 'throttled'):
+            response.status_code = 429
+            audit_log.record(
+                AuditEvent.Event.SIGNIN_THROTTLED, self.request,
+                email=form.cleaned_data.get('username', ''))
+        return response
+
 
 class SignoutView(LogoutView):
     pass
@@ -32,13 +49,24 @@ class SignupView(LogoutRequiredMixin, CreateView):
     success_url = reverse_lazy('users:welcome')
 
     def form_valid(self, form):
-        response = super().form_valid(form)
-        username = form.cleaned_data.get("email")
-        password = form.cleaned_data.get("password1")
-        user = authenticate(username=username, password=password)
-        if user:
-            login(self.request, user)
-        return response
+        """
+        Create the user and log them in within one transaction. The password
+        is hashed once, by the form; the new instance is logged in directly
+        rather than authenticating the raw password a second time.
+        """
+        try:
+            # On the user's shard, if sharded (see users.sharding).
+            db = router.db_for_write(User, instance=form.instance)
+            with transaction.atomic(using=db):
+                self.object = form.save()
+                login(self.request, self.object,
+                      backend='users.backends.EmailBackend')
+        except IntegrityError:
+            # A concurrent signup with the same address got in first.
+            form.add_error('email', form.instance.unique_error_message(
+                User, ('email',)))
+            return self.form_invalid(form)
+        return HttpResponseRedirect(self.get_success_url())
 
 
 class WelcomeView(LoginRequiredMixin, TemplateView):
@@ -50,6 +78,11 @@ class ChangePasswordView(LoginRequiredMixin, PasswordChangeView):
     form_class = ChangePasswordForm
     success_url = reverse_lazy('users:change_password_done')
 
+    def form_valid(self, form):
+        audit_log.record(
+            AuditEvent.Event.PASSWORD_CHANGE, self.request, form.user)
+        return super().form_valid(form)
+
 
 class ChangePasswordDoneView(LoginRequiredMixin, PasswordChangeDoneView):
     template_name = 'password_change_done.html'
@@ -59,8 +92,15 @@ class ResetPasswordView(PasswordResetView):
     template_name = "password_reset_form.html"
     email_template_name = 'password_reset_email.html'
     form_class = ResetPasswordForm
+    token_generator = default_token_generator
     success_url = reverse_lazy("users:password_reset_done")
 
+    def form_valid(self, form):
+        audit_log.record(
+            AuditEvent.Event.PASSWORD_RESET_REQUEST, self.request,
+            email=form.cleaned_data['email'])
+        return super().form_valid(form)
+
 
 class ResetPasswordDoneView(PasswordResetDoneView):
     template_name = "password_reset_done.html"
@@ -70,6 +110,21 @@ class ResetPasswordConfirmView(PasswordResetConfirmView):
     template_name = "password_reset_confirm.html"
     form_class = PasswordSetForm
     success_url = reverse_lazy("users:password_reset_complete")
+    token_generator = default_token_generator
+
+    def get_user(self, uidb64):
+        # Like Django's, on the shard of the user (see users.sharding).
+        try:
+            uid = urlsafe_base64_decode(uidb64).decode()
+            return User.objects.for_pk(uid).get(pk=uid)
+        except (TypeError, ValueError, OverflowError, User.DoesNotExist,
+                ValidationError):
+            return None
+
+    def form_valid(self, form):
+        audit_log.record(
+            AuditEvent.Event.PASSWORD_RESET, self.request, form.user)
+        return super().form_valid(form)
 
 
 class ResetPasswordCompleteView(PasswordResetCompleteView):
@@ -81,6 +136,72 @@ class ProfileView(LoginRequiredMixin, VerifyUserIdentityMixin, UpdateView):
     form_class = ProfileForm
     template_name = 'profile.html'
 
+    def get_queryset(self):
+        return User.objects.for_pk(self.kwargs[self.pk_url_kwarg]).all()
+
     def form_valid(self, form):
         messages.success(self.request, _("Changes successfully saved."))
-        return super().form_valid(form)
+        pk = form.instance.pk
+        response = super().form_valid(form)
+        if self.object.pk != pk:
+            # The user moved to another shard under a new id (see
+            # User.save()): keep them signed in under it.
+            self.request.session[SESSION_KEY] = (
+                self.object._meta.pk.value_to_string(self.object))
+            self.request.session.cycle_key()
+        return response
+
+
+#
+# Async variants, served under ASGI (see settings.USERS_ASYNC_VIEWS).
+# Password hashing runs on the bounded hasher pool, so it doesn't hold a
+# request thread.
+#
+
+
+class AsyncSigninView(AsyncViewMixin, SigninView):
+
+    async def apost(self, request, *args, **kwargs):
+        form = self.get_form()
+        if await form.ais_valid():
+            return await sync_to_async(self.form_valid)(form)
+        return await sync_to_async(self.form_invalid)(form)
+
+
+class AsyncSignupView(AsyncViewMixin, SignupView):
+
+    async def apost(self, request, *args, **kwargs):
+        self.object = None
+        form = self.get_form()
+        if await form.ais_valid():
+            return await sync_to_async(self.form_valid)(form)
+        return await sync_to_async(self.form_invalid)(form)
+
+
+class AsyncChangePasswordView(AsyncViewMixin, ChangePasswordView):
+
+    async def apost(self, request, *args, **kwargs):
+        form = self.get_form()
+        if await form.ais_valid():
+            return await sync_to_async(self.form_valid)(form)
+        return await sync_to_async(self.form_invalid)(form)
+
+
+class AsyncResetPasswordView(AsyncViewMixin, ResetPasswordView):
+    # The reset email is only queued (see utilities.mail): POST runs through
+    # the synchronous handler.
+    post = ResetPasswordView.post
+
+
+class AsyncResetPasswordConfirmView(AsyncViewMixin, ResetPasswordConfirmView):
+
+    async def apost(self, request, *args, **kwargs):
+        form = self.get_form()
+        if await form.ais_valid():
+            return await sync_to_async(self.form_valid)(form)
+        return await sync_to_async(self.form_invalid)(form)
+
+
+class AsyncProfileView(AsyncViewMixin, ProfileView):
+    # Nothing slow to offload: POST runs through the synchronous handler.
+    post = ProfileView.post
@@ -1,3 +1,52 @@
+import json
+
 from django.contrib import admin
+from django.contrib.admin.models import ADDITION, CHANGE, DELETION, LogEntry
+from django.contrib.admin.options import get_content_type_for_model
+from django.db import router
+
+from .models import QueuedEmail
+
+
+class UserDatabaseLogMixin:
+    """
+    Write the admin log entries on the database the acting user is written
+    to, rather than always on the default one, as their foreign key to the
+    user requires: with sharded users (see users.sharding), the user's
+    shard. Shards are migrated like the default database, so the content
+    types have the same ids on them.
+    """
+
+    def log_entry(self, request, obj, action_flag, object_repr,
+                  change_message=''):
+        user = request.user
+        if isinstance(change_message, list):
+            change_message = json.dumps(change_message)
+        return LogEntry.objects.using(
+            router.db_for_write(user._meta.model, instance=user)).create(
+                user_id=user.pk,
+                content_type_id=get_content_type_for_model(obj).pk,
+                object_id=str(obj.pk),
+                object_repr=object_repr[:200],
+                action_flag=action_flag,
+                change_message=change_message,
+            )
+
+    def log_addition(self, request, obj, message):
+        return self.log_entry(request, obj, ADDITION, str(obj), message)
+
+    def log_change(self, request, obj, message):
+        return self.log_entry(request, obj, CHANGE, str(obj), message)
+
+    def log_deletion(self, request, obj, object_repr):
+        return self.log_entry(request, obj, DELETION, object_repr)
+
+
+class QueuedEmailAdmin(UserDatabaseLogMixin, admin.ModelAdmin):
+    list_display = ('subject', 'created', 'attempts', 'next_attempt')
+    list_filter = ('attempts',)
+    readonly_fields = ('created',)
+    search_fields = ('subject',)
+
 
-# Register your models here.
+admin.site.register(QueuedEmail, QueuedEmailAdmin)
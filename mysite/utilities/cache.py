@@ -0,0 +1,12 @@
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+
+def is_shared(alias):
+    """
+    Return whether the cache `alias` is shared by the processes of the site,
+    i.e. not a per-process LocMemCache nor a DummyCache, which keeps
+    nothing.
+    """
+    return not isinstance(caches[alias], (LocMemCache, DummyCache))
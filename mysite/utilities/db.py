@@ -0,0 +1,13 @@
+from django.conf import settings
+
+
+def apply_sqlite_pragmas(connection, **kwargs):
+    """
+    connection_created receiver setting settings.SQLITE_PRAGMAS on every new
+    SQLite connection. They are run on the DB-API connection, so they are
+    neither timed nor counted as queries.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    for name, value in settings.SQLITE_PRAGMAS.items():
+        connection.connection.execute('PRAGMA %s = %s' % (name, value))
@@ -1,40 +1,75 @@
 from django import forms
 
 
-class BootstrapMixin:
+EXEMPT_WIDGETS = (
+    forms.CheckboxInput,
+    forms.FileInput,
+    forms.RadioSelect,
+    forms.Select,
+)
+
+
+def bootstrap_attrs(field):
     """
-    Add the base Bootstrap CSS classes to form elements.
+    Return the widget attributes of the field with the base Bootstrap CSS
+    classes, required and placeholder attributes added.
     """
+    widget_class = field.widget.__class__
+    attrs = dict(field.widget.attrs)
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
+    if widget_class not in EXEMPT_WIDGETS:
+        attrs['class'] = ' '.join(
+            [attrs.get('class', ''), 'form-control']).strip()
 
-        exempt_widgets = [
-            forms.CheckboxInput,
-            forms.FileInput,
-            forms.RadioSelect,
-            forms.Select,
-        ]
+    if field.required and not isinstance(field.widget, forms.FileInput):
+        attrs['required'] = 'required'
 
-        for field_name, field in self.fields.items():
+    if 'placeholder' not in attrs and field.label is not None:
+        attrs['placeholder'] = field.label
+
+    if widget_class == forms.CheckboxInput:
+        attrs['class'] = ' '.join(
+            (attrs.get('class', ''), 'form-check-input')).strip()
+
+    if widget_class == forms.Select:
+        attrs['class'] = ' '.join(
+            (attrs.get('class', ''), 'form-select')).strip()
 
-            if field.widget.__class__ not in exempt_widgets:
-                css = field.widget.attrs.get('class', '')
-                field.widget.attrs['class'] = ' '.join(
-                    [css, 'form-control']).strip()
+    return attrs
 
-            if field.required and not isinstance(field.widget, forms.FileInput):
-                field.widget.attrs['required'] = 'required'
 
-            if 'placeholder' not in field.widget.attrs and field.label is not None:
-                field.widget.attrs['placeholder'] = field.label
+class BootstrapMixin:
+    """
+    Add the base Bootstrap CSS classes to form elements.
+
+    The attributes are computed once per form class from its base fields.
+    A field that the form's __init__() added or changed (widget, attributes,
+    label or required) gets its attributes computed again.
+    """
 
-            if field.widget.__class__ == forms.CheckboxInput:
-                css = field.widget.attrs.get('class', '')
-                field.widget.attrs['class'] = ' '.join(
-                    (css, 'form-check-input')).strip()
+    @classmethod
+    def get_bootstrap_plan(cls):
+        plan = cls.__dict__.get('_bootstrap_plan')
+        if plan is None:
+            plan = cls._bootstrap_plan = {
+                name: (field.widget.__class__, field.label, field.required,
+                       dict(field.widget.attrs), bootstrap_attrs(field))
+                for name, field in cls.base_fields.items()
+            }
+        return plan
 
-            if field.widget.__class__ == forms.Select:
-                css = field.widget.attrs.get('class', '')
-                field.widget.attrs['class'] = ' '.join(
-                    (css, 'form-select')).strip()
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        plan = self.get_bootstrap_plan()
+        for field_name, field in self.fields.items():
+            widget = field.widget
+            entry = plan.get(field_name)
+            if (entry is not None
+                    and entry[0] is widget.__class__
+                    and entry[1] is field.label
+                    and entry[2] == field.required
+                    and entry[3] == widget.attrs):
+                widget.attrs.update(entry[4])
+            else:
+                widget.attrs.update(bootstrap_attrs(field))
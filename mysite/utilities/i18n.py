@@ -0,0 +1,61 @@
+import functools
+import types
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+
+@functools.lru_cache(maxsize=None)
+def get_language_codes():
+    """Return the supported language codes, in settings.LANGUAGES order."""
+    return tuple(code for code, name in settings.LANGUAGES)
+
+
+@functools.lru_cache(maxsize=None)
+def get_language_code_set():
+    return frozenset(get_language_codes())
+
+
+@functools.lru_cache(maxsize=1024)
+def switch_lang_code(path, language):
+    """
+    Return `path` with its language prefix replaced by, or prefixed with,
+    `language`. Raise ValueError for an empty or relative path, or an
+    unsupported language.
+    """
+    lang_codes = get_language_code_set()
+
+    # Validate the inputs
+    if path == '':
+        raise ValueError('URL path for language switch is empty')
+    elif path[0] != '/':
+        raise ValueError('URL path for language switch does not start with "/"')
+    elif language not in lang_codes:
+        raise ValueError('%s is not a supported language code' % language)
+
+    # Add or substitute the new language prefix, which is the text up to the
+    # second slash.
+    prefix, sep, rest = path[1:].partition('/')
+    if prefix in lang_codes:
+        return '/%s%s%s' % (language, sep, rest)
+    return '/' + language + path
+
+
+@functools.lru_cache(maxsize=1024)
+def alternate_language_urls(path):
+    """
+    Return a read-only mapping of every supported language code to `path`
+    switched to that language.
+    """
+    return types.MappingProxyType({
+        code: switch_lang_code(path, code) for code in get_language_codes()
+    })
+
+
+@receiver(setting_changed)
+def clear_language_caches(*, setting, **kwargs):
+    if setting == 'LANGUAGES':
+        for func in (get_language_codes, get_language_code_set,
+                     switch_lang_code, alternate_language_urls):
+            func.cache_clear()
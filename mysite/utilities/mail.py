@@ -0,0 +1,139 @@
+import contextlib
+import datetime
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db import transaction
+from django.utils import timezone
+
+from .models import QueuedEmail
+
+
+def serialize_message(email_message):
+    """Return the JSON representation of an EmailMessage stored in the queue."""
+    if email_message.attachments:
+        raise ValueError('Queued email messages cannot have attachments.')
+    return {
+        'subject': email_message.subject,
+        'body': email_message.body,
+        'from_email': email_message.from_email,
+        'to': email_message.to,
+        'cc': email_message.cc,
+        'bcc': email_message.bcc,
+        'reply_to': email_message.reply_to,
+        'headers': email_message.extra_headers,
+        'alternatives': [
+            list(alternative)
+            for alternative in getattr(email_message, 'alternatives', ())
+        ],
+    }
+
+
+def deserialize_message(data, connection=None):
+    """Rebuild the EmailMultiAlternatives stored by serialize_message()."""
+    data = dict(data)
+    alternatives = [tuple(alternative)
+                    for alternative in data.pop('alternatives')]
+    return EmailMultiAlternatives(
+        alternatives=alternatives, connection=connection, **data)
+
+
+class QueuedEmailBackend(BaseEmailBackend):
+    """
+    Store outgoing messages in the QueuedEmail table instead of sending them,
+    so that no request waits on the mail server. The send_queued_mail command
+    delivers them through settings.QUEUED_EMAIL_BACKEND.
+    """
+
+    def send_messages(self, email_messages):
+        queued = [
+            QueuedEmail(subject=message.subject[:255],
+                        message=serialize_message(message))
+            for message in email_messages
+            if message.recipients()
+        ]
+        QueuedEmail.objects.bulk_create(queued)
+        return len(queued)
+
+
+def retry_delay(attempts):
+    """Seconds to wait before retrying a message after `attempts` failures."""
+    return min(settings.QUEUED_EMAIL_RETRY_DELAY * 2 ** (attempts - 1),
+               settings.QUEUED_EMAIL_MAX_RETRY_DELAY)
+
+
+def claim_batch(batch_size):
+    """
+    Return up to `batch_size` due messages, leased to this worker: their
+    next attempt is pushed back by QUEUED_EMAIL_LEASE seconds, so another
+    worker only picks them up again if this one dies while sending.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            QueuedEmail.objects.select_for_update(skip_locked=True)
+            .filter(next_attempt__lte=now)
+            .order_by('next_attempt')[:batch_size]
+        )
+        QueuedEmail.objects.filter(pk__in=[queued.pk for queued in batch]) \
+            .update(next_attempt=now + datetime.timedelta(
+                seconds=settings.QUEUED_EMAIL_LEASE))
+    return batch
+
+
+def send_batch(batch, connection):
+    """
+    Send the claimed `batch` over the open `connection`. Delivered messages
+    are deleted; failed ones are rescheduled with exponential backoff, or
+    given up on after QUEUED_EMAIL_MAX_ATTEMPTS attempts. Return the number
+    of messages sent and failed.
+    """
+    sent, failed = [], []
+    for queued in batch:
+        try:
+            connection.send_messages([deserialize_message(queued.message)])
+        except Exception as e:
+            queued.attempts += 1
+            queued.last_error = '%s: %s' % (type(e).__name__, e)
+            if queued.attempts >= settings.QUEUED_EMAIL_MAX_ATTEMPTS:
+                queued.next_attempt = None
+            else:
+                queued.next_attempt = timezone.now() + datetime.timedelta(
+                    seconds=retry_delay(queued.attempts))
+            failed.append(queued)
+            # The connection may be broken, start the next message on a
+            # fresh one.
+            with contextlib.suppress(Exception):
+                connection.close()
+            with contextlib.suppress(Exception):
+                connection.open()
+        else:
+            sent.append(queued.pk)
+
+    QueuedEmail.objects.filter(pk__in=sent).delete()
+    QueuedEmail.objects.bulk_update(
+        failed, ['attempts', 'last_error', 'next_attempt'])
+    return len(sent), len(failed)
+
+
+def send_queued_mail(batch_size=100, connection=None):
+    """
+    Deliver all due messages in batches over a single connection of
+    settings.QUEUED_EMAIL_BACKEND. Return the number sent and failed.
+    """
+    connection = connection or get_connection(settings.QUEUED_EMAIL_BACKEND)
+    total_sent = total_failed = 0
+    connection.open()
+    try:
+        while True:
+            batch = claim_batch(batch_size)
+            if not batch:
+                break
+            sent, failed = send_batch(batch, connection)
+            total_sent += sent
+            total_failed += failed
+    finally:
+        with contextlib.suppress(Exception):
+            connection.close()
+    return total_sent, total_failed
@@ -0,0 +1,58 @@
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from utilities.routers import use_primary
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete expired sessions in bounded chunks, so that the session "
+        "table is never locked for long."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='Sessions deleted per DELETE statement (default: 1000).',
+        )
+        parser.add_argument(
+            '--pause', type=float, default=0,
+            help='Seconds to sleep between chunks, to let other writers in '
+                 '(default: 0).',
+        )
+
+    def handle(self, *args, chunk_size, pause, **options):
+        engine = import_module(settings.SESSION_ENGINE)
+        model = getattr(engine.SessionStore, 'get_model_class', None)
+        if model is None:
+            # Cache and cookie sessions expire on their own.
+            engine.SessionStore.clear_expired()
+            self.stdout.write('%s has no session table to purge.'
+                              % settings.SESSION_ENGINE)
+            return
+        model = model()
+
+        # Sessions expiring while the command runs are left for next time.
+        now = timezone.now()
+        expired = model.objects.filter(expire_date__lt=now).order_by(
+            'expire_date').values_list('pk', flat=True)
+        deleted = 0
+        # Read on the primary: a lagging replica would return the keys just
+        # deleted again.
+        with use_primary():
+            while True:
+                keys = list(expired[:chunk_size])
+                if not keys:
+                    break
+                deleted += model.objects.filter(pk__in=keys).delete()[0]
+                if len(keys) < chunk_size:
+                    break
+                if pause:
+                    time.sleep(pause)
+
+        self.stdout.write(self.style.SUCCESS(
+            '%d expired sessions deleted.' % deleted))
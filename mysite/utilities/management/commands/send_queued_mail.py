@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from utilities.mail import send_queued_mail
+
+
+class Command(BaseCommand):
+    help = (
+        "Deliver the email messages queued by "
+        "utilities.mail.QueuedEmailBackend over one persistent connection."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=100,
+            help='Messages claimed from the queue at a time (default: 100).',
+        )
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Keep polling the queue instead of exiting once it is empty.',
+        )
+        parser.add_argument(
+            '--interval', type=float, default=1,
+            help='Seconds between polls with --loop (default: 1).',
+        )
+
+    def handle(self, *args, batch_size, loop, interval, **options):
+        while True:
+            try:
+                sent, failed = send_queued_mail(batch_size)
+            except Exception as e:
+                if not loop:
+                    raise
+                self.stderr.write('Cannot deliver queued mail: %s' % e)
+            else:
+                if sent or failed or not loop:
+                    self.stdout.write(
+                        '%d message(s) sent, %d failed.' % (sent, failed))
+            if not loop:
+                break
+            time.sleep(interval)
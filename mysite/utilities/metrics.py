@@ -0,0 +1,128 @@
+import bisect
+import threading
+
+
+REGISTRY = []
+
+# Prometheus' default buckets, in seconds.
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0,
+    7.5, 10.0)
+
+
+class Counter:
+    """
+    A process-local, monotonically increasing counter, optionally split by
+    label values.
+    """
+    type = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels):
+        return self._values.get(
+            tuple(labels[name] for name in self.labelnames), 0)
+
+    def samples(self):
+        """Yield ``(labels, value)`` pairs."""
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield dict(zip(self.labelnames, key)), value
+
+    def exposition(self):
+        """Yield the lines of the samples in the Prometheus text format."""
+        for labels, value in self.samples():
+            yield '%s%s %s' % (self.name, format_labels(labels), value)
+
+
+class Histogram:
+    """
+    A process-local histogram of observed values, optionally split by label
+    values, with the cumulative bucket counts, sum and count of Prometheus.
+    """
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(),
+                 buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label values: the count of each bucket (not cumulative) and
+        # of +Inf, then the sum.
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [0] * (len(self.buckets) + 2)
+            counts[index] += 1
+            counts[-1] += value
+
+    def get(self, **labels):
+        """Return the ``(count, sum)`` of the observations."""
+        counts = self._values.get(
+            tuple(labels[name] for name in self.labelnames))
+        if counts is None:
+            return 0, 0
+        return sum(counts[:-1]), counts[-1]
+
+    def samples(self):
+        """Yield ``(labels, cumulative bucket counts, sum)`` tuples."""
+        with self._lock:
+            values = [(key, list(counts))
+                      for key, counts in self._values.items()]
+        for key, counts in values:
+            cumulative, total = [], 0
+            for count in counts[:-1]:
+                total += count
+                cumulative.append(total)
+            yield dict(zip(self.labelnames, key)), cumulative, counts[-1]
+
+    def exposition(self):
+        bounds = [repr(float(bound)) for bound in self.buckets] + ['+Inf']
+        for labels, cumulative, total in self.samples():
+            for bound, count in zip(bounds, cumulative):
+                yield '%s_bucket%s %d' % (
+                    self.name, format_labels({**labels, 'le': bound}), count)
+            yield '%s_sum%s %r' % (self.name, format_labels(labels), total)
+            yield '%s_count%s %d' % (
+                self.name, format_labels(labels), cumulative[-1])
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{%s}' % ','.join(
+        '%s="%s"' % (name, str(value).replace('\\', r'\\')
+                     .replace('\n', r'\n').replace('"', r'\"'))
+        for name, value in labels.items())
+
+
+def exposition(registry=REGISTRY):
+    """Return the metrics of `registry` in the Prometheus text format."""
+    lines = []
+    for metric in registry:
+        lines.append('# HELP %s %s' % (
+            metric.name,
+            metric.documentation.replace('\\', r'\\').replace('\n', r'\n')))
+        lines.append('# TYPE %s %s' % (metric.name, metric.type))
+        lines.extend(metric.exposition())
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,123 @@
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.utils.functional import SimpleLazyObject
+
+from .i18n import alternate_language_urls
+from .metrics import Histogram
+from .routers import start_pin, stop_pin
+from .timing import (
+    get_timings, install_query_timer, start_timings, stop_timings)
+
+
+request_phase_seconds = Histogram(
+    'request_phase_seconds',
+    'Time spent per request in database queries, password hashing, '
+    'template rendering, form_helpers tags, the view, and in total.',
+    ('phase', 'view'))
+
+
+class AlternateLanguageURLsMiddleware:
+    """
+    Set request.alternate_language_urls to a mapping of every supported
+    language code to the current page's URL in that language. It is
+    computed on first access, at most once per request, and cached per path.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.alternate_language_urls = SimpleLazyObject(
+            lambda: alternate_language_urls(request.get_full_path()))
+        return self.get_response(request)
+
+
+class PrimaryPinMiddleware:
+    """
+    Pin a client to the primary database for
+    settings.DATABASE_PRIMARY_PIN_SECONDS after a request of it wrote a
+    replicated model, with a cookie, so that it reads its own writes. Put
+    the middleware before SessionMiddleware, whose session saves count as
+    writes.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+        cookie = settings.DATABASE_PRIMARY_PIN_COOKIE
+        token = start_pin(pinned=cookie in request.COOKIES)
+        try:
+            response = self.get_response(request)
+        finally:
+            pin = stop_pin(token)
+        if pin.wrote:
+            response.set_cookie(
+                cookie, '1', max_age=settings.DATABASE_PRIMARY_PIN_SECONDS,
+                httponly=True, samesite='Lax')
+        return response
+
+
+class ServerTimingMiddleware:
+    """
+    Time the database queries, password hashing, template rendering (the
+    form_helpers tags also on their own), the view and the whole request.
+    The timings are observed in the request_phase_seconds histogram, and
+    sent in a Server-Timing header if settings.SERVER_TIMING_HEADER is on,
+    to the addresses of settings.METRICS_ALLOWED_IPS only.
+
+    'view' runs from URL resolution to the rendered response. Put the
+    middleware first, so that 'total' covers the rest of the middleware.
+    """
+    phases = ('db', 'hash', 'template', 'form_helpers')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        connection_created.connect(
+            install_query_timer, dispatch_uid='utilities.timing')
+        for connection in connections.all():
+            install_query_timer(connection)
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        token = start_timings()
+        try:
+            response = self.get_response(request)
+        finally:
+            timings = stop_timings(token)
+        end = time.perf_counter()
+
+        durations = {
+            phase: timings.durations[phase]
+            for phase in self.phases if phase in timings.counts
+        }
+        if timings.view_started is not None:
+            durations['view'] = end - timings.view_started
+        durations['total'] = end - start
+
+        match = request.resolver_match
+        view = match.view_name if match is not None else 'unresolved'
+        for phase, duration in durations.items():
+            request_phase_seconds.observe(duration, phase=phase, view=view)
+
+        if (settings.SERVER_TIMING_HEADER
+                and request.META.get('REMOTE_ADDR')
+                in settings.METRICS_ALLOWED_IPS):
+            entries = []
+            for phase, duration in durations.items():
+                entry = '%s;dur=%.3f' % (phase, duration * 1000)
+                if phase == 'db':
+                    entry += ';desc="%d queries"' % timings.counts['db']
+                entries.append(entry)
+            response['Server-Timing'] = ', '.join(entries)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        timings = get_timings()
+        if timings is not None:
+            timings.view_started = time.perf_counter()
@@ -1,6 +1,8 @@
-from django.http import Http404
+from asgiref.sync import markcoroutinefunction, sync_to_async
+from django.http import Http404, HttpResponse
 from django.shortcuts import redirect
 from django.urls import reverse
+from django.utils.decorators import classonlymethod
 from django.contrib.auth.mixins import UserPassesTestMixin
 
 
@@ -13,8 +15,68 @@ class LogoutRequiredMixin(UserPassesTestMixin):
 
 
 class VerifyUserIdentityMixin(UserPassesTestMixin):
+    """
+    Only let users access their own user object. The primary key in the URL
+    is compared with the signed in user's, so the check costs no query, and
+    get_object() is memoized for the rest of the request.
+    """
+
     def test_func(self):
-        return self.get_object() == self.request.user
+        pk = self.kwargs.get(self.pk_url_kwarg)
+        if pk is None:
+            return self.get_object() == self.request.user
+        return str(pk) == str(self.request.user.pk)
+
+    def get_object(self, queryset=None):
+        if queryset is not None:
+            return super().get_object(queryset)
+        if not hasattr(self, '_object'):
+            self._object = super().get_object()
+        return self._object
 
     def handle_no_permission(self):
         raise Http404("Access denied.")
+
+
+class AsyncPostPending(HttpResponse):
+    """
+    Placeholder returned by AsyncViewMixin.post() from the synchronous
+    dispatch. Decorators on dispatch() may add headers and cookies to it,
+    which are carried over to the response of apost().
+    """
+
+
+class AsyncViewMixin:
+    """
+    Serve a class-based view natively under ASGI.
+
+    The regular dispatch (access mixins, dispatch decorators and GET
+    handling) runs through ``sync_to_async``. A POST is then handed to the
+    view's ``apost()`` coroutine on the event loop, so slow work can be
+    awaited instead of holding a thread for the whole request.
+    """
+
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        # Mark the view as a coroutine function for Django's handlers.
+        return markcoroutinefunction(view)
+
+    async def dispatch(self, request, *args, **kwargs):
+        response = await sync_to_async(super().dispatch)(
+            request, *args, **kwargs)
+        if isinstance(response, AsyncPostPending):
+            pending = response
+            response = await self.apost(request, *args, **kwargs)
+            for header, value in pending.items():
+                if header not in response:
+                    response[header] = value
+            response.cookies.update(pending.cookies)
+        return response
+
+    def post(self, request, *args, **kwargs):
+        return AsyncPostPending()
+
+    async def apost(self, request, *args, **kwargs):
+        raise NotImplementedError(
+            'subclasses of AsyncViewMixin must provide an apost() method')
@@ -0,0 +1,27 @@
+from django.db import models
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+
+class QueuedEmail(models.Model):
+    """
+    An email message waiting in the outgoing queue of
+    utilities.mail.QueuedEmailBackend, until the send_queued_mail worker
+    delivers it.
+    """
+
+    class Meta:
+        verbose_name = _("Queued email")
+        ordering = ['next_attempt']
+
+    subject = models.CharField(max_length=255, blank=True)
+    message = models.JSONField()
+    created = models.DateTimeField(auto_now_add=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # Due time of the next delivery attempt, NULL once the worker gave up.
+    next_attempt = models.DateTimeField(
+        default=timezone.now, null=True, db_index=True)
+    last_error = models.TextField(blank=True)
+
+    def __str__(self):
+        return self.subject
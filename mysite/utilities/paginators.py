@@ -0,0 +1,40 @@
+import json
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+def estimate_count(queryset):
+    """
+    Return the planner's row estimate for `queryset` on PostgreSQL, which
+    doesn't scan the rows, or None on other databases.
+    """
+    if connections[queryset.db].vendor == 'postgresql':
+        plan = json.loads(queryset.explain(format='json'))
+        return plan[0]['Plan']['Plan Rows']
+    return None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    A paginator that counts exactly up to `exact_count_limit` objects, with
+    a COUNT over a subquery sliced just past the limit, so that paginating
+    a large table doesn't run a full COUNT(*).
+
+    Past the limit, the count is the planner's estimate on PostgreSQL.
+    Elsewhere it is capped at exact_count_limit + 1: only the pages up to
+    the cap can be browsed, and reaching further rows takes a narrower
+    filter or search.
+    """
+    exact_count_limit = 10000
+
+    @cached_property
+    def count(self):
+        object_list = self.object_list
+        if not hasattr(object_list, 'query'):
+            return super().count
+        count = object_list[:self.exact_count_limit + 1].count()
+        if count <= self.exact_count_limit:
+            return count
+        return max(count, estimate_count(object_list) or 0)
@@ -0,0 +1,88 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+_primary_pin = ContextVar('primary_pin', default=None)
+
+
+class PrimaryPin:
+    """
+    Whether the current request reads from the primary database: because
+    its client wrote recently, or it wrote itself.
+    """
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+
+    @property
+    def active(self):
+        return self.pinned or self.wrote
+
+
+def start_pin(pinned=False):
+    """Start tracking the writes of the current request."""
+    return _primary_pin.set(PrimaryPin(pinned))
+
+
+def stop_pin(token):
+    pin = _primary_pin.get()
+    _primary_pin.reset(token)
+    return pin
+
+
+@contextmanager
+def use_primary():
+    """Read the replicated models from the primary in the block."""
+    outer = _primary_pin.get()
+    pin = PrimaryPin(pinned=True)
+    token = _primary_pin.set(pin)
+    try:
+        yield
+    finally:
+        _primary_pin.reset(token)
+        if outer is not None and pin.wrote:
+            outer.wrote = True
+
+
+def is_replicated(model):
+    return model._meta.label_lower in settings.DATABASE_REPLICA_MODELS
+
+
+class PrimaryReplicaRouter:
+    """
+    Send the reads of settings.DATABASE_REPLICA_MODELS to a random database
+    of settings.DATABASE_REPLICAS, and all writes to the primary (default).
+
+    Reads stay on the primary inside a transaction on it, in use_primary()
+    blocks, and for the rest of a request that wrote a replicated model or
+    whose client did recently (see PrimaryPinMiddleware), so that a client
+    reads its own writes while the replicas catch up.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not settings.DATABASE_REPLICAS or not is_replicated(model):
+            return None
+        pin = _primary_pin.get()
+        if ((pin is not None and pin.active)
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return DEFAULT_DB_ALIAS
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        if not is_replicated(model):
+            return None
+        pin = _primary_pin.get()
+        if pin is not None:
+            pin.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
@@ -1,32 +1,7 @@
 from django import template
 from django.template.defaultfilters import stringfilter
-from django.conf import settings
 
-
-def switch_lang_code(path, language):
-
-    # Get the supported language codes
-    lang_codes = [c for (c, name) in settings.LANGUAGES]
-
-    # Validate the inputs
-    if path == '':
-        raise Exception('URL path for language switch is empty')
-    elif path[0] != '/':
-        raise Exception('URL path for language switch does not start with "/"')
-    elif language not in lang_codes:
-        raise Exception('%s is not a supported language code' % language)
-
-    # Split the parts of the path
-    parts = path.split('/')
-
-    # Add or substitute the new language prefix
-    if parts[1] in lang_codes:
-        parts[1] = language
-    else:
-        parts[0] = "/" + language
-
-    # Return the full new path
-    return '/'.join(parts)
+from utilities.i18n import switch_lang_code
 
 
 register = template.Library()
@@ -40,4 +15,11 @@ def switch_i18n_prefix(path, language):
 
 @register.filter
 def switch_i18n(request, language):
-    return switch_lang_code(request.get_full_path(), language)
+    """
+    Return the current page's URL in `language`, from the alternate language
+    URLs computed once per request by AlternateLanguageURLsMiddleware.
+    """
+    urls = getattr(request, 'alternate_language_urls', None)
+    if urls is None or language not in urls:
+        return switch_lang_code(request.get_full_path(), language)
+    return urls[language]
@@ -0,0 +1,197 @@
+import email
+import shutil
+import socketserver
+import tempfile
+import threading
+import time
+from typing import NamedTuple
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, get_resolver, reverse
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        self.reply('220 localhost SMTP stand-in')
+        envelope = None
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip()
+            verb = command[:4].upper()
+            if verb in ('HELO', 'EHLO'):
+                self.reply('250 localhost')
+            elif verb == 'MAIL':
+                envelope = {'from': command[10:].strip('<> '), 'to': []}
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                envelope['to'].append(command[8:].strip('<> '))
+                if any(r in server.reject for r in envelope['to']):
+                    self.reply('550 Mailbox unavailable')
+                else:
+                    self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                data = []
+                for line in iter(self.rfile.readline, b''):
+                    if line == b'.\r\n':
+                        break
+                    data.append(line[1:] if line.startswith(b'..') else line)
+                time.sleep(server.delay)
+                envelope['message'] = email.message_from_bytes(b''.join(data))
+                with server.lock:
+                    server.messages.append(envelope)
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                # RSET, NOOP and anything else.
+                self.reply('250 OK')
+
+
+class SMTPStandIn(socketserver.ThreadingTCPServer):
+    """
+    A minimal local SMTP server that accepts mail into `messages` instead of
+    delivering it, to test and benchmark email delivery without a mail
+    server. Recipients in `reject` are refused, and `delay` seconds are
+    spent on every message to stand in for a remote server's latency.
+
+        with SMTPStandIn() as smtp:
+            with override_settings(EMAIL_PORT=smtp.port):
+                ...
+            smtp.messages
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, delay=0, reject=()):
+        super().__init__(('127.0.0.1', 0), SMTPHandler)
+        self.delay = delay
+        self.reject = set(reject)
+        self.lock = threading.Lock()
+        self.messages = []
+        self.connections = 0
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
+
+
+class SharedCacheMixin:
+    """
+    TestCase mixin replacing the default cache with a file based one in a
+    temporary directory for the tests of the class. Unlike the per-process
+    LocMemCache of the tests, it is shared by processes, as the user cache,
+    deferred last_login updates and password reset coalescing require.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        location = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, location)
+        shared_cache = override_settings(CACHES={
+            'default': {
+                'BACKEND':
+                    'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': location,
+            },
+        })
+        shared_cache.enable()
+        cls.addClassCleanup(shared_cache.disable)
+        super().setUpClass()
+
+
+SAVEPOINT_STATEMENTS = (
+    'SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+
+
+class QueryBudget(NamedTuple):
+    """The maximum number of queries of one request to a named route."""
+    route: str
+    max_queries: int
+    method: str = 'get'
+    kwargs: dict = None
+    data: dict = None
+    # Signed in as this user, if any.
+    user: object = None
+
+
+def route_names(namespace, urlconf=None):
+    """Return the names of the routes in a URL namespace, qualified."""
+    prefix, resolver = get_resolver(urlconf).namespace_dict[namespace]
+    return {
+        '%s:%s' % (namespace, pattern.name)
+        for pattern in resolver.url_patterns
+        if isinstance(pattern, URLPattern) and pattern.name
+    }
+
+
+class QueryBudgetMixin:
+    """
+    TestCase mixin that makes the requests of get_query_budgets() in order,
+    and fails when one of them runs more queries than its budget, or when a
+    route of the URL `namespaces` has no budget.
+
+    The cache is cleared before each request, so that the budgets include
+    the lookups it saves once warm. Savepoints stand in for transactions
+    within a TestCase and are not counted. Besides the queries, only the
+    absence of a server error is checked, as a request failing early runs
+    few queries; responses are left to the view tests.
+    """
+    namespaces = ()
+
+    def get_query_budgets(self):
+        raise NotImplementedError(
+            'subclasses of QueryBudgetMixin must provide a '
+            'get_query_budgets() method')
+
+    def test_query_budgets(self):
+        budgets = self.get_query_budgets()
+        routes = set().union(*map(route_names, self.namespaces))
+        self.assertEqual(
+            routes - {budget.route for budget in budgets}, set(),
+            'Routes without a query budget.')
+        for budget in budgets:
+            with self.subTest(route=budget.route, method=budget.method):
+                self.assertWithinQueryBudget(budget)
+
+    def assertWithinQueryBudget(self, budget):
+        client = Client(raise_request_exception=False)
+        if budget.user is not None:
+            client.force_login(budget.user)
+        cache.clear()
+        url = reverse(budget.route, kwargs=budget.kwargs)
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(client, budget.method)(url, budget.data or {})
+        self.assertLess(
+            response.status_code, 500,
+            '%s %s failed with a server error.' % (budget.method.upper(), url))
+        queries = [
+            query for query in queries
+            if not query['sql'].startswith(SAVEPOINT_STATEMENTS)
+        ]
+        self.assertLessEqual(
+            len(queries), budget.max_queries,
+            '%s %s ran %d queries, over its budget of %d:\n%s' % (
+                budget.method.upper(), url, len(queries), budget.max_queries,
+                '\n'.join(query['sql'] for query in queries)))
@@ -1,3 +1,549 @@
-from django.test import TestCase
+import datetime
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django import forms
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections, router
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.test import (
+    Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase,
+    override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from users.audit import audit_log
+from users.bulk import update_users
+from users.models import User
+from .forms import BootstrapMixin
+from .i18n import switch_lang_code
+from .mail import QueuedEmailBackend
+from .metrics import REGISTRY, Histogram, exposition
+from .middleware import PrimaryPinMiddleware, request_phase_seconds
+from .models import QueuedEmail
+from .routers import use_primary
+from .testing import SMTPStandIn
+
+
+@override_settings(
+    EMAIL_BACKEND='utilities.mail.QueuedEmailBackend',
+    QUEUED_EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+    EMAIL_HOST='127.0.0.1',
+    QUEUED_EMAIL_MAX_ATTEMPTS=2,
+)
+class QueuedEmailTestCase(TestCase):
+    """キューを経由するメール送信のテスト"""
+
+    def setUp(self):
+        cache.clear()
+
+    def queue(self, *recipients):
+        QueuedEmailBackend().send_messages([
+            mail.EmailMessage('Subject', 'Body', 'from@example.com', [to])
+            for to in recipients
+        ])
+
+    def send_queued_mail(self, smtp):
+        out = StringIO()
+        with override_settings(EMAIL_PORT=smtp.port):
+            call_command('send_queued_mail', stdout=out)
+        return out.getvalue()
+
+    def test_password_reset_is_queued(self):
+        """パスワードリセットのメールがリクエスト中に送信されずキューに入ること"""
+        User.objects.create_user(
+            email='test@example.com', name='Test User', password='testpass123')
+        with SMTPStandIn() as smtp:
+            self.client.post(reverse('users:password_reset'),
+                             {'email': 'test@example.com'})
+            self.assertEqual(QueuedEmail.objects.count(), 1)
+            self.assertEqual(smtp.messages, [])
+
+            self.send_queued_mail(smtp)
+        self.assertEqual(len(smtp.messages), 1)
+        self.assertEqual(smtp.messages[0]['to'], ['test@example.com'])
+        body = smtp.messages[0]['message'].get_payload(decode=True).decode()
+        self.assertIn('/users/password_reset_confirm/', body)
+        self.assertFalse(QueuedEmail.objects.exists())
+
+    def test_batch_uses_one_connection(self):
+        """キューのメールが1つのSMTP接続でまとめて送信されること"""
+        self.queue(*('user%d@example.com' % i for i in range(5)))
+        with SMTPStandIn() as smtp:
+            out = self.send_queued_mail(smtp)
+        self.assertIn('5 message(s) sent, 0 failed.', out)
+        self.assertEqual(len(smtp.messages), 5)
+        self.assertEqual(smtp.connections, 1)
+        self.assertFalse(QueuedEmail.objects.exists())
+
+    def test_failed_message_is_retried_with_backoff(self):
+        """送信に失敗したメールが間隔をあけて再送され、上限で諦められること"""
+        self.queue('ok@example.com', 'bad@example.com')
+        with SMTPStandIn(reject=['bad@example.com']) as smtp:
+            out = self.send_queued_mail(smtp)
+            self.assertIn('1 message(s) sent, 1 failed.', out)
+            self.assertEqual(len(smtp.messages), 1)
+
+            queued = QueuedEmail.objects.get()
+            self.assertEqual(queued.attempts, 1)
+            self.assertIn('SMTPRecipientsRefused', queued.last_error)
+            self.assertGreater(queued.next_attempt, timezone.now())
+
+            # Not due yet.
+            self.send_queued_mail(smtp)
+            self.assertEqual(QueuedEmail.objects.get().attempts, 1)
+
+            QueuedEmail.objects.update(next_attempt=timezone.now())
+            self.send_queued_mail(smtp)
+        queued = QueuedEmail.objects.get()
+        self.assertEqual(queued.attempts, 2)
+        self.assertIsNone(queued.next_attempt)
+
+
+class BootstrapMixinTestCase(TestCase):
+    """Bootstrap用のウィジェット属性のテスト"""
+
+    class Form(BootstrapMixin, forms.Form):
+        name = forms.CharField(label='Name')
+        agree = forms.BooleanField(required=False)
+        kind = forms.ChoiceField(choices=[('a', 'A')])
+
+    def test_attributes(self):
+        """各ウィジェットにクラス・required・placeholderが付与されるかのテスト"""
+        form = self.Form()
+        self.assertEqual(form.fields['name'].widget.attrs, {
+            'class': 'form-control', 'required': 'required',
+            'placeholder': 'Name'})
+        self.assertEqual(form.fields['agree'].widget.attrs, {
+            'class': 'form-check-input'})
+        self.assertEqual(form.fields['kind'].widget.attrs, {
+            'class': 'form-select', 'required': 'required'})
+        # Instances don't share the widget attributes.
+        form.fields['name'].widget.attrs['class'] += ' is-invalid'
+        self.assertEqual(
+            self.Form().fields['name'].widget.attrs['class'], 'form-control')
+
+    def test_attributes_computed_once_per_class(self):
+        """属性がフォームクラスごとに一度だけ計算されるかのテスト"""
+        self.Form()
+        with mock.patch('utilities.forms.bootstrap_attrs') as bootstrap_attrs:
+            self.Form()
+        bootstrap_attrs.assert_not_called()
+
+    def test_fields_changed_in_init(self):
+        """__init__で追加・変更されたフィールドにも属性が付与されるかのテスト"""
+        class BaseForm(forms.Form):
+            name = forms.CharField(label='Name')
+
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                self.fields['name'].label = 'Full name'
+                self.fields['name'].widget.attrs['autofocus'] = True
+                self.fields['extra'] = forms.CharField(
+                    label='Extra', required=False)
+
+        class Form(BootstrapMixin, BaseForm):
+            pass
+
+        for form in (Form(), Form()):
+            self.assertEqual(form.fields['name'].widget.attrs, {
+                'class': 'form-control', 'required': 'required',
+                'placeholder': 'Full name', 'autofocus': True})
+            self.assertEqual(form.fields['extra'].widget.attrs, {
+                'class': 'form-control', 'placeholder': 'Extra'})
+
+
+class FormHelpersTestCase(TestCase):
+    """フォーム描画用テンプレートタグのテスト"""
+
+    class Form(BootstrapMixin, forms.Form):
+        email = forms.EmailField(help_text='Your email address.')
+        name = forms.CharField()
+
+        def clean(self):
+            raise forms.ValidationError('Invalid form.')
+
+    def render(self, source, **context):
+        return Template('{% load form_helpers %}' + source).render(
+            Context(context))
+
+    def test_render_form(self):
+        """render_formがフィールドごとのrender_fieldと同じHTMLを出力するかのテスト"""
+        form = self.Form({'email': 'invalid', 'name': 'Name'})
+        self.assertEqual(
+            self.render('{% render_form form %}', form=form),
+            self.render('{% render_field form.email %}\n'
+                        '{% render_field form.name %}', form=form))
+        self.assertEqual(
+            self.render("  {% render_form form 'name' 'email' indent=2 %}",
+                        form=form),
+            self.render('  {% render_field form.name %}\n'
+                        '  {% render_field form.email %}', form=form))
+
+    def test_render_messages(self):
+        """render_messagesがコンテキストを複製せずにメッセージを描画するかのテスト"""
+        messages = [mock.Mock(tags='success', __str__=lambda self: 'Saved.')]
+        with mock.patch.object(Context, 'flatten') as flatten:
+            html = self.render('{% render_messages %}', messages=messages)
+        flatten.assert_not_called()
+        self.assertInHTML(
+            '<div class="alert alert-success" role="alert">Saved.</div>', html)
+
+
+class I18nSwitcherTestCase(TestCase):
+    """言語切り替えURLのテスト"""
+
+    def test_switch_lang_code(self):
+        """言語プレフィックスが付与・置換されるかのテスト"""
+        self.assertEqual(switch_lang_code('/users/signin/', 'ja'),
+                         '/ja/users/signin/')
+        self.assertEqual(switch_lang_code('/ja/users/signin/?next=/', 'en'),
+                         '/en/users/signin/?next=/')
+        self.assertEqual(switch_lang_code('/', 'ja'), '/ja/')
+        for path, language in (('', 'ja'), ('users/', 'ja'), ('/', 'fr')):
+            with self.assertRaises(ValueError):
+                switch_lang_code(path, language)
+
+    @override_settings(LANGUAGES=[('en', 'English'), ('fr', 'French')])
+    def test_languages_setting_changed(self):
+        """LANGUAGESの変更でキャッシュが破棄されるかのテスト"""
+        self.assertEqual(switch_lang_code('/fr/users/', 'en'), '/en/users/')
+        with self.assertRaises(ValueError):
+            switch_lang_code('/users/', 'ja')
+
+    def test_alternate_language_urls(self):
+        """ミドルウェアがリクエストごとに各言語のURLを提供するかのテスト"""
+        response = self.client.get(reverse('users:signin'), {'next': '/'})
+        self.assertEqual(dict(response.wsgi_request.alternate_language_urls), {
+            'en': '/en/users/signin/?next=%2F',
+            'ja': '/ja/users/signin/?next=%2F',
+        })
+        self.assertContains(response, 'href="/ja/users/signin/?next=%2F"')
+
+
+class SessionTestCase(TestCase):
+    """セッションのテスト"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='test@example.com', name='Test User', password='testpass123')
+
+    def test_session_profiles(self):
+        """各セッションプロファイルでサインイン状態が保持されるかのテスト"""
+        for profile, engine in settings.SESSION_PROFILES.items():
+            with self.subTest(profile=profile), \
+                    override_settings(SESSION_ENGINE=engine):
+                client = Client()
+                client.post(reverse('users:signin'), {
+                    'username': 'test@example.com', 'password': 'testpass123'})
+                response = client.get(reverse('users:change_password'))
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.wsgi_request.user, self.user)
+
+    def test_purge_sessions(self):
+        """期限切れのセッションだけがチャンク単位で削除されるかのテスト"""
+        now = timezone.now()
+        for n in range(5):
+            Session.objects.create(
+                session_key='expired%d' % n, session_data='',
+                expire_date=now - datetime.timedelta(days=1))
+        Session.objects.create(
+            session_key='active', session_data='',
+            expire_date=now + datetime.timedelta(days=1))
+
+        out = StringIO()
+        with CaptureQueriesContext(connection) as queries:
+            call_command('purge_sessions', chunk_size=2, stdout=out)
+
+        self.assertIn('5 expired sessions deleted.', out.getvalue())
+        self.assertEqual(
+            list(Session.objects.values_list('pk', flat=True)), ['active'])
+        self.assertEqual(len([
+            q for q in queries if q['sql'].startswith('DELETE')]), 3)
+
+    @override_settings(
+        SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies')
+    def test_purge_sessions_without_table(self):
+        """セッションテーブルを使わないエンジンでは何もしないかのテスト"""
+        out = StringIO()
+        with self.assertNumQueries(0):
+            call_command('purge_sessions', stdout=out)
+        self.assertIn('has no session table', out.getvalue())
+
+
+@override_settings(SERVER_TIMING_HEADER=True)
+class ServerTimingTestCase(TestCase):
+    """Server-Timingヘッダーとメトリクスのテスト"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='test@example.com', name='Test User',
+            password='testpassword123')
+        cache.clear()
+
+    def server_timing(self, response):
+        return {
+            entry.split(';')[0]: entry
+            for entry in response['Server-Timing'].split(', ')
+        }
+
+    def test_signin_timings(self):
+        """サインインのDB・ハッシュ・ビューの時間が計測されるかのテスト"""
+        count, total = request_phase_seconds.get(
+            phase='hash', view='users:signin')
+        response = self.client.post(reverse('users:signin'), {
+            'username': 'test@example.com', 'password': 'testpassword123'})
+
+        self.assertEqual(response.status_code, 302)
+        timings = self.server_timing(response)
+        self.assertEqual(
+            list(timings), ['db', 'hash', 'view', 'total'])
+        self.assertRegex(timings['db'], r'^db;dur=[\d.]+;desc="\d+ queries"$')
+        self.assertRegex(timings['hash'], r'^hash;dur=[\d.]+$')
+        self.assertEqual(
+            request_phase_seconds.get(phase='hash', view='users:signin')[0],
+            count + 1)
+
+    def test_template_timings(self):
+        """テンプレートとform_helpersの描画時間が計測されるかのテスト"""
+        self.client.force_login(self.user)
+        response = self.client.get(
+            reverse('users:profile', kwargs={'pk': self.user.pk}))
+
+        self.assertEqual(
+            list(self.server_timing(response)),
+            ['db', 'template', 'form_helpers', 'view', 'total'])
+
+    @override_settings(SERVER_TIMING_HEADER=False)
+    def test_header_disabled(self):
+        """ヘッダーを無効にしてもメトリクスは記録されるかのテスト"""
+        count, total = request_phase_seconds.get(
+            phase='total', view='users:signin')
+        response = self.client.get(reverse('users:signin'))
+
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(
+            request_phase_seconds.get(phase='total', view='users:signin')[0],
+            count + 1)
+
+    def test_header_allowed_ips_only(self):
+        """ヘッダーが許可されたアドレスにだけ送られるかのテスト"""
+        response = self.client.get(
+            reverse('users:signin'), REMOTE_ADDR='192.0.2.1')
+        self.assertNotIn('Server-Timing', response)
+
+    def test_metrics_endpoint(self):
+        """/metricsがPrometheus形式で許可されたアドレスにだけ返されるかのテスト"""
+        self.client.get(reverse('users:signin'))
+        response = self.client.get('/metrics')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith(
+            'text/plain; version=0.0.4'))
+        content = response.content.decode()
+        self.assertIn('# TYPE request_phase_seconds histogram\n', content)
+        self.assertIn(
+            'request_phase_seconds_count{phase="total",view="users:signin"}',
+            content)
+        self.assertIn('# TYPE users_signin_attempts_total counter\n', content)
+
+        response = self.client.get('/metrics', REMOTE_ADDR='192.0.2.1')
+        self.assertEqual(response.status_code, 404)
+
+    def test_histogram_exposition(self):
+        """ヒストグラムの累積バケットと合計のテスト"""
+        histogram = Histogram(
+            'test_seconds', 'Test.', ('phase',), buckets=(0.1, 1))
+        self.addCleanup(REGISTRY.remove, histogram)
+        for value in (0.05, 0.1, 0.5, 2):
+            histogram.observe(value, phase='db')
+
+        self.assertEqual(exposition([histogram]), '\n'.join([
+            '# HELP test_seconds Test.',
+            '# TYPE test_seconds histogram',
+            'test_seconds_bucket{phase="db",le="0.1"} 2',
+            'test_seconds_bucket{phase="db",le="1.0"} 3',
+            'test_seconds_bucket{phase="db",le="+Inf"} 4',
+            'test_seconds_sum{phase="db"} 2.65',
+            'test_seconds_count{phase="db"} 4',
+        ]) + '\n')
+
+
+class DatabaseProfileTestCase(TestCase):
+    """データベースプロファイルのテスト"""
+
+    def connect(self, path):
+        new_connection = type(connections['default'])(
+            {**connection.settings_dict, 'NAME': path}, 'profile')
+        self.addCleanup(new_connection.close)
+        with CaptureQueriesContext(new_connection) as queries:
+            new_connection.ensure_connection()
+        self.assertEqual(len(queries), 0)
+        return new_connection
+
+    def pragma(self, connection, name):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA %s' % name)
+            return cursor.fetchone()[0]
+
+    def test_production_pragmas(self):
+        """新しい接続にプラグマが設定されるかのテスト"""
+        profile = settings.DATABASE_PROFILES['production']
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(SQLITE_PRAGMAS=profile['PRAGMAS']):
+            production = self.connect(os.path.join(directory, 'db.sqlite3'))
+            self.assertEqual(self.pragma(production, 'journal_mode'), 'wal')
+            self.assertEqual(self.pragma(production, 'synchronous'), 1)
+            self.assertEqual(self.pragma(production, 'busy_timeout'), 10000)
+            self.assertEqual(self.pragma(production, 'cache_size'), -65536)
+
+    @override_settings(SQLITE_PRAGMAS={})
+    def test_development_pragmas(self):
+        """開発用プロファイルでは既定の設定のままかのテスト"""
+        with tempfile.TemporaryDirectory() as directory:
+            development = self.connect(os.path.join(directory, 'db.sqlite3'))
+            self.assertEqual(self.pragma(development, 'journal_mode'), 'delete')
+
+
+@override_settings(DATABASE_REPLICAS=['replica1', 'replica2'])
+class PrimaryReplicaRouterTestCase(SimpleTestCase):
+    """プライマリ・レプリカのルーティングのテスト"""
+
+    replicas = ['replica1', 'replica2']
+
+    def test_reads_go_to_replicas(self):
+        """レプリカ対象のモデルの読み込みだけがレプリカに送られるかのテスト"""
+        self.assertIn(User.objects.all().db, self.replicas)
+        self.assertIn(Session.objects.all().db, self.replicas)
+        self.assertEqual(QueuedEmail.objects.all().db, 'default')
+        self.assertEqual(router.db_for_write(User), 'default')
+
+    def test_reads_on_primary(self):
+        """トランザクション内とuse_primary()内ではプライマリから読むかのテスト"""
+        with use_primary():
+            self.assertEqual(User.objects.all().db, 'default')
+        with mock.patch.object(connections['default'], 'in_atomic_block', True):
+            self.assertEqual(User.objects.all().db, 'default')
+
+    def test_pinned_after_write(self):
+        """書き込んだクライアントが一定時間プライマリに固定されるかのテスト"""
+        def write(request):
+            router.db_for_write(User)
+            return HttpResponse(User.objects.all().db)
+
+        def read(request):
+            return HttpResponse(User.objects.all().db)
+
+        factory = RequestFactory()
+        response = PrimaryPinMiddleware(write)(factory.get('/'))
+        self.assertEqual(response.content, b'default')
+        cookie = response.cookies[settings.DATABASE_PRIMARY_PIN_COOKIE]
+        self.assertEqual(cookie['max-age'], 10)
+
+        request = factory.get('/')
+        request.COOKIES[settings.DATABASE_PRIMARY_PIN_COOKIE] = '1'
+        response = PrimaryPinMiddleware(read)(request)
+        self.assertEqual(response.content, b'default')
+        self.assertNotIn(settings.DATABASE_PRIMARY_PIN_COOKIE, response.cookies)
+
+        response = PrimaryPinMiddleware(read)(factory.get('/'))
+        self.assertIn(response.content.decode(), self.replicas)
+
+    def test_write_of_other_model(self):
+        """レプリカ対象外のモデルへの書き込みでは固定されないかのテスト"""
+        def write(request):
+            router.db_for_write(QueuedEmail)
+            return HttpResponse(User.objects.all().db)
+
+        response = PrimaryPinMiddleware(write)(RequestFactory().get('/'))
+        self.assertIn(response.content.decode(), self.replicas)
+        self.assertNotIn(settings.DATABASE_PRIMARY_PIN_COOKIE, response.cookies)
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas(self):
+        """レプリカがなければ全てプライマリを使うかのテスト"""
+        def write(request):
+            router.db_for_write(User)
+            return HttpResponse(User.objects.all().db)
+
+        response = PrimaryPinMiddleware(write)(RequestFactory().get('/'))
+        self.assertEqual(response.content, b'default')
+        self.assertNotIn(settings.DATABASE_PRIMARY_PIN_COOKIE, response.cookies)
+
+
+@override_settings(DATABASE_REPLICAS=['test_replica'])
+class ReplicaTestCase(TransactionTestCase):
+    """SQLiteのレプリカを使ったルーティングのテスト"""
+
+    databases = {'default', 'test_replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email='test@example.com', name='Test User', password='testpass123')
+        self.url = reverse('users:profile', kwargs={'pk': self.user.pk})
+        # Write the buffered audit events before the tables are flushed.
+        self.addCleanup(audit_log.flush)
+
+    def replicate(self):
+        for alias in settings.DATABASE_REPLICAS:
+            for model in (User, Session):
+                model.objects.using(alias).all().delete()
+                model.objects.using(alias).bulk_create(
+                    model.objects.using('default').all())
+
+    def test_reads_go_to_replica(self):
+        """書き込みがレプリカに反映されるまではレプリカから読めないかのテスト"""
+        self.assertFalse(User.objects.filter(pk=self.user.pk).exists())
+        with use_primary():
+            self.assertTrue(User.objects.filter(pk=self.user.pk).exists())
+        self.replicate()
+        self.assertTrue(User.objects.filter(pk=self.user.pk).exists())
+
+    def test_reads_own_writes(self):
+        """書き込んだクライアントだけが反映前の変更を読めるかのテスト"""
+        self.replicate()
+        client = Client()
+        client.post(reverse('users:signin'), {
+            'username': 'test@example.com', 'password': 'testpass123'})
+        self.assertIn(settings.DATABASE_PRIMARY_PIN_COOKIE, client.cookies)
+        self.replicate()
+
+        client.post(self.url, {'email': 'test@example.com', 'name': 'New Name'})
+        self.assertContains(client.get(self.url), 'New Name')
+
+        del client.cookies[settings.DATABASE_PRIMARY_PIN_COOKIE]
+        response = client.get(self.url)
+        self.assertNotContains(response, 'New Name')
+        self.assertContains(response, 'Test User')
+
+        self.replicate()
+        self.assertContains(client.get(self.url), 'New Name')
+
+    def test_read_then_write_loops_on_primary(self):
+        """書き込みながら読み進めるコマンドがレプリカの遅れに影響されないかのテスト"""
+        Session.objects.create(
+            session_key='expired', session_data='',
+            expire_date=timezone.now() - datetime.timedelta(days=1))
+        out = StringIO()
+        call_command('purge_sessions', stdout=out)
+        self.assertIn('1 expired sessions deleted.', out.getvalue())
+
+        self.assertEqual(
+            update_users(User.objects.all(), {'is_admin': True}), (1, True))
+
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl') as f:
+            f.write('{"email": "new@example.com", "name": "New User"}\n')
+            f.flush()
+            out = StringIO()
+            call_command('import_users', f.name, workers=1,
+                         unusable_passwords=True, stdout=out)
+        self.assertIn('1 users created, 0 duplicates', out.getvalue())
@@ -0,0 +1,122 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.template import Node, TemplateDoesNotExist
+from django.template.backends import django as django_backend
+
+
+_timings = ContextVar('request_timings', default=None)
+
+
+class Timings:
+    """
+    The time spent in each kind of instrumented work during one request,
+    and how many times it was done. Work nested in work of the same kind,
+    e.g. a template included by another, is counted as part of the outer.
+    """
+
+    def __init__(self):
+        self.durations = {}
+        self.counts = {}
+        self.active = set()
+        self.view_started = None
+
+    def add(self, name, duration):
+        self.durations[name] = self.durations.get(name, 0) + duration
+        self.counts[name] = self.counts.get(name, 0) + 1
+
+
+def start_timings():
+    """
+    Start collecting the Timings of the current request. Context variables
+    follow the request into sync_to_async() and run_in_executor() threads.
+    """
+    return _timings.set(Timings())
+
+
+def get_timings():
+    """Return the Timings of the current request, if collected."""
+    return _timings.get()
+
+
+def stop_timings(token):
+    timings = _timings.get()
+    _timings.reset(token)
+    return timings
+
+
+@contextmanager
+def timed(name):
+    """
+    Add the time spent in the block to the current request's Timings, if
+    any, under `name`. Also usable as a decorator.
+    """
+    timings = _timings.get()
+    if timings is None or name in timings.active:
+        yield
+        return
+    timings.active.add(name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.active.discard(name)
+        timings.add(name, time.perf_counter() - start)
+
+
+def time_query(execute, sql, params, many, context):
+    """Database execute wrapper timing the queries under 'db'."""
+    if _timings.get() is None:
+        return execute(sql, params, many, context)
+    with timed('db'):
+        return execute(sql, params, many, context)
+
+
+def install_query_timer(connection, **kwargs):
+    """connection_created receiver adding time_query() to the connection."""
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+class TimedTemplate(django_backend.Template):
+
+    def render(self, context=None, request=None):
+        with timed('template'):
+            return super().render(context, request)
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """The Django template backend, timing renders under 'template'."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            django_backend.reraise(exc, self)
+
+
+class TimedNode(Node):
+    """Render a tag's node, included templates and all, under `name`."""
+
+    def __init__(self, node, name):
+        self.node = node
+        self.name = name
+
+    def render(self, context):
+        with timed(self.name):
+            return self.node.render(context)
+
+
+def time_tags(library, name):
+    """Time the rendering of every tag of a template library under `name`."""
+    def timed_compile(compile_function):
+        def compile_tag(parser, token):
+            return TimedNode(compile_function(parser, token), name)
+        return compile_tag
+
+    for tag, compile_function in list(library.tags.items()):
+        library.tags[tag] = timed_compile(compile_function)
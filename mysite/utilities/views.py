@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.http import Http404, HttpResponse
+
+from .metrics import exposition
+
+
+def metrics(request):
+    """
+    Serve the process' metrics in the Prometheus text format, to the
+    addresses of settings.METRICS_ALLOWED_IPS only.
+    """
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+        raise Http404
+    return HttpResponse(
+        exposition(), content_type='text/plain; version=0.0.4; charset=utf-8')